@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""Shared OAuth token cache for the Alvys API.
+
+Why:
+
+* ``get_token`` used to POST the client credentials for every export and
+  every tenant, although an Alvys token is valid for ``expires_in``
+  seconds (an hour).  :class:`TokenManager` caches one token per
+  *(tenant, client id)* and re‑uses it until ``ALVYS_TOKEN_MARGIN``
+  seconds before it expires – or a tenth of its lifetime, for tokens
+  too short‑lived for the full margin.
+* A long export could outlive its token and die on a 401 half way.
+  :class:`BearerAuth` hands :class:`alvys_client.AlvysClient` the current
+  token for every request; on a 401 the client drops that token and
+  retries once with a fresh one.
+* Concurrent page fetchers and tenants share one manager; a per‑tenant
+  lock makes sure only one of them fetches a new token at a time.
+* ``ALVYS_TOKEN_CACHE`` optionally persists the tokens to a local file,
+  encrypted with ``ALVYS_TOKEN_CACHE_KEY`` (a Fernet key, needs
+  ``pip install cryptography``), so back‑to‑back runs skip the login too.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from utils.crypto import fernet, read_encrypted, write_encrypted
+
+if TYPE_CHECKING:  # pragma: no cover
+    from alvys_client import AlvysClient
+
+__all__ = [
+    "TOKEN_MARGIN",
+    "TOKEN_CACHE",
+    "TokenManager",
+    "BearerAuth",
+    "default_tokens",
+]
+
+# Refresh a cached token this many seconds before it expires …
+TOKEN_MARGIN = float(os.getenv("ALVYS_TOKEN_MARGIN", "120"))
+# … but never earlier than this share of its lifetime before
+TOKEN_MARGIN_SHARE = 0.1
+# Lifetime assumed when the token response carries no ``expires_in``
+DEFAULT_EXPIRES_IN = 3600
+# Optional encrypted on-disk cache shared by consecutive runs
+TOKEN_CACHE = os.getenv("ALVYS_TOKEN_CACHE")
+TOKEN_CACHE_KEY = os.getenv("ALVYS_TOKEN_CACHE_KEY")
+
+_Key = Tuple[str, str]
+_Entry = Tuple[str, float, float]  # (token, expires_at, refresh_at) epoch seconds
+
+
+class TokenManager:
+    """Thread‑safe cache of bearer tokens keyed by tenant and client id."""
+
+    def __init__(self, cache_file: str | None = TOKEN_CACHE, cache_key: str | None = TOKEN_CACHE_KEY,
+                 margin: float = TOKEN_MARGIN):
+        self.margin = margin
+        self.cache_file = cache_file
+        self._fernet = fernet(cache_key, "ALVYS_TOKEN_CACHE") if cache_file else None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # one writer of cache_file at a time
+        self._key_locks: Dict[_Key, threading.Lock] = {}
+        self._tokens: Dict[_Key, _Entry] = {}
+        self.hits = 0
+        self.fetches = 0
+        self.invalidated = 0
+
+    # ── cache ────────────────────────────────────────────────────────────
+    @staticmethod
+    def key(credentials: Dict[str, str]) -> _Key:
+        return (credentials.get("tenant_id") or "", credentials["client_id"])
+
+    def _entry(self, token: str, expires_in: float, now: float) -> _Entry:
+        """Cache entry for a token valid ``expires_in`` seconds from ``now``."""
+        margin = min(self.margin, expires_in * TOKEN_MARGIN_SHARE)
+        return (token, now + expires_in, now + expires_in - margin)
+
+    def _fresh(self, key: _Key) -> Optional[str]:
+        entry = self._tokens.get(key)
+        if entry and entry[2] > time.time():
+            return entry[0]
+        return None
+
+    def _load_file(self) -> None:
+        stored = read_encrypted(self.cache_file, self._fernet) if self.cache_file else None
+        if not stored:
+            return
+        with self._lock:
+            for name, (token, expires_at, *refresh_at) in stored.items():
+                key = tuple(name.split("|", 1))
+                if expires_at > self._tokens.get(key, ("", 0.0, 0.0))[1]:
+                    # files from before refresh_at was stored: full margin
+                    self._tokens[key] = (token, expires_at, *(refresh_at or [expires_at - self.margin]))
+
+    def _save_file(self) -> None:
+        if not self.cache_file:
+            return
+        with self._write_lock:  # snapshot inside, so the newest state is written last
+            with self._lock:
+                now = time.time()
+                stored = {"|".join(k): v for k, v in self._tokens.items() if v[1] > now}
+            write_encrypted(self.cache_file, self._fernet, stored)
+
+    # ── public API ───────────────────────────────────────────────────────
+    def get(self, client: "AlvysClient", auth_url: str, credentials: Dict[str, str]) -> str:
+        """Return a valid token for ``credentials``, logging in if needed."""
+        key = self.key(credentials)
+        with self._lock:
+            token = self._fresh(key)
+            if token:
+                self.hits += 1
+                return token
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:  # one login per tenant; the others wait and re-use it
+            self._load_file()
+            with self._lock:
+                token = self._fresh(key)
+                if token:
+                    self.hits += 1
+                    return token
+            response = client.post(auth_url, auth=None, data={
+                "client_id": credentials["client_id"],
+                "client_secret": credentials["client_secret"],
+                "grant_type": credentials.get("grant_type") or "client_credentials",
+            })
+            response.raise_for_status()
+            body = response.json()
+            token = body["access_token"]
+            entry = self._entry(token, float(body.get("expires_in") or DEFAULT_EXPIRES_IN), time.time())
+            with self._lock:
+                self._tokens[key] = entry
+                self.fetches += 1
+            self._save_file()
+            return token
+
+    def invalidate(self, credentials: Dict[str, str], token: str) -> None:
+        """Forget ``token`` (rejected by the API) unless it was already replaced."""
+        key = self.key(credentials)
+        with self._lock:
+            if self._tokens.get(key, ("",))[0] == token:
+                del self._tokens[key]
+                self.invalidated += 1
+        self._save_file()
+
+    def summary(self) -> str:
+        return (f"{self.fetches:,} logins, {self.hits:,} cached token uses, "
+                f"{self.invalidated:,} rejected tokens refreshed")
+
+
+class BearerAuth:
+    """Per‑tenant token source for :class:`alvys_client.AlvysClient` requests."""
+
+    def __init__(self, tokens: TokenManager, auth_url: str, credentials: Dict[str, str],
+                 client: "AlvysClient"):
+        self.tokens = tokens
+        self.auth_url = auth_url
+        self.credentials = credentials
+        self.client = client
+
+    def token(self) -> str:
+        return self.tokens.get(self.client, self.auth_url, self.credentials)
+
+    def refresh(self, stale: str) -> None:
+        """Drop ``stale`` after a 401 so the next :meth:`token` logs in again."""
+        self.tokens.invalidate(self.credentials, stale)
+
+
+# Process-wide manager shared by every client, export and tenant
+_tokens: TokenManager | None = None
+_tokens_lock = threading.Lock()
+
+
+def default_tokens() -> TokenManager:
+    global _tokens
+    with _tokens_lock:
+        if _tokens is None:
+            _tokens = TokenManager()
+        return _tokens
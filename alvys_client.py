@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+"""Pooled HTTP client for the Alvys integrations API.
+
+Why a dedicated client?
+-----------------------
+* **One ``requests.Session``** per run, so every page of every search reuses
+  the same keep‑alive TLS connections instead of a fresh handshake per POST.
+* **Tunable pool size** – must be at least the number of concurrent page
+  fetchers, otherwise urllib3 discards surplus connections.
+* **gzip/deflate** responses are requested explicitly; the JSON search
+  payloads compress ~10×.
+* **Per‑run stats** (requests, connections opened vs. reused, bytes on the
+  wire vs. decoded) so we can see what the pooling buys us.
+* **Request caps** – an optional global in‑flight limit plus a per‑endpoint
+  limit keep concurrent exports under the Alvys rate limits.
+* **Retries** – 429 / 5xx responses and dropped connections are retried
+  with exponential backoff and full jitter (``Retry-After`` wins when the
+  server sends it).  A 429 also pauses every request to that endpoint for
+  the same time, so parallel page fetchers back off together.  Retries and
+  throttle waits are counted in the stats.
+* **Bearer auth** – with :meth:`AlvysClient.authenticate` every request
+  carries the tenant's cached token (``alvys_auth``); a 401 drops it and
+  the request is re‑sent once with a fresh one.
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from alvys_auth import BearerAuth, TokenManager, default_tokens
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+DEFAULT_POOL_SIZE = int(os.getenv("ALVYS_POOL_SIZE", "10"))
+DEFAULT_TIMEOUT = float(os.getenv("ALVYS_HTTP_TIMEOUT", "120"))
+# Attempts after the first one for 429 / 5xx / connection errors
+DEFAULT_RETRIES = int(os.getenv("ALVYS_HTTP_RETRIES", "5"))
+# Backoff before retry n is uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**n))
+BACKOFF_BASE = float(os.getenv("ALVYS_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("ALVYS_BACKOFF_MAX", "60"))
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    """Seconds requested by a ``Retry-After`` header (delta or HTTP date)."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    """Full‑jitter exponential backoff for retry ``attempt`` (0‑based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+@dataclass
+class ClientStats:
+    """Counters accumulated over the lifetime of one :class:`AlvysClient`."""
+
+    requests: int = 0
+    connections_opened: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0   # as transferred (compressed)
+    bytes_decoded: int = 0    # after gzip/deflate decoding
+    retries: int = 0          # requests re-sent after a 429 / 5xx / connection error
+    throttled: int = 0        # 429 responses
+    throttle_waits: int = 0   # requests held back by an endpoint cool-down
+    backoff_seconds: float = 0.0
+    token_refreshes: int = 0  # requests re-sent with a new token after a 401
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def connections_reused(self) -> int:
+        return max(self.requests - self.connections_opened, 0)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "bytes_decoded": self.bytes_decoded,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "throttle_waits": self.throttle_waits,
+            "backoff_seconds": round(self.backoff_seconds, 3),
+            "token_refreshes": self.token_refreshes,
+        }
+
+    def summary(self) -> str:
+        mb = 1024 * 1024
+        text = (
+            f"{self.requests:,} requests over {self.connections_opened:,} connections "
+            f"({self.connections_reused:,} reused) – "
+            f"{self.bytes_received / mb:.2f} MB received "
+            f"({self.bytes_decoded / mb:.2f} MB decoded), "
+            f"{self.bytes_sent / mb:.2f} MB sent"
+        )
+        if self.retries or self.throttle_waits:
+            text += (
+                f"; {self.retries:,} retries ({self.throttled:,} throttled, "
+                f"{self.throttle_waits:,} cool-down waits, {self.backoff_seconds:.1f}s backing off)"
+            )
+        if self.token_refreshes:
+            text += f"; {self.token_refreshes:,} token refreshes after 401"
+        return text
+
+
+class AlvysClient:
+    """Thin wrapper around a pooled :class:`requests.Session`.
+
+    Use as a context manager (or call :meth:`close`) so pooled sockets are
+    released at the end of the run.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        keep_alive: bool = True,
+        compress: bool = True,
+        timeout: float | None = DEFAULT_TIMEOUT,
+        max_in_flight: int | None = None,
+        per_endpoint: int | None = None,
+        retries: int = DEFAULT_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+    ):
+        self.timeout = timeout
+        self.retries = max(retries, 0)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.auth: BearerAuth | None = None  # see authenticate()
+        self._cooldown: Dict[str, float] = {}  # endpoint path → monotonic resume time
+        self._global_slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self._per_endpoint = per_endpoint
+        self._endpoint_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._slots_lock = threading.Lock()
+        self.stats = ClientStats()
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate" if compress else "identity"
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    # -- context manager -----------------------------------------------------
+    def __enter__(self) -> "AlvysClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    # -- HTTP ------------------------------------------------------------------
+    def _connections_opened(self) -> int:
+        pools = self._adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in list(pools.keys()))
+
+    def _slots(self, url: str) -> ExitStack:
+        """Acquire the global and per-endpoint request slots for ``url``."""
+        stack = ExitStack()
+        # Endpoint slot first so we never hold a global slot while queued
+        if self._per_endpoint:
+            path = urlsplit(url).path
+            with self._slots_lock:
+                sem = self._endpoint_slots.setdefault(
+                    path, threading.BoundedSemaphore(self._per_endpoint)
+                )
+            stack.enter_context(sem)
+        if self._global_slots is not None:
+            stack.enter_context(self._global_slots)
+        return stack
+
+    def _wait_cooldown(self, path: str) -> None:
+        """Sleep while ``path`` is cooling down after a 429."""
+        with self._slots_lock:
+            delay = self._cooldown.get(path, 0.0) - time.monotonic()
+        if delay > 0:
+            with self.stats._lock:
+                self.stats.throttle_waits += 1
+                self.stats.backoff_seconds += delay
+            time.sleep(delay)
+
+    def _retry_delay(self, path: str, attempt: int, response: requests.Response | None) -> float:
+        """Backoff before re-sending; a 429 cools down the whole endpoint."""
+        wait = retry_after(response) if response is not None else None
+        delay = min(wait, self.backoff_max) if wait is not None else backoff(
+            attempt, self.backoff_base, self.backoff_max)
+        throttled = response is not None and response.status_code == 429
+        if throttled:
+            with self._slots_lock:
+                resume = time.monotonic() + delay
+                self._cooldown[path] = max(self._cooldown.get(path, 0.0), resume)
+        with self.stats._lock:
+            self.stats.retries += 1
+            self.stats.throttled += throttled
+            self.stats.backoff_seconds += delay
+        return delay
+
+    def _record(self, response: requests.Response) -> None:
+        body = response.request.body or b""
+        if isinstance(body, str):
+            body = body.encode()
+        with self.stats._lock:
+            self.stats.requests += 1
+            self.stats.connections_opened = self._connections_opened()
+            self.stats.bytes_sent += len(body)
+            self.stats.bytes_received += response.raw.tell() if response.raw else 0
+            self.stats.bytes_decoded += len(response.content)
+
+    def post(self, url: str, auth: BearerAuth | None = ..., **kwargs) -> requests.Response:
+        """``session.post`` with the client's timeout and retries, recording stats.
+
+        Gives up after ``retries`` re‑sends: the last retryable response is
+        returned (callers ``raise_for_status``), a connection error re‑raised.
+        ``auth`` (default: :attr:`auth`) adds the bearer token; pass ``None``
+        for unauthenticated calls such as the token request itself.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        auth = self.auth if auth is ... else auth
+        path = urlsplit(url).path
+        attempt = 0
+        refreshed = False
+        while True:
+            self._wait_cooldown(path)
+            if auth is not None:
+                # Resolved before taking a request slot: a login must never wait on them
+                token = auth.token()
+                kwargs["headers"] = {**(kwargs.get("headers") or {}), "Authorization": f"Bearer {token}"}
+            try:
+                with self._slots(url):
+                    response = self.session.post(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self._retry_delay(path, attempt, None))
+                attempt += 1
+                continue
+            self._record(response)
+            if response.status_code == 401 and auth is not None and not refreshed:
+                auth.refresh(token)
+                refreshed = True
+                with self.stats._lock:
+                    self.stats.token_refreshes += 1
+                response.close()
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                return response
+            delay = self._retry_delay(path, attempt, response)
+            response.close()
+            time.sleep(delay)  # outside the request slots
+            attempt += 1
+
+    def authenticate(self, auth_url: str, credentials: Dict[str, str],
+                     tokens: TokenManager | None = None) -> BearerAuth:
+        """Send every following request with the bearer token of ``credentials``."""
+        self.auth = BearerAuth(tokens or default_tokens(), auth_url, credentials, self)
+        return self.auth
+
+    def get_token(self, auth_url: str, credentials: Dict[str, str],
+                  tokens: TokenManager | None = None) -> str:
+        """Return a bearer token for ``credentials`` (cached, see ``alvys_auth``)."""
+        return (tokens or default_tokens()).get(self, auth_url, credentials)
+
+
+__all__ = ["AlvysClient", "ClientStats", "RETRY_STATUSES", "backoff", "retry_after"]
@@ -1,20 +1,30 @@
+import importlib
 import json
 import os
 import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
+from itertools import chain
 from pathlib import Path
-from typing import Dict, Iterable, Tuple
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import requests
 from dotenv import load_dotenv  # type: ignore
+from alvys_auth import default_tokens
+from alvys_client import DEFAULT_POOL_SIZE, AlvysClient
 from config import build_auth_urls
+from utils.checkpoints import CHECKPOINT_DIR, ExportCheckpoint, prune_checkpoints
+from utils.formats import FORMATS, Fields, format_of, open_data_file, project, with_format, write_records
+from utils.metrics import run_metrics
+from utils.watermarks import WATERMARK_FILE, WatermarkStore, at_or_before, format_ts, parse_ts, to_ms
 
 load_dotenv()
 
 TENANT_ID = os.getenv("ALVYS_TENANT_ID")
-AUTH_URL = f"https://integrations.alvys.com/api/authentication/{TENANT_ID}/token"
 API_VERSION = "1"
-BASE_URL = f"https://integrations.alvys.com/api/p/v{API_VERSION}"
+AUTH_URL = build_auth_urls(TENANT_ID, API_VERSION)["auth_url"]
+BASE_URL = build_auth_urls(TENANT_ID, API_VERSION)["base_url"]
 
 CREDENTIALS = {
     "client_id": os.getenv("ALVYS_CLIENT_ID"),
@@ -31,37 +41,299 @@ WEEK_RANGES = [
 ]
 
 OUTPUT_DIR = "alvys_weekly_data"
-PAGE_SIZE = 200
+# Starting page size; sequential searches then adapt it between the bounds
+PAGE_SIZE = int(os.getenv("ALVYS_PAGE_SIZE", "200"))
+MIN_PAGE_SIZE = int(os.getenv("ALVYS_PAGE_SIZE_MIN", "50"))
+MAX_PAGE_SIZE = int(os.getenv("ALVYS_PAGE_SIZE_MAX", "800"))
+ADAPTIVE_PAGING = os.getenv("ALVYS_ADAPTIVE_PAGING", "1").lower() not in ("0", "false", "no")
+# A page slower / larger than this is halved; one under half of both is doubled
+PAGE_TARGET_SECONDS = float(os.getenv("ALVYS_PAGE_TARGET_SECONDS", "5"))
+PAGE_MAX_BYTES = int(os.getenv("ALVYS_PAGE_MAX_BYTES", str(16 * 1024 * 1024)))
+# On-disk format for exported files: json | ndjson | ndjson.gz | ndjson.zst
+EXPORT_FORMAT = os.getenv("ALVYS_EXPORT_FORMAT", "json")
+# Worker threads used to pull pages concurrently (1 = classic sequential mode)
+PAGE_WORKERS = int(os.getenv("ALVYS_PAGE_WORKERS", "1"))
 
-def get_token():
-    response = requests.post(AUTH_URL, data=CREDENTIALS)
+# Fallback client for callers that don't pass their own
+_client: AlvysClient | None = None
+
+
+def _default_client() -> AlvysClient:
+    global _client
+    if _client is None:
+        _client = AlvysClient()
+    return _client
+
+
+def get_token(client: AlvysClient | None = None):
+    return (client or _default_client()).get_token(AUTH_URL, CREDENTIALS)
+
+
+# Keys the search endpoints may use to report the total result count
+_TOTAL_KEYS = ("TotalCount", "totalCount", "Total", "total", "TotalItems", "totalItems")
+
+
+def _fetch_page(client, url, headers, base_payload, page, size=None):
+    """POST one search page and return its (items, raw_result, bytes) tuple.
+
+    The page's latency (retries included), items and bytes go to the
+    ``export.page`` metric.
+    """
+    payload = dict(base_payload)
+    payload["page"] = page
+    payload["pageSize"] = size or PAGE_SIZE
+    start = time.perf_counter()
+    response = client.post(url, headers=headers, json=payload)
     response.raise_for_status()
-    return response.json()["access_token"]
-
-def fetch_paginated_data(url, headers, base_payload, max_items=None):
-    page = 0
-    items = []
-    while True:
-        payload = dict(base_payload)
-        payload["page"] = page
-        payload["pageSize"] = PAGE_SIZE
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        batch = result.get("Items") or result.get("items") or []
+    result = response.json()
+    batch = result.get("Items") or result.get("items") or []
+    run_metrics().add("export.page", time.perf_counter() - start, len(batch), len(response.content),
+                      latency=True, endpoint=_endpoint(url))
+    return batch, result, len(response.content)
+
+
+def _endpoint(url: str) -> str:
+    """``…/p/v1/loads/search`` → ``loads``."""
+    parts = url.rstrip("/").split("/")
+    return parts[-2] if parts[-1] == "search" and len(parts) > 1 else parts[-1]
+
+
+class PageSizer:
+    """Adapt the page size of one sequential search to what the API serves.
+
+    After every page the size is halved when the page took longer than
+    ``target_seconds`` or decoded to more than ``max_bytes``, and doubled
+    when it stayed under half of both.  Search pages are addressed by index
+    (``offset = page * pageSize``), so sizes stay on the ``start * 2**k``
+    ladder and only grow at an offset the larger size divides – every
+    record is still fetched exactly once.
+
+    A grown size is only trusted once a page comes back full at it; see
+    :meth:`cap` for an API that silently serves fewer items than asked.
+    """
+
+    def __init__(self, start: int = PAGE_SIZE, min_size: int = MIN_PAGE_SIZE,
+                 max_size: int = MAX_PAGE_SIZE, target_seconds: float = PAGE_TARGET_SECONDS,
+                 max_bytes: int = PAGE_MAX_BYTES):
+        self.size = start
+        self.min_size = min(min_size, start)
+        self.max_size = max(max_size, start)
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.resizes = 0
+        self._grow = False
+
+    def observe(self, seconds: float, nbytes: int) -> None:
+        """Record how long the last page took and how big it was."""
+        self._grow = False
+        if seconds > self.target_seconds or nbytes > self.max_bytes:
+            if self.size // 2 >= self.min_size:
+                self.size //= 2
+                self.resizes += 1
+        elif seconds * 2 < self.target_seconds and nbytes * 2 < self.max_bytes:
+            self._grow = self.size * 2 <= self.max_size
+
+    def cap(self, size: int) -> None:
+        """Never go above ``size`` again (the API ignored a larger ``pageSize``)."""
+        self.size = min(self.size, size)
+        self.max_size = size
+        self._grow = False
+
+    def next_size(self, offset: int) -> int:
+        """Page size for the page starting at item ``offset``."""
+        if self._grow and offset % (self.size * 2) == 0:
+            self.size *= 2
+            self.resizes += 1
+            self._grow = False
+        return self.size
+
+
+def _fetch_sized(client, url, headers, base_payload, offset, size, sizer):
+    """Fetch the ``size`` items at ``offset`` and report the page to ``sizer``."""
+    start = time.perf_counter()
+    batch, result, nbytes = _fetch_page(client, url, headers, base_payload, offset // size, size)
+    if sizer is not None:
+        sizer.observe(time.perf_counter() - start, nbytes)
+    return batch, result
+
+
+def _total_items(result) -> Optional[int]:
+    """Return the result count advertised by a search response, if any."""
+    if not isinstance(result, dict):
+        return None
+    for key in _TOTAL_KEYS:
+        total = result.get(key)
+        if isinstance(total, int) and total >= 0:
+            return total
+    return None
+
+
+def _total_pages(result) -> Optional[int]:
+    """Return the page count advertised by a search response, if any."""
+    total = _total_items(result)
+    return None if total is None else -(-total // PAGE_SIZE)
+
+
+def _iter_concurrent(client, url, headers, base_payload, limit, workers, first_page=0):
+    """Yield pages first_page+1..limit-1 in page order from a sliding window of futures.
+
+    At most ``workers`` pages are in flight (and buffered) at once.  With no
+    known ``limit`` the window probes ahead and stops at the first short
+    page; the few speculative requests past the end are simply discarded.
+    """
+    def fetch(page):
+        return _fetch_page(client, url, headers, base_payload, page)[0]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Future] = deque()
+        next_page = first_page + 1
+
+        def fill():
+            nonlocal next_page
+            while len(pending) < workers and (limit is None or next_page < limit):
+                pending.append(pool.submit(fetch, next_page))
+                next_page += 1
+
+        fill()
+        try:
+            while pending:
+                batch = pending.popleft().result()
+                if batch:
+                    yield batch
+                if len(batch) < PAGE_SIZE:
+                    return
+                fill()
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+
+def _iter_sequential(client, url, headers, base_payload, first_batch, sizer=None,
+                     start=0, size=PAGE_SIZE):
+    """Yield the pages after the one at ``start`` one request at a time until a short page.
+
+    With a :class:`PageSizer` the size of each request follows its advice.
+    A grown page that comes back short is ambiguous – the end of the
+    results, or an API that caps ``pageSize`` and so also served the page
+    from the wrong offset (an advertised total cannot tell the two apart).
+    The page is dropped and re‑requested at the last size that came back
+    full, and the sizer is capped there – one extra request at the end of
+    a search whose size grew.
+    """
+    batch, offset, confirmed = first_batch, start, size
+    while len(batch) == size:
+        offset += size
+        if sizer is not None:
+            size = sizer.next_size(offset)
+        batch, _ = _fetch_sized(client, url, headers, base_payload, offset, size, sizer)
+        if len(batch) < size and size > confirmed:
+            sizer.cap(confirmed)
+            size = confirmed
+            batch, _ = _fetch_sized(client, url, headers, base_payload, offset, size, sizer)
+            if len(batch) == size:
+                print(f"  ⚠️ {url}: API capped pageSize – staying at {size}")
+        elif len(batch) == size:
+            confirmed = max(confirmed, size)
+        yield batch
+
+
+def iter_pages(url, headers, base_payload, max_items=None, workers=None, client=None,
+               adaptive=None, start=0) -> Iterator[list]:
+    """Yield the item batches of a paginated search, in page order.
+
+    ``workers`` > 1 switches to concurrent mode: page 0 is fetched first to
+    learn the page count (or to find out the result fits a single page), then
+    the remaining pages are pulled through a bounded thread pool.  All pages
+    go through ``client`` (a shared :class:`AlvysClient`) so connections are
+    reused across pages and searches.
+
+    Sequential searches adapt their page size (:class:`PageSizer`) unless
+    ``adaptive`` is off; concurrent ones keep ``PAGE_SIZE`` so the page
+    count from the first response stays valid.
+
+    ``start`` resumes a search at that item offset (see ``utils.checkpoints``);
+    pages are then requested at the largest halving of ``PAGE_SIZE`` that
+    divides it.
+    """
+    client = client or _default_client()
+    workers = PAGE_WORKERS if workers is None else workers
+    adaptive = ADAPTIVE_PAGING if adaptive is None else adaptive
+    remaining = max_items or None
+
+    size = PAGE_SIZE
+    while start % size:  # largest halving of PAGE_SIZE that lands on ``start``
+        size //= 2
+    concurrent = workers > 1 and size == PAGE_SIZE
+    sizer = PageSizer(size) if adaptive and not concurrent else None
+    first_batch, first_result = _fetch_sized(client, url, headers, base_payload, start, size, sizer)
+    if concurrent and len(first_batch) == PAGE_SIZE:
+        first_page = start // PAGE_SIZE
+        limit = _total_pages(first_result)
+        if max_items:
+            max_pages = first_page + -(-max_items // PAGE_SIZE)
+            limit = max_pages if limit is None else min(limit, max_pages)
+        rest = _iter_concurrent(client, url, headers, base_payload, limit, workers, first_page)
+    else:
+        rest = _iter_sequential(client, url, headers, base_payload, first_batch, sizer, start, size)
+
+    for batch in chain([first_batch], rest):
         if not batch:
             break
-        items.extend(batch)
-        if len(batch) < PAGE_SIZE or (max_items and len(items) >= max_items):
+        if remaining is not None:
+            batch = batch[:remaining]
+            remaining -= len(batch)
+        yield batch
+        if remaining == 0:
             break
-        page += 1
-    return items if not max_items else items[:max_items]
+
+
+def fetch_paginated_data(url, headers, base_payload, max_items=None, workers=None, client=None):
+    """Return every item of a paginated search as one list (see ``iter_pages``)."""
+    return [
+        item
+        for batch in iter_pages(url, headers, base_payload, max_items, workers, client)
+        for item in batch
+    ]
 
 def save_json(data, filename, output_dir: str | Path = OUTPUT_DIR):
+    """Write ``data`` in the format implied by ``filename``'s extension."""
     os.makedirs(output_dir, exist_ok=True)
     filepath = os.path.join(output_dir, filename)
-    with open(filepath, "w") as f:
-        json.dump(data, f, indent=2)
+    fmt = format_of(filename) or "json"
+    with open_data_file(filepath, "wt", fmt) as f:
+        if fmt == "json":
+            json.dump(data, f, indent=2)
+        else:
+            write_records(data, f, fmt)
+
+
+def stream_json(pages: Iterable[list], filename, output_dir: str | Path = OUTPUT_DIR,
+                file_id: str | None = None) -> int:
+    """Write ``pages`` to disk as they arrive; return the record count.
+
+    Each record is stamped with ``FILE_ID`` and written straight away, so
+    memory stays at roughly one page no matter how large the result set is.
+    The format follows ``filename``'s extension (see ``utils.formats``);
+    ``.json`` output is byte-identical to ``save_json`` (``indent=2``).
+    Records are spooled to ``<filename>.part`` and renamed on success, so a
+    failed run never leaves a truncated file under the final name.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    filepath = os.path.join(output_dir, filename)
+    part = f"{filepath}.part"
+    fmt = format_of(filename) or "json"
+
+    def records():
+        for batch in pages:
+            for rec in batch:
+                if file_id is not None:
+                    rec["FILE_ID"] = file_id
+                yield rec
+
+    with open_data_file(part, "wt", fmt) as f:
+        count = write_records(records(), f, fmt)
+    os.replace(part, filepath)
+    return count
 
 def format_range(start, end):
     start_fmt = start[:10].replace("-", "")
@@ -72,156 +344,386 @@ def get_file_id():
     return datetime.utcnow().strftime("%Y%m%d%H%M%S%f")[:-3]  # yyyymmddHHMMSSmmm
 
 
-def export_endpoints(
-    entities: Iterable[str],
-    credentials: Dict[str, str],
-    date_range: Tuple[datetime, datetime],
-    output_dir: str | Path,
-):
-    """Export selected API endpoints for the given date range."""
-    urls = build_auth_urls(credentials["tenant_id"], API_VERSION)
-    token_resp = requests.post(urls["auth_url"], data={
-        "client_id": credentials["client_id"],
-        "client_secret": credentials["client_secret"],
-        "grant_type": credentials.get("grant_type", "client_credentials"),
-    })
-    token_resp.raise_for_status()
-    token = token_resp.json()["access_token"]
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "accept": "application/json",
-        "content-type": "application/*+json",
-    }
+# Search payloads for the snapshot endpoints, which ignore date ranges
+SNAPSHOT_PAYLOADS = {
+    "drivers": {"name": "", "employeeId": "", "fleetName": "", "status": []},
+    "trucks": {
+        "truckNumber": "",
+        "fleetName": "",
+        "vinNumber": "",
+        "registeredName": "",
+        "status": [],
+    },
+    "trailers": {
+        "status": [],
+        "trailerNumber": "",
+        "fleetName": "",
+        "vinNumber": "",
+    },
+    "customers": {"statuses": ["Active", "Inactive", "Disabled"]},
+    "carriers": {
+        "status": [
+            "Pending",
+            "Active",
+            "Expired Insurance",
+            "Interested",
+            "Invited",
+            "Packet Sent",
+            "Packet Completed",
+        ],
+    },
+}
 
-    start_iso = (
-        date_range[0].astimezone(timezone.utc)
-        .isoformat(timespec="milliseconds")
-        .replace("+00:00", "Z")
-    )
-    end_iso = (
-        date_range[1].astimezone(timezone.utc)
-        .isoformat(timespec="milliseconds")
-        .replace("+00:00", "Z")
-    )
+# Entity scheduler caps: entities exported at once, HTTP requests in flight
+# across the whole run, and in flight against any single search endpoint.
+ENTITY_WORKERS = int(os.getenv("ALVYS_ENTITY_WORKERS", "1"))
+MAX_IN_FLIGHT = int(os.getenv("ALVYS_MAX_IN_FLIGHT", "8"))
+PER_ENDPOINT = int(os.getenv("ALVYS_PER_ENDPOINT", "4"))
+
+
+# Record timestamp that drives incremental (watermark) exports, per entity.
+# Dated searches filter on it server-side; carriers are filtered client-side.
+# Drivers, trucks, trailers and customers expose no change timestamp.
+WATERMARK_FIELDS = {
+    "trips": "UpdatedAt",
+    "loads": "UpdatedAt",
+    "invoices": "InvoicedDate",
+    "carriers": "UpdatedAt",
+}
 
+# ``--prune``: drop every field no insert column reads before records are
+# written.  The search endpoints offer no field selection, so records are
+# projected client-side with the insert module's field tree (its column
+# spec); the watermark field is always kept.  Snapshot entities are
+# sanitised by hand-written functions and are kept whole.
+EXPORT_PRUNE = os.getenv("ALVYS_EXPORT_PRUNE", "0").lower() in ("1", "true", "yes")
+# Spool every page under <output_dir>/.checkpoints so a failed export resumes
+EXPORT_CHECKPOINT = os.getenv("ALVYS_EXPORT_CHECKPOINT", "1").lower() not in ("0", "false", "no")
+PRUNE_FIELDS = {
+    "trips": ("inserts.trips_insert", "TRIP_FIELDS"),
+    "loads": ("inserts.loads_insert", "LOAD_FIELDS"),
+    "invoices": ("inserts.invoices_insert", "INVOICE_FIELDS"),
+}
+
+
+def export_fields(name: str) -> Optional[Fields]:
+    """Fields kept for ``name`` when pruning, or ``None`` to keep everything."""
+    if name not in PRUNE_FIELDS:
+        return None
+    module, attr = PRUNE_FIELDS[name]
+    fields = dict(getattr(importlib.import_module(module), attr))
+    if WATERMARK_FIELDS.get(name):
+        fields.setdefault(WATERMARK_FIELDS[name], True)
+    return fields
+
+
+def build_export_jobs(entities, base_url, start_iso, end_iso, fmt: str = "json",
+                      since: Dict[str, datetime] | None = None,
+                      run_id: str | None = None, prune: bool = False) -> List[Dict]:
+    """Return one ``{name, url, payload, filename, ...}`` job per requested entity.
+
+    ``fmt`` picks the file extension (and so the on-disk format).  ``since``
+    maps entities to their high-water mark for incremental runs: dated
+    searches start there instead of ``start_iso``; other entities with a
+    ``WATERMARK_FIELDS`` entry drop older records before writing.  ``run_id``
+    is appended to dated file names so frequent runs don't overwrite each
+    other.  ``prune`` keeps only the fields of ``export_fields``.
+
+    Every job carries a ``checkpoint_key`` (see ``utils.checkpoints``); for
+    incremental runs it leaves out the range end, which moves with *now*.
+    """
+    since = since or {}
     endpoints = {
         "trips": {
-            "url": f"{urls['base_url']}/trips/search",
+            "url": f"{base_url}/trips/search",
             "extra_payload": {"status": ["Completed"], "range_field": "updatedAtRange"},
         },
         "loads": {
-            "url": f"{urls['base_url']}/loads/search",
+            "url": f"{base_url}/loads/search",
             "extra_payload": {"status": ["Open"], "range_field": "updatedAtRange"},
         },
         "invoices": {
-            "url": f"{urls['base_url']}/invoices/search",
+            "url": f"{base_url}/invoices/search",
             "extra_payload": {"status": ["Paid"], "range_field": "invoicedDateRange"},
         },
     }
 
-    os.makedirs(output_dir, exist_ok=True)
-
+    jobs = []
     for name, cfg in endpoints.items():
         if name not in entities:
             continue
         range_field = cfg["extra_payload"].get("range_field", "updatedAtRange")
         extra_payload = {k: v for k, v in cfg["extra_payload"].items() if k != "range_field"}
-        payload = {
-            range_field: {"start": start_iso, "end": end_iso},
-            **extra_payload,
-        }
-        data = fetch_paginated_data(cfg["url"], headers, payload)
-        file_id = get_file_id()
-        for rec in data:
-            rec["FILE_ID"] = file_id
-        fname = f"{name.upper()}_API_{format_range(start_iso, end_iso)}.json"
-        save_json(data, fname, output_dir)
-
-    # These endpoints do not use date ranges
-    if "drivers" in entities:
-        drivers = fetch_paginated_data(
-            f"{urls['base_url']}/drivers/search",
-            headers,
-            {"name": "", "employeeId": "", "fleetName": "", "status": []},
-        )
-        file_id = get_file_id()
-        for rec in drivers:
-            rec["FILE_ID"] = file_id
-        save_json(drivers, "DRIVERS.json", output_dir)
-
-    if "trucks" in entities:
-        trucks = fetch_paginated_data(
-            f"{urls['base_url']}/trucks/search",
-            headers,
-            {
-                "truckNumber": "",
-                "fleetName": "",
-                "vinNumber": "",
-                "registeredName": "",
-                "status": [],
+        start = format_ts(since[name]) if name in since else start_iso
+        label = format_range(start, end_iso) + (f"_{run_id}" if run_id else "")
+        jobs.append({
+            "name": name,
+            "url": cfg["url"],
+            "payload": {
+                range_field: {"start": start, "end": end_iso},
+                **extra_payload,
             },
-        )
-        file_id = get_file_id()
-        for rec in trucks:
-            rec["FILE_ID"] = file_id
-        save_json(trucks, "TRUCKS.json", output_dir)
+            "filename": with_format(f"{name.upper()}_API_{label}.json", fmt),
+            "watermark_field": WATERMARK_FIELDS.get(name),
+            "since": since.get(name),
+            "fields": export_fields(name) if prune else None,
+        })
 
-    if "trailers" in entities:
-        trailers = fetch_paginated_data(
-            f"{urls['base_url']}/trailers/search",
-            headers,
-            {
-                "status": [],
-                "trailerNumber": "",
-                "fleetName": "",
-                "vinNumber": "",
-            },
+    # These endpoints do not use date ranges
+    for name, payload in SNAPSHOT_PAYLOADS.items():
+        if name not in entities:
+            continue
+        jobs.append({
+            "name": name,
+            "url": f"{base_url}/{name}/search",
+            "payload": payload,
+            "filename": with_format(f"{name.upper()}.json", fmt),
+            "watermark_field": WATERMARK_FIELDS.get(name),
+            "since": since.get(name),
+        })
+    ignore = ["end"] if run_id else None
+    for job in jobs:
+        job["checkpoint_key"] = ExportCheckpoint.key_for(job, ignore)
+    return jobs
+
+
+def _track_watermark(pages, field, since, seen, boundary=()):
+    """Pass pages through, recording the newest ``field`` value in ``seen``.
+
+    ``seen["ids"]`` collects the Ids stamped with that newest value.  With
+    ``since`` set, records the mark already covered are dropped: older ones
+    (client-side filter for searches without a date range) and, since
+    ranges start at the mark inclusively, those at the mark whose Id is in
+    ``boundary`` (exported by the previous run).
+    """
+    for batch in pages:
+        if since is not None:
+            batch = [rec for rec in batch
+                     if not at_or_before(parse_ts(rec.get(field)), rec.get("Id"), since, boundary)]
+        for rec in batch:
+            ts = parse_ts(rec.get(field))
+            if ts is None:
+                continue
+            ts = to_ms(ts)
+            if seen["max"] is None or ts > seen["max"]:
+                seen["max"], seen["ids"] = ts, set()
+            if ts == seen["max"] and rec.get("Id") is not None:
+                seen["ids"].add(str(rec["Id"]))
+        yield batch
+
+
+def _prune(pages, fields):
+    """Project every record of ``pages`` onto ``fields``."""
+    for batch in pages:
+        yield [project(rec, fields) for rec in batch]
+
+
+def _count_fetched(pages, fetched):
+    """Pass pages through, noting the raw size of the latest one in ``fetched``."""
+    for batch in pages:
+        fetched["items"] = len(batch)
+        yield batch
+
+
+def _run_job(job, headers, output_dir, page_workers, client,
+             watermarks=None, tenant=None, checkpoint=False) -> Tuple[int, float]:
+    """Stream one entity's pages to disk; return (record count, seconds).
+
+    With a ``watermarks`` store the entity's mark is advanced to the newest
+    record timestamp once the file has been written successfully.
+
+    With ``checkpoint`` every page is spooled to an :class:`ExportCheckpoint`
+    first and the file is stitched from the spool at the end; an interrupted
+    job picks up its spool, range and file name and fetches only the rest.
+    """
+    start = time.perf_counter()
+    ckpt = None
+    seen = {"max": None, "ids": set()}
+    if checkpoint:
+        ckpt = ExportCheckpoint(
+            os.path.join(output_dir, CHECKPOINT_DIR), job["name"], job["checkpoint_key"],
+            {"payload": job["payload"], "filename": job["filename"]}, get_file_id(),
         )
-        file_id = get_file_id()
-        for rec in trailers:
-            rec["FILE_ID"] = file_id
-        save_json(trailers, "TRAILERS.json", output_dir)
+        job = {**job, **ckpt.job}
+        seen["max"], seen["ids"] = ckpt.watermark, ckpt.watermark_ids
+        if ckpt.resumed:
+            print(f"  {job['name'].upper():<10} resuming at record {ckpt.offset:,} ({ckpt.describe()})")
+
+    if ckpt is None or not ckpt.complete:
+        fetched = {"items": 0}
+        pages = iter_pages(job["url"], headers, job["payload"], workers=page_workers,
+                           client=client, start=ckpt.offset if ckpt else 0)
+        pages = _count_fetched(pages, fetched)
+        if job.get("watermark_field"):
+            since = job.get("since")
+            boundary = watermarks.boundary(tenant, job["name"]) if since and watermarks is not None else ()
+            pages = _track_watermark(pages, job["watermark_field"], since, seen, boundary)
+        if job.get("fields"):
+            pages = _prune(pages, job["fields"])
+        if ckpt is not None:
+            for batch in pages:
+                ckpt.add(batch, fetched["items"], seen["max"], seen["ids"])
+            ckpt.finish()
+
+    if ckpt is None:
+        count = stream_json(pages, job["filename"], output_dir, file_id=get_file_id())
+    else:
+        count = stream_json(ckpt.iter_pages(), job["filename"], output_dir, file_id=ckpt.file_id)
+    if watermarks is not None and seen["max"] is not None:
+        watermarks.advance(tenant, job["name"], seen["max"], seen["ids"])
+    if ckpt is not None:
+        ckpt.clear()
+    seconds = time.perf_counter() - start
+    run_metrics().add("export.job", seconds, count,
+                      os.path.getsize(os.path.join(output_dir, job["filename"])), entity=job["name"])
+    return count, seconds
+
+
+def run_export_jobs(jobs, headers, output_dir, client, page_workers=None, entity_workers=None,
+                    watermarks=None, tenant=None, checkpoint=False):
+    """Run entity exports through a bounded pool and print a timing summary.
+
+    Entities are independent searches, so up to ``entity_workers`` run at
+    once; the request-level global / per-endpoint caps live in ``client``.
+    Returns ``{entity: (records, seconds)}``.
+    """
+    entity_workers = ENTITY_WORKERS if entity_workers is None else entity_workers
+    timings: Dict[str, Tuple[int, float]] = {}
+    run_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(entity_workers, 1)) as pool:
+        futures = {
+            pool.submit(_run_job, job, headers, output_dir, page_workers, client,
+                        watermarks, tenant, checkpoint): job["name"]
+            for job in jobs
+        }
+        try:
+            for fut in as_completed(futures):
+                name = futures[fut]
+                timings[name] = fut.result()
+                rows, secs = timings[name]
+                print(f"  {name.upper():<10} {rows:>8,} records in {secs:6.1f}s")
+        except BaseException:
+            # Don't start queued entities once one has failed
+            pool.shutdown(cancel_futures=True)
+            raise
+
+    if timings:
+        _print_schedule_summary(timings, time.perf_counter() - run_start)
+    return timings
+
+
+def _print_schedule_summary(timings: Dict[str, Tuple[int, float]], wall: float) -> None:
+    critical = max(timings, key=lambda n: timings[n][1])
+    serial = sum(secs for _, secs in timings.values())
+    print(
+        f"Critical path: {critical.upper()} {timings[critical][1]:.1f}s of {wall:.1f}s wall "
+        f"(serial sum {serial:.1f}s → {serial / wall if wall else 1:.1f}× overlap)"
+    )
 
-    if "customers" in entities:
-        customers = fetch_paginated_data(
-            f"{urls['base_url']}/customers/search",
-            headers,
-            {"statuses": ["Active", "Inactive", "Disabled"]},
-        )
-        file_id = get_file_id()
-        for rec in customers:
-            rec["FILE_ID"] = file_id
-        save_json(customers, "CUSTOMERS.json", output_dir)
 
-    if "carriers" in entities:
-        carriers = fetch_paginated_data(
-            f"{urls['base_url']}/carriers/search",
-            headers,
-            {
-                "status": [
-                    "Pending",
-                    "Active",
-                    "Expired Insurance",
-                    "Interested",
-                    "Invited",
-                    "Packet Sent",
-                    "Packet Completed",
-                ],
-            },
+def export_endpoints(
+    entities: Iterable[str],
+    credentials: Dict[str, str],
+    date_range: Tuple[datetime, datetime],
+    output_dir: str | Path,
+    page_workers: int | None = None,
+    client: AlvysClient | None = None,
+    entity_workers: int | None = None,
+    max_in_flight: int | None = None,
+    per_endpoint: int | None = None,
+    fmt: str | None = None,
+    incremental: bool = False,
+    full_resync: bool = False,
+    prune: bool | None = None,
+    checkpoint: bool | None = None,
+):
+    """Export selected API endpoints for the given date range.
+
+    ``page_workers`` > 1 fetches the pages of each search concurrently
+    (defaults to ``ALVYS_PAGE_WORKERS``) and ``entity_workers`` > 1 runs
+    several entity searches at once (``ALVYS_ENTITY_WORKERS``).  Every
+    request goes through one pooled ``client``; if none is given a run-scoped
+    one is created – capped at ``max_in_flight`` requests overall and
+    ``per_endpoint`` per search URL – and its stats are printed at the end.
+    ``fmt`` selects the output format (``ALVYS_EXPORT_FORMAT``, default json).
+
+    The client is authenticated as the tenant of ``credentials``; its token
+    comes from the shared ``alvys_auth`` cache, so tenants and repeated
+    exports log in once per token lifetime.
+
+    ``incremental`` pulls only records changed since each entity's persisted
+    high-water mark (``<output_dir>/.watermarks.json``, per tenant), up to
+    now; entities without a mark start at ``date_range[0]``.
+    ``full_resync`` ignores existing marks but still records new ones.
+    ``prune`` (``ALVYS_EXPORT_PRUNE``) writes only the fields the insert
+    modules read (see ``PRUNE_FIELDS``).
+    ``checkpoint`` (``ALVYS_EXPORT_CHECKPOINT``, on by default) spools pages
+    under ``<output_dir>/.checkpoints`` so a re‑run after a failure resumes
+    each unfinished entity from its last good page.
+    """
+    fmt = fmt or EXPORT_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {sorted(FORMATS)}")
+    own_client = client is None
+    if own_client:
+        max_in_flight = MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        client = AlvysClient(
+            pool_size=max(max_in_flight, DEFAULT_POOL_SIZE),
+            max_in_flight=max_in_flight,
+            per_endpoint=PER_ENDPOINT if per_endpoint is None else per_endpoint,
         )
-        file_id = get_file_id()
-        for rec in carriers:
-            rec["FILE_ID"] = file_id
-        save_json(carriers, "CARRIERS.json", output_dir)
+    try:
+        urls = build_auth_urls(credentials["tenant_id"], API_VERSION)
+        # Cached per tenant and refreshed on expiry / 401 (see alvys_auth)
+        client.authenticate(urls["auth_url"], credentials)
+        headers = {
+            "accept": "application/json",
+            "content-type": "application/*+json",
+        }
+        start_iso, end_iso = format_ts(date_range[0]), format_ts(date_range[1])
+        tenant = credentials["tenant_id"]
+        watermarks = since = run_id = None
+        if incremental:
+            watermarks = WatermarkStore(os.path.join(output_dir, WATERMARK_FILE))
+            since = {} if full_resync else {
+                e: mark for e in entities if (mark := watermarks.get(tenant, e)) is not None
+            }
+            for name, mark in since.items():
+                print(f"  {name.upper():<10} incremental since {format_ts(mark)}")
+            end_iso = format_ts(datetime.now(timezone.utc))
+            run_id = get_file_id()
+        prune = EXPORT_PRUNE if prune is None else prune
+        jobs = build_export_jobs(entities, urls["base_url"], start_iso, end_iso, fmt, since, run_id, prune)
+
+        os.makedirs(output_dir, exist_ok=True)
+        checkpoint = EXPORT_CHECKPOINT if checkpoint is None else checkpoint
+        if checkpoint and prune_checkpoints(os.path.join(output_dir, CHECKPOINT_DIR)):
+            print("  discarded stale export checkpoints")
+        run_export_jobs(jobs, headers, output_dir, client, page_workers, entity_workers,
+                        watermarks, tenant, checkpoint)
+    finally:
+        if own_client:
+            print(f"HTTP: {client.stats.summary()}")
+            print(f"Tokens: {default_tokens().summary()}")
+            run_metrics().count("http", client.stats.as_dict())
+            client.close()
 
 
 def main():
     args = [arg.lower() for arg in sys.argv[1:]]
     run_all = len(args) == 0
 
-    token = get_token()
+    with AlvysClient() as client:
+        _legacy_export(args, run_all, client)
+        print(f"HTTP: {client.stats.summary()}")
+
+    print("\n✅ Data pull complete.")
+
+
+def _legacy_export(args, run_all, client):
+    client.authenticate(AUTH_URL, CREDENTIALS)
     headers = {
-        "Authorization": f"Bearer {token}",
         "accept": "application/json",
         "content-type": "application/*+json"
     }
@@ -267,7 +769,7 @@ def main():
                     },
                     **extra_payload
                 }
-                data = fetch_paginated_data(config["url"], headers, payload)
+                data = fetch_paginated_data(config["url"], headers, payload, client=client)
                 file_id = get_file_id()
                 for rec in data:
                     rec["FILE_ID"] = file_id
@@ -283,7 +785,8 @@ def main():
                 "employeeId": "",
                 "fleetName": "",
                 "status": []
-            }
+            },
+            client=client,
         )
         file_id = get_file_id()
         for rec in drivers:
@@ -300,7 +803,8 @@ def main():
                 "vinNumber": "",
                 "registeredName": "",
                 "status": []
-            }
+            },
+            client=client,
         )
         file_id = get_file_id()
         for rec in trucks:
@@ -316,7 +820,8 @@ def main():
                 "trailerNumber": "",
                 "fleetName": "",
                 "vinNumber": ""
-            }
+            },
+            client=client,
         )
         file_id = get_file_id()
         for rec in trailers:
@@ -329,7 +834,8 @@ def main():
             f"{BASE_URL}/customers/search", headers,
             {
                 "statuses": ["Active", "Inactive", "Disabled"]
-            }
+            },
+            client=client,
         )
         file_id = get_file_id()
         for rec in customers:
@@ -350,14 +856,14 @@ def main():
                     "Packet Sent",
                     "Packet Completed",
                 ]
-            }
+            },
+            client=client,
         )
         file_id = get_file_id()
         for rec in carriers:
             rec["FILE_ID"] = file_id
         save_json(carriers, "CARRIERS.json")
 
-    print("\n✅ Data pull complete.")
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,13 @@
 import os
-import json
 import pyodbc
 import pandas as pd
 import sys
 import time
 from datetime import datetime
-from typing import List, Dict
+from typing import Dict, Iterator, List
 from dotenv import load_dotenv # type: ignore
+from utils.formats import find_data_file, iter_records
+from utils.rows import iter_batches
 
 load_dotenv()
 
@@ -23,9 +24,13 @@ def get_conn():
         f"DRIVER={DRIVER};SERVER={SQL_SERVER};DATABASE={SQL_DATABASE};UID={SQL_USERNAME};PWD={SQL_PASSWORD}"
     )
 
-def load_json(filename: str) -> List[Dict]:
-    with open(os.path.join(DATA_DIR, filename), encoding="utf-8") as f:
-        return json.load(f)
+def load_json(filename: str) -> Iterator[Dict]:
+    """Stream ``filename`` – or its NDJSON/compressed sibling – from DATA_DIR.
+
+    An ``{"Items": [...]}`` wrapper is unwrapped.
+    """
+    stem = filename[: -len(".json")] if filename.endswith(".json") else filename
+    return iter_records(find_data_file(DATA_DIR, stem))
 
 def safe_datetime(val):
     try:
@@ -125,8 +130,7 @@ def batch_insert(table: str, records: List[Dict], conn):
     cursor = conn.cursor()
     cursor.fast_executemany = True
     start = time.time()
-    for i in range(0, len(df), BATCH_SIZE):
-        batch = df.iloc[i:i + BATCH_SIZE].where(pd.notnull(df), None).values.tolist()
+    for batch in iter_batches(df, BATCH_SIZE):
         cursor.executemany(insert_sql, batch)
     conn.commit()
     duration = time.time() - start
@@ -160,9 +164,7 @@ def main():
 
     if run_all or "carriers" in args:
         print("Loading carriers JSON...")
-        raw = load_json("CARRIERS.json")
-        items = raw.get("Items") if isinstance(raw, dict) else raw
-        carriers = [sanitize_carrier(c) for c in items]
+        carriers = [sanitize_carrier(c) for c in load_json("CARRIERS.json")]
         batch_insert("ALVYS_CARRIERS_RAW", carriers, conn)
 
     print("\n✅ All data inserted.")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""Exporter load test against the local mock Alvys API
+=====================================================
+Starts ``benchmarks/mock_alvys.py`` in-process (or uses a running one via
+``--url``), points ``config.API_ROOT`` at it and runs
+`alvys_export.export_endpoints` for the chosen entities into a temporary
+folder, exactly as ``main.py export`` would.
+
+Reported from the ``export.page`` metric (``utils.metrics``) per endpoint
+and overall: pages/sec, records/sec, response bytes/sec and page latency
+p50 / p95 / p99 / max (retries and backoff included, as the exporter sees
+it), plus the client's retry / throttle counters and what the server
+answered.  Every exported file is read back and its record count checked
+against what the mock serves, so retries must not lose or repeat pages.
+
+Usage
+-----
+python benchmarks/bench_export.py --scale 10 --latency 0.05 --jitter 0.02
+python benchmarks/bench_export.py --page-workers 8 --rate-limit 50 --retry-after 0.5
+python benchmarks/bench_export.py --error-rate 0.05 --throttle-rate 0.05 --metrics-json /tmp/export.json
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import alvys_export  # noqa: E402
+import config  # noqa: E402
+from benchmarks import synth  # noqa: E402
+from benchmarks.common import arg_parser  # noqa: E402
+from benchmarks.mock_alvys import add_server_args, server_from_args  # noqa: E402
+from utils.formats import FORMATS, is_data_file, iter_records  # noqa: E402
+from utils.metrics import run_metrics  # noqa: E402
+
+CREDENTIALS = {
+    "tenant_id": "MOCK",
+    "client_id": "bench-export",
+    "client_secret": "bench-export",
+    "grant_type": "client_credentials",
+}
+
+
+def exported_counts(folder: str) -> Dict[str, Tuple[int, int]]:
+    """``(records, distinct ids)`` per entity in the exported files."""
+    prefixes = {**synth.WEEKLY, **synth.SNAPSHOTS}
+    records: Dict[str, List[str]] = {}
+    for name in sorted(os.listdir(folder)):
+        for entity, prefix in prefixes.items():
+            if is_data_file(name, prefix):
+                path = os.path.join(folder, name)
+                records.setdefault(entity, []).extend(r.get("Id") for r in iter_records(path, stage=None))
+    return {entity: (len(ids), len(set(ids))) for entity, ids in records.items()}
+
+
+def _row(name: str, pages: int, rows: int, nbytes: int, wall: float, lat: Dict[str, float] | None) -> str:
+    line = (f"  {name:<10}{pages:>7,}{pages / wall:>9,.1f}{rows / wall:>11,.0f}"
+            f"{nbytes / wall / 2**20:>9.2f}")
+    if lat:
+        line += "".join(f"{lat[p] * 1000:>9.0f}" for p in ("p50", "p95", "p99", "max"))
+    return line
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--url", help="API root of an already running mock (default: start one)")
+    p.add_argument("--entities", nargs="+", choices=synth.ENTITIES, default=synth.ENTITIES)
+    p.add_argument("--page-workers", type=int, default=4, help="Concurrent pages per search")
+    p.add_argument("--entity-workers", type=int, default=2, help="Concurrent entity searches")
+    p.add_argument("--max-in-flight", type=int, default=8, help="Requests in flight overall")
+    p.add_argument("--format", dest="fmt", choices=list(FORMATS), default="json")
+    p.add_argument("--metrics-json", help="Also write the run's metrics report here")
+    add_server_args(p)
+    args = p.parse_args(argv)
+
+    mock = None if args.url else server_from_args(args, args.entities).start()
+    config.API_ROOT = args.url or mock.url
+    start = datetime(synth.ANCHOR.year, synth.ANCHOR.month, synth.ANCHOR.day, tzinfo=timezone.utc)
+    metrics = run_metrics()
+    metrics.reset()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            began = time.perf_counter()
+            alvys_export.export_endpoints(
+                args.entities, CREDENTIALS, (start, start + timedelta(days=7)), tmp,
+                page_workers=args.page_workers, entity_workers=args.entity_workers,
+                max_in_flight=args.max_in_flight, fmt=args.fmt, prune=False, checkpoint=False,
+            )
+            wall = time.perf_counter() - began
+            exported = exported_counts(tmp)
+    finally:
+        if mock:
+            mock.stop()
+
+    report = metrics.report()
+    pages = {st["labels"].get("endpoint"): st for st in report["stages"] if st["stage"] == "export.page"}
+    print(f"\n{len(args.entities)} entities at {args.scale:g}× in {wall:.2f}s – "
+          f"{args.page_workers} page / {args.entity_workers} entity workers, "
+          f"{args.max_in_flight} in flight; {args.latency * 1000:.0f} ms latency"
+          f" + {args.jitter * 1000:.0f} ms mean jitter, {args.error_rate:.0%} errors, "
+          f"{args.throttle_rate:.0%} throttled" + (f", {args.rate_limit:g} req/s limit" if args.rate_limit else ""))
+    print(f"  {'endpoint':<10}{'pages':>7}{'pages/s':>9}{'records/s':>11}{'MiB/s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for entity in args.entities:
+        st = pages.get(entity)
+        if st:
+            print(_row(entity, st["calls"], st["rows"], st["bytes"], wall, st.get("latency")))
+    print(_row("all", sum(st["calls"] for st in pages.values()), sum(st["rows"] for st in pages.values()),
+               sum(st["bytes"] for st in pages.values()), wall, metrics.latency("export.page")))
+
+    http = report["counters"].get("http", {})
+    if http:
+        print(f"  client: {http.get('requests', 0):,} requests, {http.get('retries', 0):,} retries "
+              f"({http.get('throttled', 0):,} throttled, {http.get('throttle_waits', 0):,} cool-down waits, "
+              f"{http.get('backoff_seconds', 0):.1f}s backing off), "
+              f"{http.get('token_refreshes', 0):,} token refreshes")
+    if mock:
+        print("  server: " + ", ".join(f"{k} {v:,}" for k, v in sorted(mock.stats.items())))
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json, scale=args.scale, entities=args.entities,
+                           page_workers=args.page_workers, entity_workers=args.entity_workers)
+        print(f"  metrics → {args.metrics_json}")
+
+    expected = mock.counts() if mock else {}
+    wrong = [f"{e}: {exported.get(e, (0, 0))[0]:,} records / {exported.get(e, (0, 0))[1]:,} ids of {n:,}"
+             for e, n in expected.items() if exported.get(e) != (n, n)]
+    if wrong:
+        sys.exit("❌ Exported record counts differ from the mock's: " + "; ".join(wrong))
+    if expected:
+        print(f"✅ All {sum(expected.values()):,} records exported exactly once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""Row-wise vs column-spec flattening check
+=========================================
+Runs the previous per-record invoice flatteners (kept below as
+``legacy_*``) and the declarative `utils.flatten` path now used by
+`inserts.invoices_insert` on the bundled ``INVOICES_API_*`` files, checks
+both produce the same rows and reports rows/sec.  The column specs were
+introduced for maintainability; expect the two to be on par (about
+0.9× at scale 1, 1.3× at scale 10), not a speed-up.
+
+Usage
+-----
+python benchmarks/bench_flatten.py
+python benchmarks/bench_flatten.py --scale 20 --repeat 5
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.common import arg_parser  # noqa: E402
+from inserts import invoices_insert as inv  # noqa: E402
+from utils.formats import is_data_file, read_records  # noqa: E402
+
+# ────────────────────────────────────────────
+# LEGACY ROW-WISE FLATTENERS (before utils.flatten)
+# ────────────────────────────────────────────
+_s = inv._s
+
+
+def legacy_invoices(raw: list[dict], file_id: str) -> pd.DataFrame:
+    recs = []
+    for x in raw:
+        recs.append([
+            _s(x.get("Id"))[:100],
+            _s(x.get("Number"))[:100],
+            _s(x.get("Type"))[:50],
+            _s(x.get("Status"))[:50],
+            x.get("CreatedDate"),
+            x.get("InvoicedDate"),
+            file_id[:50] if file_id else None,
+            _s(x.get("Customer", {}).get("Id"))[:100],
+            float(x.get("Total", {}).get("Amount") or 0),
+            inv.RUN_TS,
+        ])
+    df = pd.DataFrame(recs, columns=inv.INVOICE_COLS)
+    for col in ("CREATED_DTTM", "BILLED_DATE"):
+        df[col] = pd.to_datetime(df[col], utc=True, errors="coerce").dt.tz_localize(None)
+    return df
+
+
+def legacy_line_items(raw: list[dict], file_id: str) -> pd.DataFrame:
+    recs = []
+    for x in raw:
+        inv_id = _s(x.get("Id"))[:100]
+        inv_num = _s(x.get("Number"))[:100]
+        for li in x.get("LineItems", []):
+            currency = li.get("Amount", {}).get("Currency")
+            currency_code = None
+            if isinstance(currency, dict):
+                currency_code = _s(currency.get("Code"))[:10]
+            elif currency is not None:
+                currency_code = _s(currency)[:10]
+            rate = li.get("Rate", {})
+            recs.append([
+                _s(li.get("Id"))[:150],
+                inv_id,
+                inv_num,
+                _s(li.get("Name"))[:100],
+                float(li.get("Amount", {}).get("Amount") or 0),
+                currency_code,
+                float(rate.get("Rate") or 0),
+                _s(rate.get("Units"))[:20] if rate.get("Units") else None,
+                _s(rate.get("UnitOfMeasurement"))[:50] if rate.get("UnitOfMeasurement") else None,
+                _s(li.get("LoadNumber"))[:100] if li.get("LoadNumber") else None,
+                _s(li.get("Category"))[:50] if li.get("Category") else None,
+                file_id[:50] if file_id else None,
+                inv.RUN_TS,
+            ])
+    return pd.DataFrame(recs, columns=inv.LINE_ITEM_COLS)
+
+# ────────────────────────────────────────────
+# BENCHMARK
+# ────────────────────────────────────────────
+
+def legacy(raw, file_id):
+    return legacy_invoices(raw, file_id), legacy_line_items(raw, file_id)
+
+
+def columnar(raw, file_id):
+    invoices = inv.flatten_invoices(raw, file_id)
+    return invoices, inv.flatten_line_items(raw, invoices, file_id)
+
+
+def best_of(repeat: int, fn, *args):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def comparable(df: pd.DataFrame) -> pd.DataFrame:
+    """Same values regardless of None/NaN or object/str dtype choices."""
+    return df.astype(object).where(df.notna(), None).reset_index(drop=True)
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--data-dir", default=str(ROOT / "alvys_weekly_data"))
+    p.add_argument("--scale", type=int, default=1, help="Times to repeat each file's records")
+    p.add_argument("--repeat", type=int, default=3, help="Runs per flattener (best is kept)")
+    args = p.parse_args(argv)
+
+    files = sorted(f for f in os.listdir(args.data_dir) if is_data_file(f, "INVOICES_API_"))
+    if not files:
+        sys.exit(f"No INVOICES_API_* files in {args.data_dir}")
+
+    totals = {"legacy": 0.0, "columnar": 0.0}
+    rows = 0
+    for fname in files:
+        raw = read_records(os.path.join(args.data_dir, fname)) * args.scale
+        if not raw:
+            continue
+        file_id = raw[0].get("FILE_ID")
+        old_s, old = best_of(args.repeat, legacy, raw, file_id)
+        new_s, new = best_of(args.repeat, columnar, raw, file_id)
+        for a, b in zip(old, new):
+            pd.testing.assert_frame_equal(comparable(a), comparable(b), check_dtype=False)
+        totals["legacy"] += old_s
+        totals["columnar"] += new_s
+        rows += len(new[0]) + len(new[1])
+
+    print(f"{len(files)} file(s), {rows:,} invoice + line item rows (scale {args.scale})")
+    for name, secs in totals.items():
+        print(f"  {name:<9}: {secs:6.3f}s  ({rows / secs:>10,.0f} rows/s)")
+    print(f"  columnar / legacy rows/s : {totals['legacy'] / totals['columnar']:.1f}×")
+
+
+if __name__ == "__main__":
+    main()
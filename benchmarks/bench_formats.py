@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""On-disk size & parse-time benchmark for the weekly extract formats
+=====================================================================
+Re-encodes the bundled ``alvys_weekly_data`` files in every format from
+`utils.formats` (into a temp dir) and reports bytes on disk and the time
+`read_records` needs to load them back, relative to the current ``.json``.
+
+Usage
+-----
+python benchmarks/bench_formats.py                     # INVOICES_API_* files
+python benchmarks/bench_formats.py --prefix "" --repeat 5
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import arg_parser  # noqa: E402
+from utils.formats import FORMATS, is_data_file, open_data_file, read_records, write_records  # noqa: E402
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def available_formats() -> list[str]:
+    fmts = list(FORMATS)
+    try:
+        import zstandard  # type: ignore  # noqa: F401
+    except ImportError:
+        fmts.remove("ndjson.zst")
+        print("(zstandard not installed – skipping ndjson.zst)")
+    return fmts
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--data-dir", default=str(ROOT / "alvys_weekly_data"))
+    p.add_argument("--prefix", default="INVOICES_API_", help="File name prefix to include")
+    p.add_argument("--repeat", type=int, default=3, help="Parse runs per file (best is kept)")
+    args = p.parse_args(argv)
+
+    files = sorted(f for f in os.listdir(args.data_dir)
+                   if is_data_file(f, args.prefix) and f.endswith(".json"))
+    if not files:
+        sys.exit(f"No {args.prefix}*.json files in {args.data_dir}")
+    fmts = available_formats()
+    size = {fmt: 0 for fmt in fmts}
+    parse = {fmt: 0.0 for fmt in fmts}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fname in files:
+            src = os.path.join(args.data_dir, fname)
+            records = read_records(src)
+            stem = fname[: -len(".json")]
+            for fmt in fmts:
+                path = os.path.join(tmp, stem + FORMATS[fmt])
+                with open_data_file(path, "wt", fmt) as f:
+                    write_records(records, f, fmt)
+                if fmt == "json":
+                    path = src  # measure the real file, not our re-encoding
+                assert read_records(path) == records, f"{fmt} round-trip mismatch"
+                size[fmt] += os.path.getsize(path)
+                parse[fmt] += best_of(args.repeat, read_records, path)
+
+    print(f"{len(files)} file(s) matching {args.prefix!r}*")
+    print(f"{'format':<12}{'bytes':>14}{'size':>9}{'parse s':>10}{'speed':>9}")
+    for fmt in fmts:
+        print(
+            f"{fmt:<12}{size[fmt]:>14,}{size[fmt] / size['json']:>8.1%}"
+            f"{parse[fmt]:>10.3f}{parse['json'] / parse[fmt]:>8.1f}×"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""executemany vs bcp loader benchmark
+=====================================
+Flattens the bundled ``INVOICES_API_*`` line items (repeated ``--scale``
+times) and loads them into a scratch table with each backend from
+`utils.bulkcopy`, reporting rows/sec.
+
+Against a throw-away SQL Server container::
+
+    docker run -e ACCEPT_EULA=Y -e MSSQL_SA_PASSWORD='Bench_pass1' \\
+        -p 1433:1433 -d mcr.microsoft.com/mssql/server:2022-latest
+    python benchmarks/bench_loader.py --server localhost --user sa \\
+        --password Bench_pass1 --database master --scale 50
+
+Without a server (``--prep-only``) only the client-side work is timed:
+building executemany parameter rows vs writing the bcp data file.
+
+Usage
+-----
+python benchmarks/bench_loader.py --prep-only --scale 20
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import quote_plus
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.common import arg_parser  # noqa: E402
+from inserts import invoices_insert as inv  # noqa: E402
+from utils.bulkcopy import BCP_EXE, bcp_available, bcp_dataframe, write_bcp_file  # noqa: E402
+from utils.formats import is_data_file, read_records  # noqa: E402
+from utils.rows import append_dataframe, db_rows  # noqa: E402
+
+TABLE = "BENCH_LINE_ITEMS"
+
+
+def line_items(data_dir: str, scale: int) -> pd.DataFrame:
+    frames = []
+    for fname in sorted(os.listdir(data_dir)):
+        if is_data_file(fname, "INVOICES_API_"):
+            data = read_records(os.path.join(data_dir, fname))
+            if data:
+                file_id = data[0].get("FILE_ID")
+                frames.append(inv.flatten_line_items(data, inv.flatten_invoices(data, file_id), file_id))
+    if not frames:
+        sys.exit(f"No INVOICES_API_* files in {data_dir}")
+    df = pd.concat(frames * scale, ignore_index=True)
+    df["ID"] = df["ID"] + "_" + df.index.astype(str)  # keep IDs unique
+    return df
+
+
+def prep_only(df: pd.DataFrame):
+    start = time.perf_counter()
+    params = db_rows(df)
+    em_s = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        size = write_bcp_file(df, os.path.join(tmp, "bench.bcp"))
+        bcp_s = time.perf_counter() - start
+    print(f"{len(params):,} rows – client-side preparation only")
+    print(f"  executemany params : {em_s:6.2f}s  ({len(df) / em_s:>10,.0f} rows/s)")
+    print(f"  bcp data file      : {bcp_s:6.2f}s  ({len(df) / bcp_s:>10,.0f} rows/s, {size:,} bytes)")
+
+
+def against_server(df: pd.DataFrame, args):
+    from sqlalchemy import create_engine, text
+
+    url = (
+        f"mssql+pyodbc://{args.user}:{quote_plus(args.password)}@{args.server}/{args.database}"
+        f"?driver={quote_plus(args.driver)}&TrustServerCertificate=yes"
+    )
+    engine = create_engine(url, fast_executemany=True)
+    df.head(0).to_sql(TABLE, engine, schema=args.schema, if_exists="replace",
+                      index=False, dtype=inv.DTYPE_LINE_ITEMS)
+
+    def load_executemany():
+        append_dataframe(engine, df, args.schema, TABLE, inv.CHUNK_SIZE)
+
+    loaders = {"executemany": load_executemany}
+    if bcp_available(BCP_EXE):
+        loaders["bcp"] = lambda: bcp_dataframe(engine, df, args.schema, TABLE)
+    else:
+        print(f"({BCP_EXE!r} is not SQL Server's bcp – skipping the bcp loader)")
+
+    print(f"{len(df):,} rows → {args.schema}.{TABLE} @ {args.server}")
+    try:
+        for name, load in loaders.items():
+            with engine.begin() as conn:
+                conn.execute(text(f"TRUNCATE TABLE {args.schema}.{TABLE}"))
+            start = time.perf_counter()
+            load()
+            secs = time.perf_counter() - start
+            with engine.connect() as conn:
+                count = conn.execute(text(f"SELECT COUNT(*) FROM {args.schema}.{TABLE}")).scalar()
+            assert count == len(df), f"{name}: {count:,} rows loaded, expected {len(df):,}"
+            print(f"  {name:<12}: {secs:6.2f}s  ({len(df) / secs:>10,.0f} rows/s)")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {args.schema}.{TABLE}"))
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--data-dir", default=str(ROOT / "alvys_weekly_data"))
+    p.add_argument("--scale", type=int, default=10, help="Times to repeat the bundled rows")
+    p.add_argument("--prep-only", action="store_true", help="No server: time client-side work only")
+    p.add_argument("--server", default=os.getenv("BENCH_SQL_SERVER", "localhost"))
+    p.add_argument("--database", default=os.getenv("BENCH_SQL_DATABASE", "master"))
+    p.add_argument("--user", default=os.getenv("BENCH_SQL_USERNAME", "sa"))
+    p.add_argument("--password", default=os.getenv("BENCH_SQL_PASSWORD", ""))
+    p.add_argument("--schema", default="dbo")
+    p.add_argument("--driver", default="ODBC Driver 17 for SQL Server")
+    args = p.parse_args(argv)
+
+    df = line_items(args.data_dir, args.scale)
+    if args.prep_only:
+        prep_only(df)
+    else:
+        against_server(df, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""Sequential vs concurrent pagination benchmark
+================================================
+Spins up a tiny local stub of an Alvys ``/search`` endpoint (per-request
+plus per-item latency, ``page``/``pageSize`` contract) and times
+`alvys_export.fetch_paginated_data` sequentially at the fixed ``PAGE_SIZE``,
+sequentially with the adaptive page size, and in concurrent mode.
+
+``--fail-rate`` makes that share of requests answer 429 (with
+``Retry-After``) or 503 instead; every mode must still return every item,
+and the client stats show the retries it took.
+
+``--cap`` makes the stub serve at most that many items per page whatever
+``pageSize`` asks for, as some APIs do; with ``--no-total`` this is the
+case where adaptive paging must notice the cap from short pages alone.
+
+Usage
+-----
+python benchmarks/bench_pagination.py --items 10000 --latency 0.05 --workers 8
+python benchmarks/bench_pagination.py --no-total   # force probe-ahead mode
+python benchmarks/bench_pagination.py --fail-rate 0.1 --retry-after 0.2
+python benchmarks/bench_pagination.py --items 1000 --cap 200 --no-total
+"""
+from __future__ import annotations
+
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import alvys_export  # noqa: E402
+from alvys_client import AlvysClient  # noqa: E402
+from benchmarks.common import arg_parser  # noqa: E402
+
+
+def make_handler(items: list, latency: float, advertise_total: bool,
+                 per_item: float = 0.0, fail_rate: float = 0.0, retry_after: float = 0.0,
+                 cap: int = 0):
+    rng = random.Random(42)
+    rng_lock = threading.Lock()
+
+    class StubSearch(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+        disable_nagle_algorithm = True
+
+        def do_POST(self):  # noqa: N802 – http.server API
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            page, size = body.get("page", 0), body.get("pageSize", 200)
+            if cap:
+                size = min(size, cap)
+            with rng_lock:
+                fail = rng.random() < fail_rate and rng.choice((429, 503))
+            if fail:
+                time.sleep(latency)
+                self.send_response(fail)
+                if fail == 429:
+                    self.send_header("Retry-After", f"{retry_after:g}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            result = {"Items": items[page * size:(page + 1) * size]}
+            time.sleep(latency + per_item * len(result["Items"]))
+            if advertise_total:
+                result["TotalCount"] = len(items)
+            raw = json.dumps(result).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):
+            pass
+
+    return StubSearch
+
+
+def timed(url: str, workers: int, adaptive: bool = False) -> tuple[float, list, str]:
+    with AlvysClient(pool_size=max(workers, 1), backoff_base=0.05) as client:
+        start = time.perf_counter()
+        pages = alvys_export.iter_pages(url, {}, {}, workers=workers, client=client, adaptive=adaptive)
+        data = [item for batch in pages for item in batch]
+        return time.perf_counter() - start, data, client.stats.summary()
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--items", type=int, default=10_000)
+    p.add_argument("--latency", type=float, default=0.05, help="Seconds per request")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--per-item", type=float, default=0.0, help="Extra seconds per item returned")
+    p.add_argument("--no-total", action="store_true", help="Omit TotalCount (probe-ahead mode)")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered 429/503")
+    p.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with a 429")
+    p.add_argument("--cap", type=int, default=0, help="Most items the stub serves per page (0 = pageSize)")
+    args = p.parse_args(argv)
+
+    items = [{"Id": f"{i:08d}", "Number": str(i)} for i in range(args.items)]
+    handler = make_handler(items, args.latency, not args.no_total,
+                           args.per_item, args.fail_rate, args.retry_after, args.cap)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/invoices/search"
+
+    try:
+        seq_s, seq_data, seq_http = timed(url, 1)
+        ada_s, ada_data, ada_http = timed(url, 1, adaptive=True)
+        con_s, con_data, con_http = timed(url, args.workers)
+    finally:
+        server.shutdown()
+
+    assert seq_data == items, "sequential result differs from the stub's items"
+    assert ada_data == items, "adaptive result differs from the stub's items"
+    assert con_data == items, "concurrent result differs from the stub's items"
+    pages = -(-args.items // alvys_export.PAGE_SIZE)
+    print(f"{args.items:,} items / {pages} pages @ {args.latency * 1000:.0f} ms latency"
+          f" + {args.per_item * 1e6:.0f} µs/item, {args.fail_rate:.0%} failed requests")
+    print(f"  sequential           : {seq_s:6.2f}s  [{seq_http}]")
+    print(f"  adaptive page size   : {ada_s:6.2f}s  ({seq_s / ada_s:.1f}× faster)  [{ada_http}]")
+    print(f"  concurrent ({args.workers:>2} wkr) : {con_s:6.2f}s  ({seq_s / con_s:.1f}× faster)  [{con_http}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""Export pruning benchmark
+==========================
+Re-writes the bundled ``INVOICES_API_*`` files the way ``export --prune``
+would – every record projected onto the fields the insert modules read
+(`alvys_export.export_fields`) – and compares them with the full files:
+bytes on disk per format, time to parse them back and time to flatten the
+parsed records.  The pruned files must flatten to the same rows.
+
+Usage
+-----
+python benchmarks/bench_prune.py
+python benchmarks/bench_prune.py --formats json ndjson.gz --repeat 5
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd  # noqa: E402
+
+from alvys_export import export_fields  # noqa: E402
+from benchmarks.common import arg_parser  # noqa: E402
+from inserts import invoices_insert as inv  # noqa: E402
+from utils.formats import FORMATS, is_data_file, open_data_file, project, read_records, write_records  # noqa: E402
+
+
+def best_of(repeat: int, fn, *args):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def write(records: list[dict], path: str, fmt: str) -> int:
+    with open_data_file(path, "wt", fmt) as f:
+        write_records(records, f, fmt)
+    return os.path.getsize(path)
+
+
+def flatten(records: list[dict]):
+    invoices = inv.flatten_invoices(records, "BENCH")
+    return invoices, inv.flatten_line_items(records, invoices, "BENCH")
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--data-dir", default=str(ROOT / "alvys_weekly_data"))
+    p.add_argument("--formats", nargs="+", choices=list(FORMATS), default=["json", "ndjson", "ndjson.gz"])
+    p.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+    args = p.parse_args(argv)
+
+    fields = export_fields("invoices")
+    files = sorted(f for f in os.listdir(args.data_dir) if is_data_file(f, "INVOICES_API_"))
+    if not files:
+        sys.exit(f"No INVOICES_API_* files in {args.data_dir}")
+    full = [rec for f in files for rec in read_records(os.path.join(args.data_dir, f))]
+    pruned = [project(rec, fields) for rec in full]
+    for a, b in zip(flatten(full), flatten(pruned)):
+        pd.testing.assert_frame_equal(a, b)
+
+    print(f"{len(files)} file(s), {len(full):,} invoices – full vs --prune")
+    print(f"  {'format':<11}{'full MiB':>10}{'pruned MiB':>12}{'saved':>7}"
+          f"{'parse full':>12}{'parse pruned':>14}{'speed-up':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.formats:
+            sizes, parse = {}, {}
+            for name, records in (("full", full), ("pruned", pruned)):
+                path = os.path.join(tmp, f"INVOICES_{name}{FORMATS[fmt]}")
+                sizes[name] = write(records, path, fmt)
+                parse[name], _ = best_of(args.repeat, read_records, path)
+            print(f"  {fmt:<11}{sizes['full'] / 2**20:>10.1f}{sizes['pruned'] / 2**20:>12.1f}"
+                  f"{1 - sizes['pruned'] / sizes['full']:>7.0%}"
+                  f"{parse['full']:>11.3f}s{parse['pruned']:>13.3f}s"
+                  f"{parse['full'] / parse['pruned']:>9.1f}×")
+
+    flat_full, _ = best_of(args.repeat, flatten, full)
+    flat_pruned, _ = best_of(args.repeat, flatten, pruned)
+    print(f"  flatten: full {flat_full:.3f}s, pruned {flat_pruned:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""NULL handling / parameter-row building benchmark
+==================================================
+Builds executemany parameter rows from the flattened ``INVOICES_API_*``
+line items at growing row counts and reports time and peak Python memory
+(``tracemalloc``) for:
+
+* ``where-frame`` – ``df.where(pd.notnull(df), None)`` on the whole frame,
+  as the bulk inserts did before `utils.rows`,
+* ``where-batch`` – the old ``batch_insert`` loop, which re-ran that
+  ``where`` against the full frame for every 500-row batch (quadratic),
+* ``utils.rows`` – typed columns → tuples one batch at a time.
+
+Per-row time and memory should stay flat for ``utils.rows`` as rows grow;
+``--check`` exits non-zero if its per-row time grows by more than
+``--tolerance`` between the smallest and largest size.
+
+Usage
+-----
+python benchmarks/bench_rows.py
+python benchmarks/bench_rows.py --sizes 10000 40000 160000 --check
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.common import arg_parser  # noqa: E402
+from inserts import invoices_insert as inv  # noqa: E402
+from utils.formats import is_data_file, read_records  # noqa: E402
+from utils.rows import iter_batches  # noqa: E402
+
+BATCH_SIZE = 500
+# where-batch is quadratic – skip it above this many rows
+MAX_QUADRATIC_ROWS = 40_000
+
+
+def line_items(data_dir: str, rows: int) -> pd.DataFrame:
+    frames = []
+    for fname in sorted(os.listdir(data_dir)):
+        if is_data_file(fname, "INVOICES_API_"):
+            data = read_records(os.path.join(data_dir, fname))
+            if data:
+                file_id = data[0].get("FILE_ID")
+                frames.append(inv.flatten_line_items(data, inv.flatten_invoices(data, file_id), file_id))
+    if not frames:
+        sys.exit(f"No INVOICES_API_* files in {data_dir}")
+    base = pd.concat(frames, ignore_index=True)
+    reps = -(-rows // len(base))
+    return pd.concat([base] * reps, ignore_index=True).iloc[:rows].copy()
+
+
+def where_frame(df: pd.DataFrame) -> int:
+    rows = df.where(pd.notnull(df), None).values.tolist()
+    return sum(len(rows[i:i + BATCH_SIZE]) for i in range(0, len(rows), BATCH_SIZE))
+
+
+def where_batch(df: pd.DataFrame) -> int:
+    sent = 0
+    for i in range(0, len(df), BATCH_SIZE):
+        sent += len(df.iloc[i:i + BATCH_SIZE].where(pd.notnull(df), None).values.tolist())
+    return sent
+
+
+def typed_rows(df: pd.DataFrame) -> int:
+    return sum(len(batch) for batch in iter_batches(df, BATCH_SIZE))
+
+
+METHODS = {"where-frame": where_frame, "where-batch": where_batch, "utils.rows": typed_rows}
+
+
+def measure(fn, df: pd.DataFrame) -> tuple[float, int]:
+    """(seconds, peak bytes allocated) for one call.
+
+    Timed and traced in separate runs – tracing slows allocation-heavy code.
+    """
+    start = time.perf_counter()
+    sent = fn(df)
+    secs = time.perf_counter() - start
+    tracemalloc.start()
+    fn(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert sent == len(df), f"{fn.__name__}: {sent:,} rows built, expected {len(df):,}"
+    return secs, peak
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--data-dir", default=str(ROOT / "alvys_weekly_data"))
+    p.add_argument("--sizes", type=int, nargs="+", default=[5_000, 10_000, 20_000, 40_000, 80_000])
+    p.add_argument("--check", action="store_true", help="Fail if utils.rows is not linear")
+    p.add_argument("--tolerance", type=float, default=1.5,
+                   help="Allowed growth of utils.rows per-row time, largest vs smallest size")
+    args = p.parse_args(argv)
+
+    sizes = sorted(args.sizes)
+    full = line_items(args.data_dir, sizes[-1])
+    print(f"{'method':<12}{'rows':>10}{'seconds':>10}{'µs/row':>9}{'peak MiB':>10}{'B/row':>8}")
+    per_row = {}
+    for name, fn in METHODS.items():
+        for n in sizes:
+            if name == "where-batch" and n > MAX_QUADRATIC_ROWS:
+                continue
+            secs, peak = measure(fn, full.iloc[:n])
+            per_row.setdefault(name, []).append(secs / n)
+            print(f"{name:<12}{n:>10,}{secs:>10.3f}{secs / n * 1e6:>9.2f}"
+                  f"{peak / 2**20:>10.1f}{peak / n:>8.0f}")
+
+    growth = per_row["utils.rows"][-1] / per_row["utils.rows"][0]
+    print(f"utils.rows per-row time, {sizes[-1]:,} vs {sizes[0]:,} rows: {growth:.2f}×")
+    if args.check and growth > args.tolerance:
+        sys.exit(f"❌ utils.rows is not linear: per-row time grew {growth:.2f}× (> {args.tolerance}×)")
+
+
+if __name__ == "__main__":
+    main()
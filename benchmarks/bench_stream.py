@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""Whole-file vs streaming JSON parse benchmark
+==============================================
+Writes synthetic ``INVOICES_API_*`` weeks of growing size (the bundled
+records repeated ``--scales`` times) and flattens each one in a fresh child
+process with:
+
+* ``read_records`` – ``json.load`` of the whole file, then flatten,
+* ``iter_records`` – streamed, projected to ``INVOICE_FIELDS`` and
+  flattened in ``PIPELINE_CHUNK_ROWS`` batches (what the insert modules do).
+
+Peak RSS of the child (``ru_maxrss``) is reported next to the import-only
+baseline; for ``iter_records`` it should stay flat as the file grows.
+
+Usage
+-----
+python benchmarks/bench_stream.py
+python benchmarks/bench_stream.py --scales 10 40 --chunk-rows 20000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import arg_parser  # noqa: E402
+from inserts import invoices_insert as inv  # noqa: E402
+from utils.formats import is_data_file, iter_records, read_records, write_records  # noqa: E402
+from utils.pipeline import PIPELINE_CHUNK_ROWS, batches  # noqa: E402
+
+METHODS = ("baseline", "read_records", "iter_records")
+
+
+def run(method: str, path: str, chunk_rows: int) -> dict:
+    """Flatten ``path`` with ``method`` → rows, seconds (in this process)."""
+    start = time.perf_counter()
+    rows = 0
+    if method == "read_records":
+        data = read_records(path)
+        invoices = inv.flatten_invoices(data, "BENCH")
+        rows = len(invoices) + len(inv.flatten_line_items(data, invoices, "BENCH"))
+    elif method == "iter_records":
+        for part in batches(iter_records(path, inv.INVOICE_FIELDS), chunk_rows):
+            invoices = inv.flatten_invoices(part, "BENCH")
+            rows += len(invoices) + len(inv.flatten_line_items(part, invoices, "BENCH"))
+    return {"rows": rows, "seconds": time.perf_counter() - start}
+
+
+def child(method: str, path: str, chunk_rows: int):
+    out = run(method, path, chunk_rows)
+    out["peak_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    print(json.dumps(out))
+
+
+def measure(method: str, path: str, chunk_rows: int) -> dict:
+    proc = subprocess.run(
+        [sys.executable, __file__, "--child", method, path, "--chunk-rows", str(chunk_rows)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def write_week(records: list[dict], scale: int, path: str) -> int:
+    with open(path, "w", encoding="utf-8") as f:
+        write_records((rec for _ in range(scale) for rec in records), f, "json")
+    return os.path.getsize(path)
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--data-dir", default=str(ROOT / "alvys_weekly_data"))
+    p.add_argument("--scales", type=int, nargs="+", default=[2, 4, 8])
+    p.add_argument("--chunk-rows", type=int, default=PIPELINE_CHUNK_ROWS)
+    p.add_argument("--child", nargs=2, metavar=("METHOD", "PATH"), help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+    if args.child:
+        return child(*args.child, args.chunk_rows)
+
+    records = []
+    for fname in sorted(os.listdir(args.data_dir)):
+        if is_data_file(fname, "INVOICES_API_"):
+            records.extend(read_records(os.path.join(args.data_dir, fname)))
+    if not records:
+        sys.exit(f"No INVOICES_API_* files in {args.data_dir}")
+
+    print(f"{'file MiB':>9}  {'method':<13}{'rows':>10}{'seconds':>9}{'peak RSS MiB':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in sorted(args.scales):
+            path = os.path.join(tmp, f"INVOICES_API_x{scale}.json")
+            size = write_week(records, scale, path)
+            for method in METHODS:
+                res = measure(method, path, args.chunk_rows)
+                print(f"{size / 2**20:>9.0f}  {method:<13}{res['rows']:>10,}"
+                      f"{res['seconds']:>9.2f}{res['peak_kib'] / 1024:>14.0f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+"""Insert-path benchmark suite on synthetic data, with stored baselines
+=====================================================================
+Generates ``--scales`` × one bundled week of every entity with
+``benchmarks/synth.py`` and times each stage of the insert path per entity:
+
+* ``parse``   – ``iter_records`` over the entity's files (projected to the
+  module's fields, as the insert modules read them),
+* ``flatten`` – the module's flatteners into DataFrames (snapshots: the
+  sanitisers + ``pd.DataFrame``),
+* ``rows``    – executemany parameter rows (``utils.rows.db_rows``),
+* ``insert``  – ``utils.rows.append_dataframe`` into an in-memory SQLite
+  sink with the ``TBXX`` schema attached.
+
+Rows/sec per stage are compared with ``benchmarks/baselines/bench_suite.json``
+(best of ``--repeat`` runs).  ``--check`` exits non-zero when a stage is
+more than ``--tolerance`` slower than its baseline (stages shorter than
+``--min-seconds`` are too noisy to judge and only reported);
+``--save-baseline`` records the current numbers instead.  Baselines are machine-specific –
+re-record them on the machine that runs ``--check``.
+
+Usage
+-----
+python benchmarks/bench_suite.py
+python benchmarks/bench_suite.py --scales 10 100 --entities invoices trips --check
+python benchmarks/bench_suite.py --save-baseline
+"""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd  # noqa: E402
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from benchmarks import synth  # noqa: E402
+from benchmarks.common import arg_parser  # noqa: E402
+from inserts import active_entities_insert as ae  # noqa: E402
+from inserts import invoices_insert as inv  # noqa: E402
+from inserts import loads_insert as lo  # noqa: E402
+from inserts import trips_insert as tr  # noqa: E402
+from utils.formats import find_data_file, is_data_file, iter_records  # noqa: E402
+from utils.rows import append_dataframe, db_rows  # noqa: E402
+
+BASELINE = ROOT / "benchmarks" / "baselines" / "bench_suite.json"
+STAGES = ("parse", "flatten", "rows", "insert")
+SCHEMA = "TBXX"
+BATCH_SIZE = 1_000
+
+
+def _trips(recs: list) -> Dict[str, pd.DataFrame]:
+    trips = tr.flatten_trips(recs, "BENCH")
+    return {"TRIPS_RAW": trips, "TRIP_STOPS_RAW": tr.flatten_stops(recs, trips, "BENCH")}
+
+
+def _invoices(recs: list) -> Dict[str, pd.DataFrame]:
+    invoices = inv.flatten_invoices(recs, "BENCH")
+    return {"INVOICES_RAW": invoices, "INVOICE_LINE_ITEMS_RAW": inv.flatten_line_items(recs, invoices, "BENCH")}
+
+
+def _snapshot(entity: str) -> Callable[[list], Dict[str, pd.DataFrame]]:
+    _, table, sanitize = ae.SNAPSHOTS[entity]
+    return lambda recs: {table: pd.DataFrame([sanitize(r) for r in recs])}
+
+
+# entity → (files in the data folder, projection, records → {table: frame})
+ENTITIES = {
+    "loads": (lambda d: _weekly(d, "LOADS_API_"), lo.LOAD_FIELDS,
+              lambda recs: {"LOADS_RAW": lo.flatten_loads(recs, "BENCH")}),
+    "trips": (lambda d: _weekly(d, "TRIPS_API_"), tr.TRIP_FIELDS, _trips),
+    "invoices": (lambda d: _weekly(d, "INVOICES_API_"), inv.INVOICE_FIELDS, _invoices),
+    **{
+        entity: (lambda d, e=entity: [find_data_file(d, synth.SNAPSHOTS[e])], None, _snapshot(entity))
+        for entity in synth.SNAPSHOTS
+    },
+}
+
+
+def _weekly(data_dir: str, prefix: str) -> List[str]:
+    return [os.path.join(data_dir, f) for f in sorted(os.listdir(data_dir)) if is_data_file(f, prefix)]
+
+
+def sink_engine():
+    """In-memory SQLite standing in for SQL Server (``TBXX`` attached)."""
+    sqlite3.register_adapter(pd.Timestamp, lambda ts: ts.isoformat(" "))
+    engine = create_engine("sqlite://", poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _attach(dbapi_conn, _):
+        dbapi_conn.execute(f"ATTACH ':memory:' AS {SCHEMA}")
+
+    return engine
+
+
+def _insert(engine, frames: Dict[str, pd.DataFrame]) -> int:
+    rows = 0
+    for table, df in frames.items():
+        df.head(0).to_sql(table, engine, schema=SCHEMA, if_exists="replace", index=False)
+        rows += append_dataframe(engine, df, SCHEMA, table, BATCH_SIZE)
+    return rows
+
+
+def run_entity(entity: str, data_dir: str, engine, repeat: int) -> Dict[str, dict]:
+    """Best-of-``repeat`` seconds and row counts of every stage."""
+    files_of, fields, flatten = ENTITIES[entity]
+    files = files_of(data_dir)
+    best: Dict[str, dict] = {}
+
+    def timed(stage: str, fn, count):
+        start = time.perf_counter()
+        out = fn()
+        secs = time.perf_counter() - start
+        if stage not in best or secs < best[stage]["seconds"]:
+            best[stage] = {"seconds": secs, "rows": count(out)}
+        return out
+
+    for _ in range(repeat):
+        records = timed("parse", lambda: [r for f in files for r in iter_records(f, fields, stage=None)], len)
+        frames = timed("flatten", lambda: flatten(records), lambda fr: sum(len(df) for df in fr.values()))
+        timed("rows", lambda: [db_rows(df) for df in frames.values()], lambda out: sum(map(len, out)))
+        timed("insert", lambda: _insert(engine, frames), lambda n: n)
+    for st in best.values():
+        st["rows_per_sec"] = st["rows"] / st["seconds"] if st["seconds"] else 0.0
+    return best
+
+
+def load_baseline(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--scales", type=float, nargs="+", default=[10])
+    p.add_argument("--weeks", type=int, default=1)
+    p.add_argument("--entities", nargs="+", choices=list(ENTITIES), default=list(ENTITIES))
+    p.add_argument("--repeat", type=int, default=3, help="Runs per stage (best is kept)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--baseline", type=Path, default=BASELINE)
+    p.add_argument("--tolerance", type=float, default=0.25,
+                   help="Allowed rows/sec drop vs. the baseline before --check fails")
+    p.add_argument("--min-seconds", type=float, default=0.02,
+                   help="Stages faster than this are not checked against the baseline")
+    p.add_argument("--check", action="store_true", help="Exit non-zero on a regression")
+    p.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    args = p.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    results: Dict[str, Dict[str, Dict[str, dict]]] = {}
+    regressions: List[str] = []
+    engine = sink_engine()
+
+    print(f"{'scale':>6}  {'entity':<10}{'stage':<9}{'rows':>10}{'seconds':>9}{'rows/s':>12}"
+          f"{'baseline':>12}{'Δ':>8}")
+    for scale in args.scales:
+        key = f"{scale:g}x"
+        with tempfile.TemporaryDirectory() as tmp:
+            synth.generate(tmp, scale, args.weeks, seed=args.seed, entities=args.entities)
+            for entity in args.entities:
+                stages = run_entity(entity, tmp, engine, args.repeat)
+                results.setdefault(key, {})[entity] = stages
+                for stage in STAGES:
+                    st = stages[stage]
+                    base = baseline.get("results", {}).get(key, {}).get(entity, {}).get(stage, {})
+                    base_rate = base.get("rows_per_sec")
+                    delta = st["rows_per_sec"] / base_rate - 1 if base_rate else None
+                    if delta is not None and delta < -args.tolerance and st["seconds"] >= args.min_seconds:
+                        regressions.append(f"{key} {entity} {stage} {delta:+.0%}")
+                    print(f"{key:>6}  {entity:<10}{stage:<9}{st['rows']:>10,}{st['seconds']:>9.3f}"
+                          f"{st['rows_per_sec']:>12,.0f}"
+                          + (f"{base_rate:>12,.0f}{delta:>+8.0%}" if base_rate else f"{'–':>12}{'':>8}"))
+
+    if args.save_baseline:
+        stored = baseline.get("results", {})
+        for key, entities in results.items():
+            for entity, stages in entities.items():
+                stored.setdefault(key, {})[entity] = {
+                    stage: {"rows": st["rows"], "seconds": round(st["seconds"], 4),
+                            "rows_per_sec": round(st["rows_per_sec"], 1)}
+                    for stage, st in stages.items()
+                }
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "recorded": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "machine": {"python": platform.python_version(), "pandas": pd.__version__,
+                            "platform": platform.platform(), "processor": platform.machine()},
+                "results": stored,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved → {args.baseline}")
+
+    if regressions:
+        print("Regressions beyond "
+              f"{args.tolerance:.0%}:\n  " + "\n  ".join(regressions))
+        if args.check:
+            sys.exit(1)
+    elif baseline and not args.save_baseline:
+        print(f"No stage more than {args.tolerance:.0%} below the baseline")
+
+
+if __name__ == "__main__":
+    main()
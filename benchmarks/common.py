@@ -0,0 +1,19 @@
+"""Helpers shared by the benchmark scripts."""
+from __future__ import annotations
+
+import argparse
+
+
+def arg_parser(doc: str) -> argparse.ArgumentParser:
+    """Parser whose ``--help`` shows a script's docstring.
+
+    The docstring's title (line 0, above its ``====`` underline) is the
+    description; the rest – what it measures and the usage examples – is
+    shown verbatim after the options.
+    """
+    title, _, body = doc.strip().partition("\n")
+    return argparse.ArgumentParser(
+        description=title,
+        epilog=body.lstrip("=\n").rstrip() or None,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
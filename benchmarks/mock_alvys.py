@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+"""Local stand-in for the Alvys API, for load-testing the exporter
+=================================================================
+Implements the two contracts ``alvys_export`` relies on:
+
+* ``POST /authentication/<tenant>/token`` – form-encoded client
+  credentials in, ``{"access_token", "token_type", "expires_in"}`` out;
+* ``POST /p/v<n>/<entity>/search`` for trips, loads, invoices, drivers,
+  trucks, trailers, customers and carriers – a bearer token and a JSON
+  body with ``page`` / ``pageSize`` in, ``{"Items": [...], "TotalCount": n}``
+  out (``--no-total`` leaves the count out, as some searches do).
+
+Every entity serves ``--scale`` × one bundled week of
+``benchmarks/synth.py`` records, serialised once at start-up so the server's
+own CPU time stays out of the measurements.  Date ranges and status filters
+are accepted and ignored: a search always pages through the whole set.
+
+Knobs for load tests:
+
+* ``--latency`` seconds per request, ``--per-item`` seconds per returned
+  record and ``--jitter`` – the mean of an exponential extra delay, which
+  gives the latency a tail;
+* ``--error-rate`` – share of searches answered 500 / 502 / 503;
+* ``--throttle-rate`` – share answered 429 at random, and ``--rate-limit``
+  – requests/sec (token bucket of ``--burst``) above which searches get a
+  429; both send ``Retry-After: --retry-after``;
+* ``--token-ttl`` – token lifetime; expired or unknown tokens get a 401.
+
+Run it standalone and point the pipeline at it with ``ALVYS_API_ROOT``,
+or drive it in-process with ``benchmarks/bench_export.py``.
+
+Usage
+-----
+python benchmarks/mock_alvys.py --port 8765 --scale 10 --latency 0.05 --jitter 0.02
+ALVYS_API_ROOT=http://127.0.0.1:8765 python main.py export --scac MOCK ...
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks import synth  # noqa: E402
+from benchmarks.common import arg_parser  # noqa: E402
+
+TOKEN_PATH = re.compile(r"^/authentication/(?P<tenant>[^/]+)/token/?$")
+SEARCH_PATH = re.compile(r"^/p/v\d+/(?P<entity>[a-z]+)/search/?$")
+ERROR_CODES = (500, 502, 503)
+
+
+class RateLimit:
+    """Token bucket: ``rate`` requests/sec with bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """0 if the request may go ahead, else seconds until it could."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class MockAlvys:
+    """The mock server; use as a context manager or call :meth:`start` / :meth:`stop`.
+
+    :attr:`url` is the API root to use as ``ALVYS_API_ROOT``;
+    :meth:`counts` says how many records each entity serves and
+    :attr:`stats` counts what was answered.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, scale: float = 1.0, seed: int = 0,
+                 entities: Optional[List[str]] = None, latency: float = 0.0, per_item: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 rate_limit: float = 0.0, burst: Optional[float] = None, retry_after: float = 1.0,
+                 token_ttl: float = 3600, total: bool = True, data_dir: str = str(synth.DATA_DIR)):
+        self.entities = list(entities or synth.ENTITIES)
+        self.scale, self.seed, self.data_dir = scale, seed, data_dir
+        self.latency, self.per_item, self.jitter = latency, per_item, jitter
+        self.error_rate, self.throttle_rate = error_rate, throttle_rate
+        self.limit = RateLimit(rate_limit, burst) if rate_limit else None
+        self.retry_after = retry_after
+        self.token_ttl = token_ttl
+        self.total = total
+        self.stats: Counter = Counter()
+        self._records: Dict[str, List[bytes]] = {}
+        self._tokens: Dict[str, float] = {}  # token → expiry (monotonic)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def counts(self) -> Dict[str, int]:
+        """Records served per entity."""
+        return {entity: max(int(synth.week_volume(entity, self.data_dir) * self.scale), 1)
+                for entity in self.entities}
+
+    def start(self) -> "MockAlvys":
+        for entity, count in self.counts().items():
+            self._records[entity] = [
+                json.dumps(rec, separators=(",", ":")).encode()
+                for rec in synth.synthetic_records(entity, count, self.seed, data_dir=self.data_dir)
+            ]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockAlvys":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ── request handling ─────────────────────────────────────────────────
+    def issue_token(self) -> str:
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._tokens[token] = time.monotonic() + self.token_ttl
+        return token
+
+    def token_ok(self, header: Optional[str]) -> bool:
+        scheme, _, token = (header or "").partition(" ")
+        with self._lock:
+            expiry = self._tokens.get(token) if scheme.lower() == "bearer" else None
+        return expiry is not None and expiry > time.monotonic()
+
+    def fault(self) -> Optional[int]:
+        """The status a search is answered with instead of a page, if any."""
+        if self.limit and self.limit.take():
+            return 429
+        with self._lock:
+            roll = self._rng.random()
+            if roll < self.throttle_rate:
+                return 429
+            if roll < self.throttle_rate + self.error_rate:
+                return self._rng.choice(ERROR_CODES)
+            return None
+
+    def delay(self, items: int = 0) -> float:
+        with self._lock:
+            extra = self._rng.expovariate(1 / self.jitter) if self.jitter else 0.0
+        return self.latency + self.per_item * items + extra
+
+    def serves(self, entity: str) -> bool:
+        return entity in self._records
+
+    def page(self, entity: str, page: int, size: int) -> tuple[bytes, int]:
+        """The JSON body of one search page and its item count."""
+        records = self._records[entity]
+        items = records[page * size:(page + 1) * size] if page >= 0 and size > 0 else []
+        body = b'{"Items":[' + b",".join(items) + b"]"
+        if self.total:
+            body += b',"TotalCount":' + str(len(records)).encode()
+        return body + b"}", len(items)
+
+    def count(self, **values: int) -> None:
+        with self._lock:
+            self.stats.update(values)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+
+    def do_POST(self):  # noqa: N802 – http.server API
+        mock: MockAlvys = self.server.mock
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if TOKEN_PATH.match(self.path):
+            form = parse_qs(raw.decode())
+            if not form.get("client_id") or not form.get("client_secret"):
+                mock.count(bad_requests=1)
+                return self._send(400, {"error": "invalid_client"})
+            mock.count(tokens=1)
+            return self._send(200, {"access_token": mock.issue_token(), "token_type": "Bearer",
+                                    "expires_in": mock.token_ttl})
+
+        match = SEARCH_PATH.match(self.path)
+        if not match or not mock.serves(match["entity"]):
+            mock.count(not_found=1)
+            return self._send(404, {"error": f"no such endpoint {self.path}"})
+        if not mock.token_ok(self.headers.get("Authorization")):
+            mock.count(unauthorized=1)
+            return self._send(401, {"error": "invalid_token"})
+        status = mock.fault()
+        if status:
+            time.sleep(mock.delay())
+            mock.count(**{"throttled" if status == 429 else "errors": 1})
+            headers = {"Retry-After": f"{mock.retry_after:g}"} if status == 429 else {}
+            return self._send(status, {"error": "throttled" if status == 429 else "unavailable"}, headers)
+        try:
+            body = json.loads(raw or b"{}")
+            page, size = int(body.get("page", 0)), int(body.get("pageSize", 200))
+        except (ValueError, TypeError, AttributeError):
+            mock.count(bad_requests=1)
+            return self._send(400, {"error": "invalid search body"})
+        data, items = mock.page(match["entity"], page, size)
+        time.sleep(mock.delay(items))
+        mock.count(pages=1, items=items, bytes=len(data))
+        self._send(200, data)
+
+    def _send(self, status: int, body, headers: Optional[Dict[str, str]] = None) -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def add_server_args(p: argparse.ArgumentParser) -> None:
+    """Options shared by this script and ``bench_export.py``."""
+    p.add_argument("--scale", type=float, default=1.0, help="Multiple of one bundled week per entity")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--latency", type=float, default=0.02, help="Seconds per request")
+    p.add_argument("--per-item", type=float, default=0.0, help="Extra seconds per record returned")
+    p.add_argument("--jitter", type=float, default=0.0, help="Mean of an exponential extra delay")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Share of searches answered 5xx")
+    p.add_argument("--throttle-rate", type=float, default=0.0, help="Share of searches answered 429")
+    p.add_argument("--rate-limit", type=float, default=0.0,
+                   help="Searches/sec before the server answers 429 (0 = unlimited)")
+    p.add_argument("--burst", type=float, default=None, help="Token bucket size of --rate-limit")
+    p.add_argument("--retry-after", type=float, default=0.2, help="Retry-After seconds sent with a 429")
+    p.add_argument("--token-ttl", type=float, default=3600, help="Token lifetime in seconds")
+    p.add_argument("--no-total", action="store_true", help="Omit TotalCount (probe-ahead mode)")
+
+
+def server_from_args(args: argparse.Namespace, entities: Optional[List[str]] = None,
+                     host: str = "127.0.0.1", port: int = 0) -> MockAlvys:
+    return MockAlvys(host, port, args.scale, args.seed, entities, args.latency, args.per_item,
+                     args.jitter, args.error_rate, args.throttle_rate, args.rate_limit, args.burst,
+                     args.retry_after, args.token_ttl, not args.no_total)
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--entities", nargs="+", choices=synth.ENTITIES, default=None)
+    add_server_args(p)
+    args = p.parse_args(argv)
+
+    mock = server_from_args(args, args.entities, args.host, args.port).start()
+    for entity, count in mock.counts().items():
+        print(f"  {entity:<10}{count:>10,} records")
+    print(f"Mock Alvys API on {mock.url} – set ALVYS_API_ROOT={mock.url}; Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.stop()
+        print("Answered: " + ", ".join(f"{k} {v:,}" for k, v in sorted(mock.stats.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+"""Synthetic Alvys data at 10×–100× the bundled volume
+=====================================================
+Writes weekly ``LOADS_API_*`` / ``TRIPS_API_*`` / ``INVOICES_API_*`` files
+and the dimension snapshots (``DRIVERS.json`` …) in any of the
+``utils.formats`` formats, using the bundled ``alvys_weekly_data`` records
+as templates:
+
+* loads, invoices (with their line items), drivers, trucks and customers
+  are copies of bundled records;
+* the bundle has no trips, trailers or carriers – trips (2–4 stops each)
+  are built from ``trips_insert.TRIP_SPEC`` / ``STOP_SPEC``, trailers and
+  carriers from small templates with the fields the sanitisers read.
+
+Every copy gets unique ``Id`` / number fields, amounts jittered by ±20 %
+and its timestamps moved into the target week.  Record ``n`` of an entity
+only depends on ``(seed, entity, n)``, so files are reproducible and
+:func:`synthetic_records` can serve any slice (the mock API server pages
+through it).
+
+``--scale 1`` is one bundled week: ~700 invoices (also used for loads and
+trips – the bundle has almost no loads) and the snapshot sizes as
+bundled, with trailers sized like trucks and carriers like customers.
+
+Usage
+-----
+python benchmarks/synth.py --out /tmp/alvys_x10
+python benchmarks/synth.py --out /tmp/alvys_x100 --scale 100 --weeks 2 --format ndjson.gz
+"""
+from __future__ import annotations
+
+import os
+import random
+import re
+import sys
+from datetime import date, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import arg_parser  # noqa: E402
+from inserts import trips_insert as tr  # noqa: E402
+from utils.flatten import Col  # noqa: E402
+from utils.formats import FORMATS, is_data_file, open_data_file, read_records, write_records  # noqa: E402
+
+DATA_DIR = ROOT / "alvys_weekly_data"
+
+# Weekly entities → file prefix; snapshots → file name (without extension)
+WEEKLY = {"loads": "LOADS_API_", "trips": "TRIPS_API_", "invoices": "INVOICES_API_"}
+SNAPSHOTS = {
+    "drivers": "DRIVERS",
+    "trucks": "TRUCKS",
+    "trailers": "TRAILERS",
+    "customers": "CUSTOMERS",
+    "carriers": "CARRIERS",
+}
+ENTITIES = list(WEEKLY) + list(SNAPSHOTS)
+
+# First bundled week; generated week ``w`` starts ``w`` weeks later
+ANCHOR = date(2025, 3, 30)
+
+# Fields made unique per copy, and fields jittered
+ID_KEYS = {"Id", "Number", "LoadNumber", "TripNumber", "EmployeeId", "TruckNum", "TrailerNum"}
+AMOUNT_KEYS = {"Amount", "Value", "Rate"}
+_TS = re.compile(r"\d{4}-\d{2}-\d{2}T")
+
+TRAILER_TEMPLATE = {
+    "Id": "trailer",
+    "TrailerNum": "T100",
+    "TrailerType": "Dry Van",
+    "Status": "Active",
+    "CreatedAt": "2025-03-30T08:00:00+00:00",
+}
+CARRIER_TEMPLATE = {
+    "Id": "carrier",
+    "Name": "Synthetic Carrier LLC",
+    "ExternalName": "SYNTH CARRIER",
+    "Address": {"City": "Dallas", "State": "TX", "ZipCode": "75201"},
+    "McNum": "MC100000",
+    "UsDotNum": "1000000",
+    "Type": "Carrier",
+    "Status": "Active",
+    "Source": "Manual",
+    "UpdatedAt": "2025-03-30T08:00:00+00:00",
+    "CreatedAt": "2025-01-15T08:00:00+00:00",
+}
+
+_SAMPLE = {
+    "str": lambda col: col.name.title().replace("_", " ")[: col.max_len or None],
+    "float": lambda col: 100.0,
+    "dt": lambda col: "2025-04-01T12:00:00+00:00",
+    "flag": lambda col: False,
+    "raw": lambda col: None,
+}
+
+
+def spec_template(spec: List[Col]) -> Dict[str, Any]:
+    """A record with a sample value at every path ``spec`` reads."""
+    rec: Dict[str, Any] = {}
+    for col in spec:
+        paths = col.reads if callable(col.path) else [col.path]
+        for path in paths:
+            keys = (path,) if isinstance(path, str) else tuple(path)
+            node = rec
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            node[keys[-1]] = "id" if keys[-1] == "Id" else _SAMPLE[col.kind](col)
+    return rec
+
+
+@lru_cache(maxsize=None)
+def templates(data_dir: str = str(DATA_DIR)) -> Dict[str, tuple]:
+    """Template records per entity (bundled copies or built ones)."""
+    def bundled(match) -> List[dict]:
+        return [rec for f in sorted(os.listdir(data_dir)) if match(f)
+                for rec in read_records(os.path.join(data_dir, f))]
+
+    out = {
+        "loads": bundled(lambda f: is_data_file(f, "LOADS_API_")),
+        "invoices": bundled(lambda f: is_data_file(f, "INVOICES_API_")),
+        "trips": [spec_template(tr.TRIP_SPEC)],
+        "trailers": [TRAILER_TEMPLATE],
+        "carriers": [CARRIER_TEMPLATE],
+    }
+    for entity in ("drivers", "trucks", "customers"):
+        out[entity] = bundled(lambda f, e=entity: f.startswith(SNAPSHOTS[e] + ".") and is_data_file(f, SNAPSHOTS[e]))
+    missing = [e for e in ENTITIES if not out[e]]
+    if missing:
+        sys.exit(f"No template records for {', '.join(missing)} in {data_dir}")
+    return {entity: tuple(recs) for entity, recs in out.items()}
+
+
+@lru_cache(maxsize=None)
+def week_volume(entity: str, data_dir: str = str(DATA_DIR)) -> int:
+    """Records of ``entity`` per week at ``--scale 1``."""
+    if entity in WEEKLY:
+        weeks = sum(is_data_file(f, "INVOICES_API_") for f in os.listdir(data_dir))
+        return max(round(len(templates(data_dir)["invoices"]) / max(weeks, 1)), 1)
+    like = {"trailers": "trucks", "carriers": "customers"}.get(entity, entity)
+    return len(templates(data_dir)[like])
+
+
+def _mutate(value: Any, key: str, n: int, rng: random.Random, days: int) -> Any:
+    if isinstance(value, dict):
+        return {k: _mutate(v, k, n, rng, days) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_mutate(v, key, n, rng, days) for v in value]
+    if isinstance(value, str):
+        if key in ID_KEYS:
+            return f"{value}-{n:x}"
+        if _TS.match(value):
+            return (date.fromisoformat(value[:10]) + timedelta(days=days)).isoformat() + value[10:]
+        return value
+    if isinstance(value, float) and key in AMOUNT_KEYS:
+        return round(value * rng.uniform(0.8, 1.2), 2)
+    return value
+
+
+def synthetic_record(entity: str, n: int, seed: int = 0, week: int = 0,
+                     data_dir: str = str(DATA_DIR)) -> dict:
+    """Record ``n`` of ``entity``; the same arguments give the same record."""
+    rng = random.Random(f"{seed}:{entity}:{n}")
+    pool = templates(data_dir)[entity]
+    template = pool[rng.randrange(len(pool))]
+    days = (ANCHOR - date.fromisoformat(_first_date(template))).days + 7 * week + rng.randrange(7)
+    rec = _mutate(template, "", n, rng, days)
+    rec.pop("FILE_ID", None)
+    if entity == "trips":
+        rec["Stops"] = [
+            _mutate({**_stop_template(), "Id": f"stop-{i}"}, "", n, rng, days)
+            for i in range(rng.randint(2, 4))
+        ]
+    return rec
+
+
+@lru_cache(maxsize=None)
+def _stop_template() -> dict:
+    return spec_template(tr.STOP_SPEC)
+
+
+def _first_date(template: dict) -> str:
+    """Creation date of ``template`` – its copies are moved relative to it."""
+    for key in ("CreatedAt", "CreatedDate", "DateCreated", "PickupDate", "UpdatedAt"):
+        value = template.get(key)
+        if isinstance(value, str) and _TS.match(value):
+            return value[:10]
+    return ANCHOR.isoformat()
+
+
+def synthetic_records(entity: str, count: int, seed: int = 0, start: int = 0, week: int = 0,
+                      data_dir: str = str(DATA_DIR)) -> Iterator[dict]:
+    """Records ``start`` … ``start + count - 1`` of ``entity``."""
+    for n in range(start, start + count):
+        yield synthetic_record(entity, n, seed, week, data_dir)
+
+
+def _write(path: str, records: Iterator[dict], fmt: str, file_id: str) -> int:
+    def stamped():
+        for rec in records:
+            rec["FILE_ID"] = file_id
+            yield rec
+
+    with open_data_file(path, "wt", fmt) as f:
+        return write_records(stamped(), f, fmt)
+
+
+def generate(out_dir: str | os.PathLike, scale: float = 10, weeks: int = 1, fmt: str = "json",
+             seed: int = 0, entities: Optional[List[str]] = None,
+             data_dir: str = str(DATA_DIR)) -> Dict[str, Dict[str, int]]:
+    """Write ``weeks`` weeks at ``scale`` × the bundled volume into ``out_dir``.
+
+    Returns ``{entity: {"files", "records", "bytes"}}``.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    ext = FORMATS[fmt]
+    summary: Dict[str, Dict[str, int]] = {}
+    for entity in entities or ENTITIES:
+        count = max(int(week_volume(entity, data_dir) * scale), 1)
+        stats = summary.setdefault(entity, {"files": 0, "records": 0, "bytes": 0})
+        if entity in WEEKLY:
+            targets = []
+            for w in range(weeks):
+                start = ANCHOR + timedelta(weeks=w)
+                name = f"{WEEKLY[entity]}{start:%Y%m%d}-{start + timedelta(days=6):%Y%m%d}{ext}"
+                targets.append((name, w, f"SYNTH-{scale:g}x-{start:%Y%m%d}"))
+        else:
+            targets = [(SNAPSHOTS[entity] + ext, 0, f"SYNTH-{scale:g}x")]
+        for name, week, file_id in targets:
+            path = os.path.join(out_dir, name)
+            records = synthetic_records(entity, count, seed, start=week * count, week=week, data_dir=data_dir)
+            stats["records"] += _write(path, records, fmt, file_id)
+            stats["files"] += 1
+            stats["bytes"] += os.path.getsize(path)
+    return summary
+
+
+def main(argv: list[str] | None = None):
+    p = arg_parser(__doc__)
+    p.add_argument("--out", required=True, help="Folder to write the files to")
+    p.add_argument("--scale", type=float, default=10, help="Multiple of one bundled week")
+    p.add_argument("--weeks", type=int, default=1)
+    p.add_argument("--format", dest="fmt", choices=list(FORMATS), default="json")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--entities", nargs="+", choices=ENTITIES, default=None)
+    p.add_argument("--data-dir", default=str(DATA_DIR), help="Folder with the template files")
+    args = p.parse_args(argv)
+
+    summary = generate(args.out, args.scale, args.weeks, args.fmt, args.seed, args.entities, args.data_dir)
+    print(f"{args.scale:g}× bundled volume, {args.weeks} week(s) → {args.out}")
+    for entity, stats in summary.items():
+        print(f"  {entity:<10}{stats['files']:>3} file(s) {stats['records']:>10,} records "
+              f"{stats['bytes'] / 2**20:>9.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,23 @@ Why a dedicated module?
 -----------------------
 * **Single source of truth** for where and how we store multi‑tenant
   connection info (SCAC → credentials).
-* Centralised cache so repeated calls in one run hit memory, not SQL.
+* Centralised cache: every client is loaded in one query and served from
+  memory until a TTL expires, so multi‑tenant runs hit SQL once and
+  rotated secrets are still picked up.
 * Keeps secrets out of source control—expects the **connection string** to
   live in an environment variable.
 """
 from __future__ import annotations
 
 import os
-import functools
-from typing import Dict
+import threading
+import time
+from typing import Dict, List
 
 import pyodbc
 
+from utils.crypto import fernet, read_encrypted, write_encrypted
+
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
@@ -26,29 +31,187 @@ _CONN_ENV = "ALVYS_SQL_CONN_STR"
 # Table and columns that map SCAC → auth credentials
 _TABLE = "dbo.ALVYS_CLIENTS"
 _COLS = ["TENANT_ID", "CLIENT_ID", "CLIENT_SECRET", "GRANT_TYPE"]
+# Optional flag column marking clients that take part in scheduled runs;
+# without it every client counts as active
+_ACTIVE_COL = "IS_ACTIVE"
+
+# Seconds the preloaded client rows are served before the next reload
+CREDENTIALS_TTL = float(os.getenv("ALVYS_CREDENTIALS_TTL", "900"))
+# Optional Fernet-encrypted copy of the rows for fast cold starts
+CREDENTIALS_CACHE = os.getenv("ALVYS_CREDENTIALS_CACHE")
+CREDENTIALS_CACHE_KEY = os.getenv("ALVYS_CREDENTIALS_CACHE_KEY")
+
+# Root of the Alvys API – point it at a local stand-in (benchmarks/mock_alvys.py)
+# to load-test the exporter
+API_ROOT = os.getenv("ALVYS_API_ROOT", "https://integrations.alvys.com/api")
 
 
 # ---------------------------------------------------------------------------
 # Low‑level helpers
 # ---------------------------------------------------------------------------
 
-def _get_sql_connection() -> pyodbc.Connection:
-    """Return a live pyodbc connection using the env‑defined conn string."""
+def _conn_str() -> str:
+    """Return the env‑defined SQL Server connection string."""
     conn_str = os.getenv(_CONN_ENV)
     if not conn_str:
         raise RuntimeError(
             f"Environment variable '{_CONN_ENV}' must be set with the SQL "
             "Server connection string before running the pipeline."
         )
+    return conn_str
+
+
+def _get_sql_connection() -> pyodbc.Connection:
+    """Return a live pyodbc connection using the env‑defined conn string."""
     # autocommit=False so callers can control transaction scope (BEGIN/ROLLBACK)
-    return pyodbc.connect(conn_str, autocommit=False, timeout=30)
+    return pyodbc.connect(_conn_str(), autocommit=False, timeout=30)
 
 
 # ---------------------------------------------------------------------------
 # Public API
 # ---------------------------------------------------------------------------
 
-@functools.lru_cache(maxsize=128)
+class CredentialStore:
+    """TTL cache of every row of ``dbo.ALVYS_CLIENTS``.
+
+    One ``SELECT`` loads all clients at once (a multi‑tenant run needs most
+    of them anyway) over a pooled connection; lookups are served from
+    memory until ``ttl`` seconds have passed, then the next one reloads –
+    so rotated secrets are picked up within a TTL.  If a reload fails the
+    stale rows keep serving, with a warning.  With ``cache_file`` the rows
+    also persist, Fernet‑encrypted, so a cold start within the TTL does
+    not touch SQL at all.
+
+    ``IS_ACTIVE`` is optional: on a table without it (checked once, on the
+    first load) every client is treated as active.
+    """
+
+    def __init__(self, ttl: float = CREDENTIALS_TTL, cache_file: str | None = CREDENTIALS_CACHE,
+                 cache_key: str | None = CREDENTIALS_CACHE_KEY, connect=None):
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self._cipher = fernet(cache_key, "ALVYS_CREDENTIALS_CACHE") if cache_file else None
+        self._connect = connect
+        self._db = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._write_lock = threading.Lock()  # one writer of cache_file at a time
+        self._rows: Dict[str, Dict] = {}
+        self._has_active: bool | None = None  # does _TABLE have _ACTIVE_COL?
+        self._loaded_at = 0.0  # epoch seconds of the last successful load
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.file_loads = 0
+        if cache_file:
+            stored = read_encrypted(cache_file, self._cipher)
+            if stored:
+                self._rows, self._loaded_at = stored["rows"], stored["loaded_at"]
+                self.file_loads += 1
+
+    def _connection(self):
+        if self._connect is not None:
+            return self._connect()
+        if self._db is None:
+            from utils.db import DbProvider, odbc_url
+
+            self._db = DbProvider(odbc_url(_conn_str()), pool_size=1, max_overflow=0)
+        return self._db.raw_connection()
+
+    def _fresh(self) -> bool:
+        return bool(self._rows) and time.time() - self._loaded_at < self.ttl
+
+    def preload(self) -> int:
+        """(Re)load every client in one query; returns the number of rows."""
+        conn = self._connection()
+        try:
+            cur = conn.cursor()
+            if self._has_active is None:
+                cur.execute("SELECT COL_LENGTH(?, ?)", _TABLE, _ACTIVE_COL)
+                self._has_active = cur.fetchone()[0] is not None
+                if not self._has_active:
+                    print(f"⚠️ {_TABLE} has no {_ACTIVE_COL} column; treating every client as active")
+            cols = ", ".join(["SCAC", *_COLS] + ([_ACTIVE_COL] if self._has_active else []))
+            cur.execute(f"SELECT {cols} FROM {_TABLE} WITH (NOLOCK) WHERE SCAC IS NOT NULL")
+            fetched = cur.fetchall()
+            cur.close()
+        finally:
+            conn.close()
+        rows = {}
+        for scac, *values in fetched:
+            scac = scac.upper().strip()
+            if not scac:  # a blank row must not break every other tenant
+                continue
+            creds = dict(zip([c.lower() for c in _COLS], values))
+            creds["is_active"] = bool(values[len(_COLS)]) if self._has_active else True
+            rows[scac] = creds
+        with self._lock:
+            self._rows, self._loaded_at = rows, time.time()
+            self.loads += 1
+        if self.cache_file:
+            with self._write_lock:
+                with self._lock:
+                    stored = {"rows": self._rows, "loaded_at": self._loaded_at}
+                write_encrypted(self.cache_file, self._cipher, stored)
+        return len(rows)
+
+    def _ensure_fresh(self, force: bool = False) -> None:
+        with self._lock:
+            if self._fresh() and not force:
+                self.hits += 1
+                return
+            loads = self.loads
+        with self._reload_lock:  # concurrent tenants share one reload
+            with self._lock:
+                if self._fresh() and (not force or self.loads > loads):
+                    self.hits += 1
+                    return
+                self.misses += 1
+            try:
+                self.preload()
+            except Exception as exc:
+                if not self._rows:
+                    raise
+                print(f"⚠️ Credential reload failed ({type(exc).__name__}: {exc}); using cached rows")
+
+    def get(self, scac: str) -> Dict[str, str]:
+        scac = scac.upper().strip()
+        self._ensure_fresh()
+        with self._lock:
+            row = self._rows.get(scac)
+        if row is None:  # maybe added since the last load – reload once
+            self._ensure_fresh(force=True)
+            with self._lock:
+                row = self._rows.get(scac)
+        if row is None:
+            raise KeyError(
+                f"SCAC '{scac}' not found in {_TABLE}. Did you add the client?"
+            )
+        return {c.lower(): row[c.lower()] for c in _COLS}
+
+    def active_scacs(self) -> List[str]:
+        self._ensure_fresh()
+        with self._lock:
+            return sorted(scac for scac, row in self._rows.items() if row["is_active"])
+
+    def summary(self) -> str:
+        return (f"{len(self._rows):,} clients, {self.loads:,} SQL loads, "
+                f"{self.file_loads:,} from cache file, {self.hits:,} hits / {self.misses:,} misses")
+
+
+_store: CredentialStore | None = None
+_store_lock = threading.Lock()
+
+
+def credential_store() -> CredentialStore:
+    """Process‑wide :class:`CredentialStore`."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CredentialStore()
+        return _store
+
+
 def get_credentials(scac: str) -> Dict[str, str]:
     """Look up a client's auth credentials by SCAC.
 
@@ -60,34 +223,29 @@ def get_credentials(scac: str) -> Dict[str, str]:
           "grant_type": str,
         }
 
-    Results are **LRU‑cached** so subsequent calls in the same run avoid extra
-    network trips.
+    Served from the shared :class:`CredentialStore`, which loads every
+    client in one query and refreshes after ``ALVYS_CREDENTIALS_TTL``.
     """
-    scac = scac.upper().strip()
-    placeholders = ", ".join(_COLS)
-    query = (
-        f"SELECT {placeholders} FROM {_TABLE} WITH (NOLOCK) WHERE SCAC = ?"
-    )
-
-    with _get_sql_connection() as conn, conn.cursor() as cur:
-        cur.execute(query, scac)
-        row = cur.fetchone()
-        if row is None:
-            raise KeyError(
-                f"SCAC '{scac}' not found in {_TABLE}. Did you add the client?"
-            )
+    return credential_store().get(scac)
+
 
-    creds = dict(zip([c.lower() for c in _COLS], row))
-    return creds  # type: ignore[return‑value]
+def list_active_scacs() -> List[str]:
+    """Return the SCAC of every active client, sorted, for fan‑out runs."""
+    return credential_store().active_scacs()
 
 
 def build_auth_urls(tenant_id: str, api_version: str = "1") -> Dict[str, str]:
-    """Return auth & base API URLs for a given tenant."""
-    auth_url = (
-        f"https://integrations.alvys.com/api/authentication/{tenant_id}/token"
-    )
-    base_url = f"https://integrations.alvys.com/api/p/v{api_version}"
+    """Return auth & base API URLs for a given tenant (under ``API_ROOT``)."""
+    root = API_ROOT.rstrip("/")
+    auth_url = f"{root}/authentication/{tenant_id}/token"
+    base_url = f"{root}/p/v{api_version}"
     return {"auth_url": auth_url, "base_url": base_url}
 
 
-__all__ = ["get_credentials", "build_auth_urls"]
+__all__ = [
+    "CredentialStore",
+    "credential_store",
+    "get_credentials",
+    "list_active_scacs",
+    "build_auth_urls",
+]
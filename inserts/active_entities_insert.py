@@ -1,30 +1,38 @@
-import os
-import json
 import pyodbc
 import pandas as pd
 import sys
 import time
 from datetime import datetime
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.bulkcopy import LOADER, BcpTarget, BulkCopyUnavailable, bcp_load
+from utils.db import ODBC_DRIVER, SQL_DATABASE, SQL_PASSWORD, SQL_SERVER, SQL_USERNAME, DbProvider
+from utils.formats import find_data_file, iter_records
+from utils.ledger import target_of
+from utils.parallel import INSERT_WORKERS, TableLoad, run_parallel
+from utils.pipeline import PIPELINE, PIPELINE_CHUNK_ROWS, batches, combine_loads, run_pipeline
+from utils.rowhash import ROW_HASH, RowDiff, RowHashes, table_rows
+from utils.rows import db_rows, insert_batches
+from utils.upsert import LOAD_MODE, format_counts, unique_on_key, upsert_rows
 
 # === Configuration ===
-SQL_SERVER = "ksm-ksmta-sqlsrv-001.database.windows.net"
-SQL_DATABASE = "KSMTA"
-SQL_USERNAME = "importuser"
-SQL_PASSWORD = "B2_SBD-Omicron-B00ts2!"
-DRIVER = "{ODBC Driver 17 for SQL Server}"
 DATA_DIR = "alvys_weekly_data"
 BATCH_SIZE = 500
 SCHEMA = "TBXX"
 
 def get_conn():
     return pyodbc.connect(
-        f"DRIVER={DRIVER};SERVER={SQL_SERVER};DATABASE={SQL_DATABASE};UID={SQL_USERNAME};PWD={SQL_PASSWORD}"
+        f"DRIVER={{{ODBC_DRIVER}}};SERVER={SQL_SERVER};DATABASE={SQL_DATABASE};UID={SQL_USERNAME};PWD={SQL_PASSWORD}"
     )
 
-def load_json(filename: str) -> List[Dict]:
-    with open(os.path.join(DATA_DIR, filename), encoding="utf-8") as f:
-        return json.load(f)
+def load_json(filename: str, data_dir: str = DATA_DIR) -> Iterator[Dict]:
+    """Stream ``filename`` – or its NDJSON/compressed sibling – from ``data_dir``.
+
+    Records are decoded one at a time; an ``{"Items": [...]}`` wrapper (as
+    some carrier dumps have) is unwrapped.
+    """
+    stem = filename[: -len(".json")] if filename.endswith(".json") else filename
+    return iter_records(find_data_file(data_dir, stem))
 
 def safe_datetime(val):
     try:
@@ -112,64 +120,145 @@ def sanitize_carrier(c: Dict) -> Dict:
         "FILE_ID": c.get("FILE_ID")
     }
 
-def batch_insert(table: str, records: List[Dict], conn):
+def batch_insert(table: str, records: List[Dict], conn, schema: str = SCHEMA, mode: str = LOAD_MODE,
+                 loader: str = LOADER) -> TableLoad | None:
     if not records:
         print(f"No data to insert for {table}.")
-        return
+        return None
 
     inserted_dttm = datetime.now()
     for rec in records:
         rec["INSERTED_DTTM"] = inserted_dttm
 
     df = pd.DataFrame(records)
-    columns = ", ".join(df.columns)
-    placeholders = ", ".join(["?" for _ in df.columns])
-    insert_sql = f"INSERT INTO {SCHEMA}.{table} ({columns}) VALUES ({placeholders})"
+    if mode == "upsert":
+        start = time.time()
+        df = unique_on_key(df)
+        rows = db_rows(df)
+        counts = upsert_rows(conn, schema, table, list(df.columns), rows)
+        duration = time.time() - start
+        print(f"✅ Upserted {table}: {format_counts(counts)} in {duration:.2f} seconds")
+        return TableLoad(f"{schema}.{table}", len(df), duration, counts)
+
+    if loader == "bcp":
+        start = time.time()
+        target = BcpTarget(SQL_SERVER, SQL_DATABASE, SQL_USERNAME, SQL_PASSWORD)
+        try:
+            bcp_load(df, schema, table, target, conn)
+            duration = time.time() - start
+            print(f"✅ Bulk-copied {len(df)} records into {table} in {duration:.2f} seconds")
+            return TableLoad(f"{schema}.{table}", len(df), duration)
+        except BulkCopyUnavailable as exc:
+            print(f"⚠️  {exc} – falling back to executemany")
 
-    cursor = conn.cursor()
-    cursor.fast_executemany = True
     start = time.time()
-    for i in range(0, len(df), BATCH_SIZE):
-        batch = df.iloc[i:i + BATCH_SIZE].where(pd.notnull(df), None).values.tolist()
-        cursor.executemany(insert_sql, batch)
-    conn.commit()
+    insert_batches(conn, df, schema, table, BATCH_SIZE)
     duration = time.time() - start
     print(f"✅ Inserted {len(df)} records into {table} in {duration:.2f} seconds")
+    return TableLoad(f"{schema}.{table}", len(df), duration)
+
+# entity → (file, table, sanitiser), in load order
+SNAPSHOTS = {
+    "trailers": ("TRAILERS.json", "TRAILERS_RAW", sanitize_trailer),
+    "trucks": ("TRUCKS.json", "TRUCKS_RAW", sanitize_truck),
+    "drivers": ("DRIVERS.json", "DRIVERS_RAW", sanitize_driver),
+    "customers": ("CUSTOMERS.json", "CUSTOMERS_RAW", sanitize_customer),
+    "carriers": ("CARRIERS.json", "CARRIERS_RAW", sanitize_carrier),
+}
+
+def snapshot_diffs(entities: List[str], data_dir: str = DATA_DIR, schema: str = SCHEMA,
+                   db: DbProvider | None = None, reload: bool = False,
+                   enabled: bool = ROW_HASH) -> Dict[str, RowDiff]:
+    """One :class:`~utils.rowhash.RowDiff` per entity against the hashes last loaded.
+
+    Each table's row count is checked against its hashes first, so a
+    truncated or rebuilt table gets every row again.
+    """
+    store = RowHashes.for_dir(data_dir) if enabled else None
+    target = target_of(db.engine, schema) if db else f"{SQL_SERVER}/{SQL_DATABASE}/{schema}"
+    diffs = {e: RowDiff(store, target, SNAPSHOTS[e][1], reload) for e in entities}
+    if store is not None and not reload:
+        conn = db.raw_connection() if db else get_conn()
+        try:
+            for diff in diffs.values():
+                diff.check_target(table_rows(conn, schema, diff.table))
+        finally:
+            conn.close()
+    return diffs
 
-def main():
-    args = [arg.lower() for arg in sys.argv[1:]]
-    run_all = len(args) == 0
+def read_snapshot(entity: str, data_dir: str = DATA_DIR,
+                  diff: Optional[RowDiff] = None) -> Iterator[Dict]:
+    filename, _, sanitize = SNAPSHOTS[entity]
+    print(f"Loading {entity} JSON...")
+    records = (sanitize(r) for r in load_json(filename, data_dir))
+    return diff.filter(records) if diff else records
 
-    conn = get_conn()
+def iter_snapshots(entities: List[str], data_dir: str = DATA_DIR,
+                   chunk_rows: int = PIPELINE_CHUNK_ROWS,
+                   diffs: Optional[Dict[str, RowDiff]] = None) -> Iterator[Tuple[str, List[Dict]]]:
+    """``(table, records)`` per entity, in batches of at most ``chunk_rows``."""
+    for entity in entities:
+        table = SNAPSHOTS[entity][1]
+        for part in batches(read_snapshot(entity, data_dir, (diffs or {}).get(entity)), chunk_rows):
+            yield table, part
 
-    if run_all or "trailers" in args:
-        print("Loading trailers JSON...")
-        trailers = [sanitize_trailer(t) for t in load_json("TRAILERS.json")]
-        batch_insert("TRAILERS_RAW", trailers, conn)
+def load_snapshot(entity: str, conn, data_dir: str = DATA_DIR, schema: str = SCHEMA,
+                  mode: str = LOAD_MODE, loader: str = LOADER,
+                  diff: Optional[RowDiff] = None) -> TableLoad | None:
+    table = SNAPSHOTS[entity][1]
+    load = batch_insert(table, list(read_snapshot(entity, data_dir, diff)), conn, schema, mode, loader)
+    if diff:
+        diff.commit()
+    return load
 
-    if run_all or "trucks" in args:
-        print("Loading trucks JSON...")
-        trucks = [sanitize_truck(t) for t in load_json("TRUCKS.json")]
-        batch_insert("TRUCKS_RAW", trucks, conn)
+def main(entities: List[str] | None = None, data_dir: str = DATA_DIR, schema: str = SCHEMA,
+         mode: str = LOAD_MODE, loader: str = LOADER, db: DbProvider | None = None,
+         workers: int = INSERT_WORKERS, pipeline: bool = PIPELINE,
+         reload: bool = False, row_hash: bool = ROW_HASH) -> List[TableLoad]:
+    """Insert the snapshot entities; ``entities`` defaults to the CLI args.
 
-    if run_all or "drivers" in args:
-        print("Loading drivers JSON...")
-        drivers = [sanitize_driver(d) for d in load_json("DRIVERS.json")]
-        batch_insert("DRIVERS_RAW", drivers, conn)
+    With ``db`` the run‑wide pool supplies connections instead of new logins.
+    With ``workers`` > 1 the tables load in parallel, one connection each.
+    With ``pipeline`` the next entity is read while the previous one is
+    written, on one connection.
+    With ``row_hash`` only rows new or changed since the last load into
+    ``schema`` are written (``utils.rowhash``); ``reload`` writes them all.
+    """
+    args = [arg.lower() for arg in (sys.argv[1:] if entities is None else entities)]
+    todo = [e for e in SNAPSHOTS if not args or e in args]
+    connect = db.raw_connection if db else get_conn
+    diffs = snapshot_diffs(todo, data_dir, schema, db, reload, row_hash)
 
-    if run_all or "customers" in args:
-        print("Loading customers JSON...")
-        customers = [sanitize_customer(c) for c in load_json("CUSTOMERS.json")]
-        batch_insert("CUSTOMERS_RAW", customers, conn)
+    if pipeline:
+        conn = connect()
+        try:
+            loads = combine_loads(run_pipeline(
+                iter_snapshots(todo, data_dir, diffs=diffs),
+                lambda chunk: batch_insert(*chunk, conn, schema, mode, loader),
+            ))
+        finally:
+            conn.close()
+        for diff in diffs.values():
+            diff.commit()
+    elif workers <= 1:
+        conn = connect()
+        try:
+            loads = [load_snapshot(e, conn, data_dir, schema, mode, loader, diffs[e]) for e in todo]
+        finally:
+            conn.close()  # back to the pool when shared
+    else:
+        def task(entity: str):
+            conn = connect()
+            try:
+                return load_snapshot(entity, conn, data_dir, schema, mode, loader, diffs[entity])
+            finally:
+                conn.close()
 
-    if run_all or "carriers" in args:
-        print("Loading carriers JSON...")
-        raw = load_json("CARRIERS.json")
-        items = raw.get("Items") if isinstance(raw, dict) else raw
-        carriers = [sanitize_carrier(c) for c in items]
-        batch_insert("CARRIERS_RAW", carriers, conn)
+        results = run_parallel([(e, lambda e=e: task(e)) for e in todo], workers)
+        loads = list(results.values())
 
     print("\n✅ All data inserted.")
+    return [ld for ld in loads if ld]
 
 if __name__ == "__main__":
     main()
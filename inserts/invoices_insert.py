@@ -6,24 +6,34 @@ Other fixes retained:
 * pyodbc `07002` workaround (no `method="multi"`).
 * Removed unsupported `executemany_mode`.
 * NaN/NaT → `None` before upload.
+* Columns declared once in `INVOICE_SPEC` / `LINE_ITEM_SPEC` and flattened
+  column-wise by `utils.flatten`.
+* `pipeline=True` streams file chunks into SQL while the next one is
+  flattened (`utils.pipeline`).
+* Files already loaded into the target are skipped (`utils.ledger`).
 """
 import os
-import json
 import time
+from functools import partial
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
 import pandas as pd
 from sqlalchemy import create_engine, types
 
+from utils.bulkcopy import LOADER, BulkCopyUnavailable, bcp_dataframe
+from utils.db import DbProvider, mssql_url
+from utils.flatten import Col, explode, flatten, projection
+from utils.formats import is_data_file, iter_records
+from utils.ledger import LEDGER, file_chunks, ledger_files, recording
+from utils.parallel import INSERT_WORKERS, TableLoad, chunks, run_parallel
+from utils.pipeline import PIPELINE, PIPELINE_CHUNK_ROWS, batches, combine_loads, run_pipeline
+from utils.rows import append_dataframe
+from utils.upsert import LOAD_MODE, format_counts, upsert_dataframe
+
 # ────────────────────────────────────────────
 # CONFIG – customise per environment
 # ────────────────────────────────────────────
-SQL_SERVER = "ksm-ksmta-sqlsrv-001.database.windows.net"
-SQL_DATABASE = "KSMTA"
-SQL_USERNAME = "importuser"
-SQL_PASSWORD = "B2_SBD-Omicron-B00ts2!"
-
 SCHEMA = "TBXX"
 INVOICE_TABLE = f"{SCHEMA}.INVOICES_RAW"
 LINE_ITEM_TABLE = f"{SCHEMA}.INVOICE_LINE_ITEMS_RAW"
@@ -82,11 +92,7 @@ DTYPE_LINE_ITEMS = {
 # ────────────────────────────────────────────
 
 def get_engine():
-    conn = (
-        f"mssql+pyodbc://{SQL_USERNAME}:{SQL_PASSWORD}@{SQL_SERVER}/{SQL_DATABASE}"
-        f"?driver=ODBC+Driver+17+for+SQL+Server"
-    )
-    return create_engine(conn, fast_executemany=True)
+    return create_engine(mssql_url(), fast_executemany=True)
 
 # ────────────────────────────────────────────
 # HELPERS
@@ -98,106 +104,173 @@ def _s(val: Optional[str]) -> Optional[str]:
     return str(val).strip() or None
 
 
-def _dt(series: pd.Series) -> pd.Series:
-    return pd.to_datetime(series, utc=True, errors="coerce").dt.tz_localize(None)
+def _currency(li: dict):
+    """Line item currency: ``{"Code": "USD"}`` or a bare code."""
+    currency = (li.get("Amount") or {}).get("Currency")
+    return currency.get("Code") if isinstance(currency, dict) else currency
+
+
+def _units(li: dict):
+    """Rate units; ``0`` means "not set" like an empty value."""
+    return (li.get("Rate") or {}).get("Units") or None
+
+# ────────────────────────────────────────────
+# COLUMN SPECS (JSON path → column, see utils.flatten)
+# ────────────────────────────────────────────
+INVOICE_SPEC: List[Col] = [
+    Col("ID", "Id", max_len=100),
+    Col("INVOICE_NUMBER", "Number", max_len=100),
+    Col("INVOICE_TYPE", "Type", max_len=50),
+    Col("INVOICE_STATUS", "Status", max_len=50),
+    Col("CREATED_DTTM", "CreatedDate", "dt"),
+    Col("BILLED_DATE", "InvoicedDate", "dt"),
+    Col("CUSTOMER_ID", ("Customer", "Id"), max_len=100),
+    Col("INVOICE_AMOUNT", ("Total", "Amount"), "float", default=0.0),
+]
+
+# INVOICE_ID / INVOICE_NUMBER come from the parent invoice
+LINE_ITEM_SPEC: List[Col] = [
+    Col("ID", "Id", max_len=150),
+    Col("LINE_ITEM_NAME", "Name", max_len=100),
+    Col("LINE_ITEM_AMOUNT", ("Amount", "Amount"), "float", default=0.0),
+    Col("LINE_ITEM_CURRENCY_CODE", _currency, max_len=10, reads=(("Amount", "Currency"),)),
+    Col("LINE_ITEM_RATE", ("Rate", "Rate"), "float", default=0.0),
+    Col("LINE_ITEM_UNITS", _units, max_len=20, reads=(("Rate", "Units"),)),
+    Col("LINE_ITEM_UNIT_TYPE", ("Rate", "UnitOfMeasurement"), max_len=50),
+    Col("LOAD_NUMBER", "LoadNumber", max_len=100),
+    Col("LINE_ITEM_CATEGORY", "Category", max_len=50),
+]
+
+# Fields kept per record while streaming a file (everything else is dropped)
+INVOICE_FIELDS = projection(INVOICE_SPEC, {"LineItems": LINE_ITEM_SPEC}, extra=["FILE_ID"])
 
 # ────────────────────────────────────────────
 # FLATTENERS
 # ────────────────────────────────────────────
 
 def flatten_invoices(raw: list[dict], file_id: str) -> pd.DataFrame:
-    recs = []
-    for inv in raw:
-        recs.append([
-            _s(inv.get("Id"))[:100],
-            _s(inv.get("Number"))[:100],
-            _s(inv.get("Type"))[:50],
-            _s(inv.get("Status"))[:50],
-            inv.get("CreatedDate"),
-            inv.get("InvoicedDate"),
-            file_id[:50] if file_id else None,
-            _s(inv.get("Customer", {}).get("Id"))[:100],
-            float(inv.get("Total", {}).get("Amount") or 0),
-            RUN_TS,
-        ])
-    df = pd.DataFrame(recs, columns=INVOICE_COLS)
-    df["CREATED_DTTM"] = _dt(df["CREATED_DTTM"])
-    df["BILLED_DATE"] = _dt(df["BILLED_DATE"])
-    return df
-
-
-def flatten_line_items(raw: list[dict], file_id: str) -> pd.DataFrame:
-    recs = []
-    for inv in raw:
-        inv_id = _s(inv.get("Id"))[:100]
-        inv_num = _s(inv.get("Number"))[:100]
-        for li in inv.get("LineItems", []):
-            currency = li.get("Amount", {}).get("Currency")
-            currency_code = None
-            if isinstance(currency, dict):
-                currency_code = _s(currency.get("Code"))[:10]
-            elif currency is not None:
-                currency_code = _s(currency)[:10]
-
-            rate = li.get("Rate", {})
-            recs.append([
-                _s(li.get("Id"))[:150],
-                inv_id,
-                inv_num,
-                _s(li.get("Name"))[:100],
-                float(li.get("Amount", {}).get("Amount") or 0),
-                currency_code,
-                float(rate.get("Rate") or 0),
-                _s(rate.get("Units"))[:20] if rate.get("Units") else None,
-                _s(rate.get("UnitOfMeasurement"))[:50] if rate.get("UnitOfMeasurement") else None,
-                _s(li.get("LoadNumber"))[:100] if li.get("LoadNumber") else None,
-                _s(li.get("Category"))[:50] if li.get("Category") else None,
-                file_id[:50] if file_id else None,
-                RUN_TS,
-            ])
-    return pd.DataFrame(recs, columns=LINE_ITEM_COLS)
+    constants = {"FILE_ID": file_id[:50] if file_id else None, "INSERTED_DTTM": RUN_TS}
+    return flatten(raw, INVOICE_SPEC, INVOICE_COLS, constants, label="invoices")
+
+
+def flatten_line_items(raw: list[dict], invoices: pd.DataFrame, file_id: str) -> pd.DataFrame:
+    """One row per line item; ``invoices`` is :func:`flatten_invoices` of ``raw``."""
+    items, parents = explode(raw, "LineItems")
+    constants = {"FILE_ID": file_id[:50] if file_id else None, "INSERTED_DTTM": RUN_TS}
+    df = flatten(items, LINE_ITEM_SPEC, constants=constants, label="line_items")
+    parent = invoices[["ID", "INVOICE_NUMBER"]].iloc[parents].reset_index(drop=True)
+    df["INVOICE_ID"] = parent["ID"]
+    df["INVOICE_NUMBER"] = parent["INVOICE_NUMBER"]
+    return df[LINE_ITEM_COLS]
+
+
+def iter_frames(data_dir: str = DATA_DIR, chunk_rows: int = PIPELINE_CHUNK_ROWS,
+                files: Optional[List[str]] = None) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """``(invoices, line_items)`` per file, in batches of at most ``chunk_rows`` invoices.
+
+    ``files`` limits the run to those names (default: every ``INVOICES_API_*``).
+    """
+    for fname in sorted(os.listdir(data_dir)) if files is None else files:
+        if not is_data_file(fname, "INVOICES_API_"):
+            continue
+        records = iter_records(os.path.join(data_dir, fname), INVOICE_FIELDS)
+        for n, part in enumerate(batches(records, chunk_rows)):
+            if n == 0:
+                file_id = _s(part[0].get("FILE_ID"))
+            print(f"Processing {fname} … {len(part):,} objects (FILE_ID={file_id})")
+            invoices = flatten_invoices(part, file_id)
+            yield invoices, flatten_line_items(part, invoices, file_id)
 
 # ────────────────────────────────────────────
 # BULK INSERT
 # ────────────────────────────────────────────
 
-def bulk_insert(engine, table: str, df: pd.DataFrame, dtypes: dict):
+def bulk_insert(engine, table: str, df: pd.DataFrame, dtypes: dict, schema: str = SCHEMA,
+                mode: str = LOAD_MODE, loader: str = LOADER,
+                workers: int = INSERT_WORKERS) -> TableLoad | None:
+    """Append ``df`` (default) or MERGE it on ``ID`` when ``mode="upsert"``.
+
+    Appends go through ``bcp`` when ``loader="bcp"`` and it is installed;
+    otherwise large appends are split over ``workers`` pooled connections
+    (one transaction per chunk).  Returns the :class:`TableLoad`.
+    """
+    name = table.split(".")[-1]
     if df.empty:
         print(f"⚠️  Nothing to insert into {table} – DataFrame empty.")
-        return
-    df = df.where(pd.notnull(df), None)
+        return None
     start = time.perf_counter()
-    df.to_sql(
-        name=table.split(".")[-1],
-        schema=SCHEMA,
-        con=engine,
-        if_exists="append",
-        index=False,
-        chunksize=CHUNK_SIZE,
-        dtype=dtypes,
-    )
+    if mode == "upsert":
+        counts = upsert_dataframe(engine, df, schema, name, dtype=dtypes)
+        dur = time.perf_counter() - start
+        print(f"✅ {schema}.{name} upsert: {format_counts(counts)} in {dur:.1f}s")
+        return TableLoad(f"{schema}.{name}", len(df), dur, counts)
+    if loader == "bcp":
+        try:
+            rows = bcp_dataframe(engine, df, schema, name)
+            dur = time.perf_counter() - start
+            print(f"✅ {rows:,} rows bulk-copied into {schema}.{name} in {dur:.1f}s")
+            return TableLoad(f"{schema}.{name}", rows, dur)
+        except BulkCopyUnavailable as exc:
+            print(f"⚠️  {exc} – falling back to executemany")
+    parts = chunks(df, workers)
+    # Create a missing table once from the dtype map; rows go straight
+    # from the typed columns to executemany (utils.rows)
+    df.head(0).to_sql(name=name, schema=schema, con=engine, if_exists="append",
+                      index=False, dtype=dtypes)
+    run_parallel([(str(i), partial(append_dataframe, engine, part, schema, name, CHUNK_SIZE))
+                  for i, part in enumerate(parts)], workers)
     dur = time.perf_counter() - start
-    print(f"✅ {len(df):,} rows inserted into {table} in {dur:.1f}s")
+    via = f" over {len(parts)} connections" if len(parts) > 1 else ""
+    print(f"✅ {len(df):,} rows inserted into {schema}.{name} in {dur:.1f}s{via}")
+    return TableLoad(f"{schema}.{name}", len(df), dur)
 
 # ────────────────────────────────────────────
 # MAIN
 # ────────────────────────────────────────────
 
-def main() -> None:
-    invoice_frames, line_item_frames = [], []
+def insert_tables(engine, invoices_df: pd.DataFrame, line_items_df: pd.DataFrame,
+                  schema: str = SCHEMA, mode: str = LOAD_MODE, loader: str = LOADER,
+                  workers: int = INSERT_WORKERS) -> list[TableLoad]:
+    """Write invoices and line items – side by side when ``workers`` > 1."""
+    per_table = max(workers // 2, 1)
+    loads = run_parallel([
+        ("invoices", lambda: bulk_insert(engine, INVOICE_TABLE, invoices_df, DTYPE_INVOICES,
+                                         schema, mode, loader, per_table)),
+        ("line_items", lambda: bulk_insert(engine, LINE_ITEM_TABLE, line_items_df, DTYPE_LINE_ITEMS,
+                                           schema, mode, loader, per_table)),
+    ], workers)
+    return [ld for ld in loads.values() if ld]
 
-    for fname in sorted(os.listdir(DATA_DIR)):
-        if not (fname.startswith("INVOICES_API_") and fname.endswith(".json")):
-            continue
-        path = os.path.join(DATA_DIR, fname)
-        with open(path, encoding="utf-8") as f:
-            data = json.load(f)
-        if not data:
-            continue
-        file_id = _s(data[0].get("FILE_ID"))
-        print(f"Processing {fname} … {len(data):,} objects (FILE_ID={file_id})")
-        invoice_frames.append(flatten_invoices(data, file_id))
-        line_item_frames.append(flatten_line_items(data, file_id))
+
+def main(data_dir: str = DATA_DIR, schema: str = SCHEMA, mode: str = LOAD_MODE,
+         loader: str = LOADER, db: DbProvider | None = None,
+         workers: int = INSERT_WORKERS, pipeline: bool = PIPELINE,
+         reload: bool = False, ledger: bool = LEDGER) -> list[TableLoad]:
+    """Load the new ``INVOICES_API_*`` files; ``db`` shares a run‑wide engine.
+
+    Invoices and line items load side by side when ``workers`` > 1.  With
+    ``pipeline`` each file chunk is written while the next is flattened.
+    With ``ledger`` files already loaded into ``schema`` are skipped unless
+    ``reload`` is set; pipelined files are recorded as each one finishes.
+    """
+    engine = db.engine if db else get_engine()
+    files, mark_loaded = ledger_files(engine, schema, data_dir, "INVOICES_API_", reload, ledger)
+    if not files:
+        print("✅ No new invoices files.")
+        return []
+    if pipeline:
+        print("Streaming invoices JSON → SQL …")
+        loads = run_pipeline(
+            file_chunks(files, lambda names: iter_frames(data_dir, files=names)),
+            recording(lambda frames: insert_tables(engine, *frames, schema, mode, loader, workers),
+                      mark_loaded),
+        )
+        return combine_loads(ld for chunk in loads for ld in chunk or ())
+
+    invoice_frames, line_item_frames = [], []
+    for invoices, line_items in iter_frames(data_dir, chunk_rows=0, files=files):
+        invoice_frames.append(invoices)
+        line_item_frames.append(line_items)
 
     invoices_df = (
         pd.concat(invoice_frames, ignore_index=True) if invoice_frames else pd.DataFrame(columns=INVOICE_COLS)
@@ -207,10 +280,9 @@ def main() -> None:
     )
 
     print(f"Found {len(invoices_df):,} invoices & {len(line_items_df):,} line items. Uploading …")
-
-    engine = get_engine()
-    bulk_insert(engine, INVOICE_TABLE, invoices_df, DTYPE_INVOICES)
-    bulk_insert(engine, LINE_ITEM_TABLE, line_items_df, DTYPE_LINE_ITEMS)
+    loads = insert_tables(engine, invoices_df, line_items_df, schema, mode, loader, workers)
+    mark_loaded()
+    return loads
 
 
 if __name__ == "__main__":
@@ -4,24 +4,34 @@ Vectorised pandas → SQL bulk load with audit column.
 This revision fixes the `NoneType is not subscriptable` error by:
 * Introducing a **null-safe truncation helper** `_s(val, max_len)` and using it everywhere (no slicing outside `_s`).
 * Keeps single UTC `INSERTED_DTTM` for every row.
+* Columns are declared once in `LOAD_SPEC` and flattened column-wise by
+  `utils.flatten` instead of record by record.
+* `pipeline=True` streams file chunks into SQL while the next one is
+  flattened (`utils.pipeline`).
+* Files already loaded into the target are skipped (`utils.ledger`).
 """
 import os
-import json
 import time
+from functools import partial
 from datetime import datetime, timezone
-from typing import List, Optional, Any
+from typing import Iterator, List, Optional, Any
 
 import pandas as pd
 from sqlalchemy import create_engine, types
 
+from utils.bulkcopy import LOADER, BulkCopyUnavailable, bcp_dataframe
+from utils.db import DbProvider, mssql_url
+from utils.flatten import Col, flatten, projection
+from utils.formats import is_data_file, iter_records
+from utils.ledger import LEDGER, file_chunks, ledger_files, recording
+from utils.parallel import INSERT_WORKERS, TableLoad, chunks, run_parallel
+from utils.pipeline import PIPELINE, PIPELINE_CHUNK_ROWS, batches, combine_loads, run_pipeline
+from utils.rows import append_dataframe
+from utils.upsert import LOAD_MODE, format_counts, upsert_dataframe
+
 # ────────────────────────────────────────────
 # CONFIG
 # ────────────────────────────────────────────
-SQL_SERVER = "ksm-ksmta-sqlsrv-001.database.windows.net"
-SQL_DATABASE = "KSMTA"
-SQL_USERNAME = "importuser"
-SQL_PASSWORD = "B2_SBD-Omicron-B00ts2!"
-
 SCHEMA = "TBXX"
 LOAD_TABLE = f"{SCHEMA}.LOADS_RAW"
 DATA_DIR = "alvys_weekly_data"
@@ -74,11 +84,7 @@ DTYPE_LOADS = {
 # ────────────────────────────────────────────
 
 def get_engine():
-    conn = (
-        f"mssql+pyodbc://{SQL_USERNAME}:{SQL_PASSWORD}@{SQL_SERVER}/{SQL_DATABASE}"
-        f"?driver=ODBC+Driver+17+for+SQL+Server"
-    )
-    return create_engine(conn, fast_executemany=True)
+    return create_engine(mssql_url(), fast_executemany=True)
 
 # ────────────────────────────────────────────
 # HELPERS
@@ -93,115 +99,148 @@ def _s(val: Optional[Any], max_len: int | None = None) -> Optional[str]:
         return None
     return s[:max_len] if max_len else s
 
+# ────────────────────────────────────────────
+# COLUMN SPEC (JSON path → column, see utils.flatten)
+# ────────────────────────────────────────────
+LOAD_SPEC: List[Col] = [
+    Col("ID", "Id", max_len=100),
+    Col("LOAD_NUMBER", "LoadNumber", max_len=100),
+    Col("ORDER_NUMBER", "OrderNumber", max_len=100),
+    Col("LOAD_STATUS", "Status", max_len=50),
+    Col("CUSTOMER_ID", "CustomerId", max_len=100),
+    Col("FLEET_ID", ("Fleet", "Id"), max_len=100),
+    Col("FLEET_NAME", ("Fleet", "Name"), max_len=100),
+    Col("INVOICE_AS", "InvoiceAs", max_len=50),
+    Col("LINEHAUL_AMOUNT", ("Linehaul", "Amount"), "float"),
+    Col("FUEL_SURCHARGE", ("FuelSurcharge", "Amount"), "float"),
+    Col("ACCESSORIALS_AMOUNT", ("Accessorials", "Amount"), "float"),
+    Col("CUSTOMER_RATE", ("CustomerRate", "Amount"), "float"),
+    Col("CUSTOMER_MILEAGE", ("CustomerMileage", "Distance", "Value"), "float"),
+    Col("MILEAGE_SOURCE", ("CustomerMileage", "Source"), max_len=50),
+    Col("TOTAL_WEIGHT", ("Weight", "Value"), "float"),
+    Col("SCHEDULED_PICKUP", "ScheduledPickupAt", "dt"),
+    Col("SCHEDULED_DELIVERY", "ScheduledDeliveryAt", "dt"),
+    Col("PICKED_UP_AT", "PickedUpAt", "dt"),
+    Col("DELIVERED_AT", "DeliveredAt", "dt"),
+    Col("CREATED_DTTM", "CreatedAt", "dt"),
+    Col("CUSTOMER_SERVICE_REP_ID", "CustomerServiceRepId", max_len=100),
+    Col("CUSTOMER_SALES_AGENT_ID", "CustomerSalesAgentId", max_len=100),
+    Col("UPDATED_DTTM", "UpdatedAt", "dt"),
+]
 
-def _f(val) -> Optional[float]:
-    try:
-        return float(val) if val not in (None, "") else None
-    except (TypeError, ValueError):
-        return None
+# Fields kept per record while streaming a file (everything else is dropped)
+LOAD_FIELDS = projection(LOAD_SPEC, extra=["FILE_ID"])
 
+# ────────────────────────────────────────────
+# FLATTEN LOADS
+# ────────────────────────────────────────────
 
-def _dt(series: pd.Series) -> pd.Series:
-    return pd.to_datetime(series, utc=True, errors="coerce").dt.tz_localize(None)
-
-
-def g(d: Optional[dict], *keys):
-    for k in keys:
-        if not isinstance(d, dict):
-            return None
-        d = d.get(k)
-    return d
-
-# ────────────────────────────────────────────
-# FLATTEN ONE LOAD
-# ────────────────────────────────────────────
-
-def flatten_load(load: dict, file_id: str):
-    return [
-        _s(load.get("Id"), 100),
-        _s(load.get("LoadNumber"), 100),
-        _s(load.get("OrderNumber"), 100),
-        _s(load.get("Status"), 50),
-        _s(load.get("CustomerId"), 100),
-        _s(g(load, "Fleet", "Id"), 100),
-        _s(g(load, "Fleet", "Name"), 100),
-        _s(load.get("InvoiceAs"), 50),
-        _f(g(load, "Linehaul", "Amount")),
-        _f(g(load, "FuelSurcharge", "Amount")),
-        _f(g(load, "Accessorials", "Amount")),
-        _f(g(load, "CustomerRate", "Amount")),
-        _f(g(load, "CustomerMileage", "Distance", "Value")),
-        _s(g(load, "CustomerMileage", "Source"), 50),
-        _f(g(load, "Weight", "Value")),
-        load.get("ScheduledPickupAt"),
-        load.get("ScheduledDeliveryAt"),
-        load.get("PickedUpAt"),
-        load.get("DeliveredAt"),
-        load.get("CreatedAt"),
-        _s(load.get("CustomerServiceRepId"), 100),
-        _s(load.get("CustomerSalesAgentId"), 100),
-        load.get("UpdatedAt"),
-        file_id,  # already truncated to 50 below
-        RUN_TS,
-    ]
+def flatten_loads(raw: list[dict], file_id: str) -> pd.DataFrame:
+    return flatten(raw, LOAD_SPEC, LOAD_COLS, {"FILE_ID": file_id, "INSERTED_DTTM": RUN_TS},
+                   label="loads")
 
 # ────────────────────────────────────────────
 # BUILD DATAFRAME
 # ────────────────────────────────────────────
 
-def build_dataframe() -> pd.DataFrame:
-    rows: list[list] = []
-    for fname in sorted(os.listdir(DATA_DIR)):
-        if not fname.startswith("LOADS_API_") or not fname.endswith(".json"):
-            continue
-        with open(os.path.join(DATA_DIR, fname), encoding="utf-8") as f:
-            data = json.load(f)
-        if not data:
+def iter_frames(data_dir: str = DATA_DIR, chunk_rows: int = PIPELINE_CHUNK_ROWS,
+                files: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """Flattened loads per file, in batches of at most ``chunk_rows`` records.
+
+    ``files`` limits the run to those names (default: every ``LOADS_API_*``).
+    """
+    for fname in sorted(os.listdir(data_dir)) if files is None else files:
+        if not is_data_file(fname, "LOADS_API_"):
             continue
-        file_id = _s(data[0].get("FILE_ID"), 50)
-        print(f"Processing {fname} … {len(data):,} objects (FILE_ID={file_id})")
-        rows.extend(flatten_load(rec, file_id) for rec in data)
+        records = iter_records(os.path.join(data_dir, fname), LOAD_FIELDS)
+        for n, part in enumerate(batches(records, chunk_rows)):
+            if n == 0:
+                file_id = _s(part[0].get("FILE_ID"), 50)
+            print(f"Processing {fname} … {len(part):,} objects (FILE_ID={file_id})")
+            yield flatten_loads(part, file_id)
 
-    df = pd.DataFrame(rows, columns=LOAD_COLS)
 
-    # Convert datetime columns
-    for col in [
-        "SCHEDULED_PICKUP", "SCHEDULED_DELIVERY", "PICKED_UP_AT", "DELIVERED_AT",
-        "CREATED_DTTM", "UPDATED_DTTM",
-    ]:
-        df[col] = _dt(df[col])
-    return df
+def build_dataframe(data_dir: str = DATA_DIR, files: Optional[List[str]] = None) -> pd.DataFrame:
+    frames = list(iter_frames(data_dir, chunk_rows=0, files=files))
+    if not frames:
+        return pd.DataFrame(columns=LOAD_COLS)
+    return pd.concat(frames, ignore_index=True)
 
 # ────────────────────────────────────────────
 # BULK INSERT
 # ────────────────────────────────────────────
 
-def bulk_insert(engine, df: pd.DataFrame):
+def bulk_insert(engine, df: pd.DataFrame, schema: str = SCHEMA, mode: str = LOAD_MODE,
+                loader: str = LOADER, workers: int = INSERT_WORKERS) -> TableLoad | None:
+    """Append ``df`` (default) or MERGE it on ``ID`` when ``mode="upsert"``.
+
+    Appends go through ``bcp`` when ``loader="bcp"`` and it is installed;
+    otherwise large appends are split over ``workers`` pooled connections
+    (one transaction per chunk).  Returns the :class:`TableLoad`.
+    """
+    name = LOAD_TABLE.split(".")[-1]
     if df.empty:
         print("⚠️  No load records to insert.")
-        return
-    df = df.where(pd.notnull(df), None)
+        return None
     start = time.perf_counter()
-    df.to_sql(
-        name=LOAD_TABLE.split(".")[-1],
-        schema=SCHEMA,
-        con=engine,
-        if_exists="append",
-        index=False,
-        chunksize=CHUNK_SIZE,
-        dtype=DTYPE_LOADS,
-    )
-    print(f"✅ {len(df):,} rows inserted into {LOAD_TABLE} in {time.perf_counter() - start:.1f}s")
+    if mode == "upsert":
+        counts = upsert_dataframe(engine, df, schema, name, dtype=DTYPE_LOADS)
+        dur = time.perf_counter() - start
+        print(f"✅ {schema}.{name} upsert: {format_counts(counts)} in {dur:.1f}s")
+        return TableLoad(f"{schema}.{name}", len(df), dur, counts)
+    if loader == "bcp":
+        try:
+            rows = bcp_dataframe(engine, df, schema, name)
+            dur = time.perf_counter() - start
+            print(f"✅ {rows:,} rows bulk-copied into {schema}.{name} in {dur:.1f}s")
+            return TableLoad(f"{schema}.{name}", rows, dur)
+        except BulkCopyUnavailable as exc:
+            print(f"⚠️  {exc} – falling back to executemany")
+    parts = chunks(df, workers)
+    # Create a missing table once from the dtype map; rows go straight
+    # from the typed columns to executemany (utils.rows)
+    df.head(0).to_sql(name=name, schema=schema, con=engine, if_exists="append",
+                      index=False, dtype=DTYPE_LOADS)
+    run_parallel([(str(i), partial(append_dataframe, engine, part, schema, name, CHUNK_SIZE))
+                  for i, part in enumerate(parts)], workers)
+    dur = time.perf_counter() - start
+    via = f" over {len(parts)} connections" if len(parts) > 1 else ""
+    print(f"✅ {len(df):,} rows inserted into {schema}.{name} in {dur:.1f}s{via}")
+    return TableLoad(f"{schema}.{name}", len(df), dur)
 
 # ────────────────────────────────────────────
 # MAIN
 # ────────────────────────────────────────────
 
-def main():
+def main(data_dir: str = DATA_DIR, schema: str = SCHEMA, mode: str = LOAD_MODE,
+         loader: str = LOADER, db: DbProvider | None = None,
+         workers: int = INSERT_WORKERS, pipeline: bool = PIPELINE,
+         reload: bool = False, ledger: bool = LEDGER) -> list[TableLoad]:
+    """Load the new ``LOADS_API_*`` files; ``db`` shares a run‑wide engine.
+
+    With ``pipeline`` each file chunk is written while the next is flattened.
+    With ``ledger`` files already loaded into ``schema`` are skipped unless
+    ``reload`` is set; pipelined files are recorded as each one finishes.
+    """
+    engine = db.engine if db else get_engine()
+    files, mark_loaded = ledger_files(engine, schema, data_dir, "LOADS_API_", reload, ledger)
+    if not files:
+        print("✅ No new loads files.")
+        return []
+    if pipeline:
+        print("Streaming loads JSON → SQL …")
+        loads = run_pipeline(
+            file_chunks(files, lambda names: iter_frames(data_dir, files=names)),
+            recording(lambda df: bulk_insert(engine, df, schema, mode, loader, workers), mark_loaded),
+        )
+        return combine_loads(loads)
+
     print("Loading loads JSON …")
-    df = build_dataframe()
+    df = build_dataframe(data_dir, files)
     print(f"Found {len(df):,} loads. Uploading …")
-    bulk_insert(get_engine(), df)
+    load = bulk_insert(engine, df, schema, mode, loader, workers)
+    mark_loaded()
+    return [load] if load else []
 
 
 if __name__ == "__main__":
@@ -3,24 +3,34 @@
 * Vectorised pandas bulk-insert (`fast_executemany=True`).
 * Adds `INSERTED_DTTM` audit column (single UTC timestamp per run).
 * Null-safe helpers prevent slicing errors.
+* Columns declared once in `TRIP_SPEC` / `STOP_SPEC` and flattened
+  column-wise by `utils.flatten`.
+* `pipeline=True` streams file chunks into SQL while the next one is
+  flattened (`utils.pipeline`).
+* Files already loaded into the target are skipped (`utils.ledger`).
 """
 import os
-import json
 import time
+from functools import partial
 from datetime import datetime, timezone
-from typing import List, Optional, Any
+from typing import Iterator, List, Optional, Any, Tuple
 
 import pandas as pd
 from sqlalchemy import create_engine, types
 
+from utils.bulkcopy import LOADER, BulkCopyUnavailable, bcp_dataframe
+from utils.db import DbProvider, mssql_url
+from utils.flatten import Col, explode, flatten, projection
+from utils.formats import is_data_file, iter_records
+from utils.ledger import LEDGER, file_chunks, ledger_files, recording
+from utils.parallel import INSERT_WORKERS, TableLoad, chunks, run_parallel
+from utils.pipeline import PIPELINE, PIPELINE_CHUNK_ROWS, batches, combine_loads, run_pipeline
+from utils.rows import append_dataframe
+from utils.upsert import LOAD_MODE, format_counts, upsert_dataframe
+
 # ────────────────────────────────────────────
 # CONFIG
 # ────────────────────────────────────────────
-SQL_SERVER = "ksm-ksmta-sqlsrv-001.database.windows.net"
-SQL_DATABASE = "KSMTA"
-SQL_USERNAME = "importuser"
-SQL_PASSWORD = "B2_SBD-Omicron-B00ts2!"
-
 SCHEMA = "TBXX"
 TRIP_TABLE = f"{SCHEMA}.TRIPS_RAW"
 STOP_TABLE = f"{SCHEMA}.TRIP_STOPS_RAW"
@@ -131,10 +141,7 @@ DTYPE_STOPS = {
 # ────────────────────────────────────────────
 
 def get_engine():
-    conn = (
-        f"mssql+pyodbc://{SQL_USERNAME}:{SQL_PASSWORD}@{SQL_SERVER}/{SQL_DATABASE}?driver=ODBC+Driver+17+for+SQL+Server"
-    )
-    return create_engine(conn, fast_executemany=True)
+    return create_engine(mssql_url(), fast_executemany=True)
 
 # ────────────────────────────────────────────
 # HELPERS
@@ -149,182 +156,227 @@ def _s(val: Optional[Any], max_len: int | None = None) -> Optional[str]:
     return s[:max_len] if max_len else s
 
 
-def _f(val) -> Optional[float]:
-    try:
-        return float(val) if val not in (None, "") else None
-    except (TypeError, ValueError):
-        return None
-
+def _earliest(stop: dict):
+    window = stop.get("StopWindow")
+    return stop.get("AppointmentDate") or (window.get("Begin") if isinstance(window, dict) else None)
 
-def _dt(series: pd.Series | Any) -> pd.Series | Optional[datetime]:
-    if isinstance(series, pd.Series):
-        return pd.to_datetime(series, utc=True, errors="coerce").dt.tz_localize(None)
-    return pd.to_datetime(series, utc=True, errors="coerce").tz_localize(None) if series else None
+# ────────────────────────────────────────────
+# COLUMN SPECS (JSON path → column, see utils.flatten)
+# ────────────────────────────────────────────
+TRIP_SPEC: List[Col] = [
+    Col("ID", "Id", max_len=100),
+    Col("TRIP_NUMBER", "TripNumber", max_len=100),
+    Col("TRIP_STATUS", "Status", max_len=50),
+    Col("LOAD_NUMBER", "LoadNumber", max_len=100),
+    Col("TENDER_AS", "TenderAs", max_len=50),
+    Col("TOTAL_MILEAGE", ("TotalMileage", "Distance", "Value"), "float"),
+    Col("MILEAGE_SOURCE", ("TotalMileage", "Source"), max_len=50),
+    Col("MILEAGE_PROFILE_NAME", ("TotalMileage", "ProfileName"), max_len=100),
+    Col("EMPTY_MILEAGE", ("EmptyMileage", "Distance", "Value"), "float"),
+    Col("LOADED_MILEAGE", ("LoadedMileage", "Distance", "Value"), "float"),
+    Col("PICKUP_DTTM", "PickupDate", "dt"),
+    Col("DELIVERY_DTTM", "DeliveryDate", "dt"),
+    Col("PICKED_UP_DTTM", "PickedUpAt", "dt"),
+    Col("DELIVERED_DTTM", "DeliveredAt", "dt"),
+    Col("CARRIER_ASSIGNED_DTTM", "CarrierAssignedAt", "dt"),
+    Col("RELEASED_DTTM", "ReleasedAt", "dt"),
+    Col("TRIP_VALUE", ("TripValue", "Amount"), "float"),
+    Col("TRUCK_ID", ("Truck", "Id"), max_len=100),
+    Col("TRUCK_FLEET_ID", ("Truck", "Fleet", "Id"), max_len=100),
+    Col("TRUCK_FLEET_NAME", ("Truck", "Fleet", "Name"), max_len=100),
+    Col("TRAILER_ID", ("Trailer", "Id"), max_len=100),
+    Col("TRAILER_TYPE", ("Trailer", "EquipmentType"), max_len=50),
+    Col("DRIVER1_ID", ("Driver1", "Id"), max_len=100),
+    Col("DRIVER1_TYPE", ("Driver1", "ContractorType"), max_len=50),
+    Col("DRIVER1_FLEET_ID", ("Driver1", "Fleet", "Id"), max_len=100),
+    Col("DRIVER2_ID", ("Driver2", "Id"), max_len=100),
+    Col("DRIVER2_TYPE", ("Driver2", "ContractorType"), max_len=50),
+    Col("DRIVER2_FLEET_ID", ("Driver2", "Fleet", "Id"), max_len=100),
+    Col("OWNER_OPERATOR_ID", ("OwnerOperator", "Id"), max_len=100),
+    Col("RELEASED_BY", "ReleasedBy", max_len=100),
+    Col("DISPATCHED_BY", "DispatchedBy", max_len=100),
+    Col("DISPATCHER_ID", "DispatcherId", max_len=100),
+    Col("IS_CARRIER_PAY_ON_HOLD", "CarrierPayOnHold", "flag"),
+    Col("CARRIER_ID", ("Carrier", "Id"), max_len=100),
+    Col("CARRIER_INVOICE", ("Carrier", "CarrierInvoiceNumber"), max_len=100),
+    Col("CARRIER_RATE", ("Carrier", "Rate", "Amount"), "float"),
+    Col("CARRIER_LINEHAUL", ("Carrier", "Linehaul", "Amount"), "float"),
+    Col("CARRIER_FUEL", ("Carrier", "Fuel", "Amount"), "float"),
+    Col("CARRIER_ACCESSORIALS", ("Carrier", "Accessorials", "Amount"), "float"),
+    Col("CARRIER_TOTAL_PAYABLE", ("Carrier", "TotalPayable", "Amount"), "float"),
+    Col("UPDATED_DTTM", "UpdatedAt", "dt"),
+]
 
+# TRIP_ID / TRIP_NUMBER / STOP_SEQUENCE come from the parent trip
+STOP_SPEC: List[Col] = [
+    Col("ID", "Id", max_len=100),
+    Col("IS_APPOINTMENT_REQUESTED", "AppointmentRequested", "flag"),
+    Col("IS_APPOINTMENT_CONFIRMED", "AppointmentConfirmed", "flag"),
+    Col("EARLIEST_APPOINTMENT_DTTM", _earliest, "dt", reads=("AppointmentDate", ("StopWindow", "Begin"))),
+    Col("LATEST_APPOINTMENT_DTTM", ("StopWindow", "End"), "dt"),
+    Col("STREET_ADDRESS", ("Address", "Street"), max_len=200),
+    Col("CITY", ("Address", "City"), max_len=100),
+    Col("STATE_PROVINCE", ("Address", "State"), max_len=50),
+    Col("POSTAL_CD", ("Address", "ZipCode"), max_len=20),
+    Col("LATITUDE", ("Coordinates", "Latitude"), "float"),
+    Col("LONGITUDE", ("Coordinates", "Longitude"), "float"),
+    Col("STOP_STATUS", "Status", max_len=50),
+    Col("STOP_TYPE", "StopType", max_len=50),
+    Col("STOP_SCHEDULE_TYPE", "ScheduleType", max_len=50),
+    Col("LOADING_TYPE", "LoadingType", max_len=50),
+    Col("ARRIVED_DTTM", "ArrivedAt", "dt"),
+    Col("DEPARTED_DTTM", "DepartedAt", "dt"),
+]
 
-def g(d: Optional[dict], *keys):
-    for k in keys:
-        if not isinstance(d, dict):
-            return None
-        d = d.get(k)
-    return d
+# Fields kept per record while streaming a file (everything else is dropped)
+TRIP_FIELDS = projection(TRIP_SPEC, {"Stops": STOP_SPEC}, extra=["FILE_ID"])
 
 # ────────────────────────────────────────────
 # FLATTENERS
 # ────────────────────────────────────────────
 
-def flatten_trip(trip: dict, file_id: str):
-    return [
-        _s(trip.get("Id"), 100),
-        _s(trip.get("TripNumber"), 100),
-        _s(trip.get("Status"), 50),
-        _s(trip.get("LoadNumber"), 100),
-        _s(trip.get("TenderAs"), 50),
-        _f(g(trip, "TotalMileage", "Distance", "Value")),
-        _s(g(trip, "TotalMileage", "Source"), 50),
-        _s(g(trip, "TotalMileage", "ProfileName"), 100),
-        _f(g(trip, "EmptyMileage", "Distance", "Value")),
-        _f(g(trip, "LoadedMileage", "Distance", "Value")),
-        trip.get("PickupDate"),
-        trip.get("DeliveryDate"),
-        trip.get("PickedUpAt"),
-        trip.get("DeliveredAt"),
-        trip.get("CarrierAssignedAt"),
-        trip.get("ReleasedAt"),
-        _f(g(trip, "TripValue", "Amount")),
-        _s(g(trip, "Truck", "Id"), 100),
-        _s(g(trip, "Truck", "Fleet", "Id"), 100),
-        _s(g(trip, "Truck", "Fleet", "Name"), 100),
-        _s(g(trip, "Trailer", "Id"), 100),
-        _s(g(trip, "Trailer", "EquipmentType"), 50),
-        _s(g(trip, "Driver1", "Id"), 100),
-        _s(g(trip, "Driver1", "ContractorType"), 50),
-        _s(g(trip, "Driver1", "Fleet", "Id"), 100),
-        _s(g(trip, "Driver2", "Id"), 100),
-        _s(g(trip, "Driver2", "ContractorType"), 50),
-        _s(g(trip, "Driver2", "Fleet", "Id"), 100),
-        _s(g(trip, "OwnerOperator", "Id"), 100),
-        _s(trip.get("ReleasedBy"), 100),
-        _s(trip.get("DispatchedBy"), 100),
-        _s(trip.get("DispatcherId"), 100),
-        int(trip.get("CarrierPayOnHold") or False),
-        _s(g(trip, "Carrier", "Id"), 100),
-        _s(g(trip, "Carrier", "CarrierInvoiceNumber"), 100),
-        _f(g(trip, "Carrier", "Rate", "Amount")),
-        _f(g(trip, "Carrier", "Linehaul", "Amount")),
-        _f(g(trip, "Carrier", "Fuel", "Amount")),
-        _f(g(trip, "Carrier", "Accessorials", "Amount")),
-        _f(g(trip, "Carrier", "TotalPayable", "Amount")),
-        trip.get("UpdatedAt"),
-        file_id,
-        RUN_TS,
-    ]
-
-
-def flatten_stops(trip: dict, file_id: str):
-    trip_id = _s(trip.get("Id"), 100)
-    trip_num = _s(trip.get("TripNumber"), 100)
-    stops = []
-    for seq, stop in enumerate(trip.get("Stops", []), 1):
-        address = stop.get("Address", {})
-        coords = stop.get("Coordinates", {})
-        # Determine appointment window fields
-        earliest = stop.get("AppointmentDate") or g(stop, "StopWindow", "Begin")
-        latest = g(stop, "StopWindow", "End") if stop.get("StopWindow") else None
-        stops.append([
-            _s(stop.get("Id") or f"{trip_id}_{seq}", 100),
-            trip_id,
-            trip_num,
-            seq,
-            int(stop.get("AppointmentRequested") or False),
-            int(stop.get("AppointmentConfirmed") or False),
-            earliest,
-            latest,
-            _s(address.get("Street"), 200),
-            _s(address.get("City"), 100),
-            _s(address.get("State"), 50),
-            _s(address.get("ZipCode"), 20),
-            _f(coords.get("Latitude")),
-            _f(coords.get("Longitude")),
-            _s(stop.get("Status"), 50),
-            _s(stop.get("StopType"), 50),
-            _s(stop.get("ScheduleType"), 50),
-            _s(stop.get("LoadingType"), 50),
-            stop.get("ArrivedAt"),
-            stop.get("DepartedAt"),
-            file_id,
-            RUN_TS,
-        ])
-    return stops
+def flatten_trips(raw: list[dict], file_id: str) -> pd.DataFrame:
+    return flatten(raw, TRIP_SPEC, TRIP_COLS, {"FILE_ID": file_id, "INSERTED_DTTM": RUN_TS},
+                   label="trips")
+
+
+def flatten_stops(raw: list[dict], trips: pd.DataFrame, file_id: str) -> pd.DataFrame:
+    """One row per stop; ``trips`` is :func:`flatten_trips` of the same ``raw``."""
+    stops, parents = explode(raw, "Stops")
+    df = flatten(stops, STOP_SPEC, constants={"FILE_ID": file_id, "INSERTED_DTTM": RUN_TS}, label="stops")
+    parent = trips[["ID", "TRIP_NUMBER"]].iloc[parents].reset_index(drop=True)
+    df["TRIP_ID"] = parent["ID"]
+    df["TRIP_NUMBER"] = parent["TRIP_NUMBER"]
+    df["STOP_SEQUENCE"] = pd.Series(parents).groupby(parents).cumcount() + 1
+    # Stops without an Id get "<trip id>_<sequence>"
+    missing = df["ID"].isna()
+    if missing.any():
+        fallback = parent["ID"].astype(str) + "_" + df["STOP_SEQUENCE"].astype(str)
+        df.loc[missing, "ID"] = fallback[missing].str.slice(0, 100)
+    return df[STOP_COLS]
 
 # ────────────────────────────────────────────
 # BUILD DATAFRAMES
 # ────────────────────────────────────────────
 
-def build_dfs():
-    trip_rows: list[list] = []
-    stop_rows: list[list] = []
-    for fname in sorted(os.listdir(DATA_DIR)):
-        if not fname.startswith("TRIPS_API_") or not fname.endswith(".json"):
-            continue
-        with open(os.path.join(DATA_DIR, fname), encoding="utf-8") as f:
-            data = json.load(f)
-        if not data:
-            continue
-        file_id = _s(data[0].get("FILE_ID"), 50)
-        print(f"Processing {fname} … {len(data):,} objects (FILE_ID={file_id})")
-        for trip in data:
-            trip_rows.append(flatten_trip(trip, file_id))
-            stop_rows.extend(flatten_stops(trip, file_id))
-
-    trips_df = pd.DataFrame(trip_rows, columns=TRIP_COLS)
-    stops_df = pd.DataFrame(stop_rows, columns=STOP_COLS)
-
-    # Parse datetime columns
-    datetime_trip_cols = [
-        "PICKUP_DTTM", "DELIVERY_DTTM", "PICKED_UP_DTTM", "DELIVERED_DTTM",
-        "CARRIER_ASSIGNED_DTTM", "RELEASED_DTTM", "UPDATED_DTTM",
-    ]
-    trips_df[datetime_trip_cols] = trips_df[datetime_trip_cols].apply(_dt)
-
-    datetime_stop_cols = [
-        "EARLIEST_APPOINTMENT_DTTM", "LATEST_APPOINTMENT_DTTM", "ARRIVED_DTTM", "DEPARTED_DTTM",
-    ]
-    stops_df[datetime_stop_cols] = stops_df[datetime_stop_cols].apply(_dt)
+def iter_frames(data_dir: str = DATA_DIR, chunk_rows: int = PIPELINE_CHUNK_ROWS,
+                files: Optional[List[str]] = None) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """``(trips, stops)`` per file, in batches of at most ``chunk_rows`` trips.
 
+    ``files`` limits the run to those names (default: every ``TRIPS_API_*``).
+    """
+    for fname in sorted(os.listdir(data_dir)) if files is None else files:
+        if not is_data_file(fname, "TRIPS_API_"):
+            continue
+        records = iter_records(os.path.join(data_dir, fname), TRIP_FIELDS)
+        for n, part in enumerate(batches(records, chunk_rows)):
+            if n == 0:
+                file_id = _s(part[0].get("FILE_ID"), 50)
+            print(f"Processing {fname} … {len(part):,} objects (FILE_ID={file_id})")
+            trips = flatten_trips(part, file_id)
+            yield trips, flatten_stops(part, trips, file_id)
+
+
+def build_dfs(data_dir: str = DATA_DIR, files: Optional[List[str]] = None):
+    trip_frames: list[pd.DataFrame] = []
+    stop_frames: list[pd.DataFrame] = []
+    for trips, stops in iter_frames(data_dir, chunk_rows=0, files=files):
+        trip_frames.append(trips)
+        stop_frames.append(stops)
+
+    trips_df = pd.concat(trip_frames, ignore_index=True) if trip_frames else pd.DataFrame(columns=TRIP_COLS)
+    stops_df = pd.concat(stop_frames, ignore_index=True) if stop_frames else pd.DataFrame(columns=STOP_COLS)
     return trips_df, stops_df
 
 # ────────────────────────────────────────────
 # BULK INSERT
 # ────────────────────────────────────────────
 
-def bulk_insert(engine, table: str, df: pd.DataFrame, dtype_map: dict):
+def bulk_insert(engine, table: str, df: pd.DataFrame, dtype_map: dict, schema: str = SCHEMA,
+                mode: str = LOAD_MODE, loader: str = LOADER,
+                workers: int = INSERT_WORKERS) -> TableLoad | None:
+    """Append ``df`` (default) or MERGE it on ``ID`` when ``mode="upsert"``.
+
+    Appends go through ``bcp`` when ``loader="bcp"`` and it is installed;
+    otherwise large appends are split over ``workers`` pooled connections
+    (one transaction per chunk).  Returns the :class:`TableLoad`.
+    """
+    name = table.split(".")[-1]
     if df.empty:
         print(f"⚠️  No records for {table}.")
-        return
-    df = df.where(pd.notnull(df), None)
+        return None
     start = time.perf_counter()
-    df.to_sql(
-        name=table.split(".")[-1],
-        schema=SCHEMA,
-        con=engine,
-        if_exists="append",
-        index=False,
-        chunksize=CHUNK_SIZE,
-        dtype=dtype_map,
-    )
-    print(f"✅ {len(df):,} rows inserted into {table} in {time.perf_counter() - start:.1f}s")
+    if mode == "upsert":
+        counts = upsert_dataframe(engine, df, schema, name, dtype=dtype_map)
+        dur = time.perf_counter() - start
+        print(f"✅ {schema}.{name} upsert: {format_counts(counts)} in {dur:.1f}s")
+        return TableLoad(f"{schema}.{name}", len(df), dur, counts)
+    if loader == "bcp":
+        try:
+            rows = bcp_dataframe(engine, df, schema, name)
+            dur = time.perf_counter() - start
+            print(f"✅ {rows:,} rows bulk-copied into {schema}.{name} in {dur:.1f}s")
+            return TableLoad(f"{schema}.{name}", rows, dur)
+        except BulkCopyUnavailable as exc:
+            print(f"⚠️  {exc} – falling back to executemany")
+    parts = chunks(df, workers)
+    # Create a missing table once from the dtype map; rows go straight
+    # from the typed columns to executemany (utils.rows)
+    df.head(0).to_sql(name=name, schema=schema, con=engine, if_exists="append",
+                      index=False, dtype=dtype_map)
+    run_parallel([(str(i), partial(append_dataframe, engine, part, schema, name, CHUNK_SIZE))
+                  for i, part in enumerate(parts)], workers)
+    dur = time.perf_counter() - start
+    via = f" over {len(parts)} connections" if len(parts) > 1 else ""
+    print(f"✅ {len(df):,} rows inserted into {schema}.{name} in {dur:.1f}s{via}")
+    return TableLoad(f"{schema}.{name}", len(df), dur)
 
 # ────────────────────────────────────────────
 # MAIN
 # ────────────────────────────────────────────
 
-def main():
-    trips_df, stops_df = build_dfs()
+def insert_tables(engine, trips_df: pd.DataFrame, stops_df: pd.DataFrame, schema: str = SCHEMA,
+                  mode: str = LOAD_MODE, loader: str = LOADER,
+                  workers: int = INSERT_WORKERS) -> list[TableLoad]:
+    """Write trips and stops – side by side when ``workers`` > 1."""
+    per_table = max(workers // 2, 1)
+    loads = run_parallel([
+        ("trips", lambda: bulk_insert(engine, TRIP_TABLE, trips_df, DTYPE_TRIPS, schema, mode, loader, per_table)),
+        ("stops", lambda: bulk_insert(engine, STOP_TABLE, stops_df, DTYPE_STOPS, schema, mode, loader, per_table)),
+    ], workers)
+    return [ld for ld in loads.values() if ld]
+
+
+def main(data_dir: str = DATA_DIR, schema: str = SCHEMA, mode: str = LOAD_MODE,
+         loader: str = LOADER, db: DbProvider | None = None,
+         workers: int = INSERT_WORKERS, pipeline: bool = PIPELINE,
+         reload: bool = False, ledger: bool = LEDGER) -> list[TableLoad]:
+    """Load the new ``TRIPS_API_*`` files; ``db`` shares a run‑wide engine.
+
+    Trips and stops load side by side when ``workers`` > 1.  With
+    ``pipeline`` each file chunk is written while the next is flattened.
+    With ``ledger`` files already loaded into ``schema`` are skipped unless
+    ``reload`` is set; pipelined files are recorded as each one finishes.
+    """
+    eng = db.engine if db else get_engine()
+    files, mark_loaded = ledger_files(eng, schema, data_dir, "TRIPS_API_", reload, ledger)
+    if not files:
+        print("✅ No new trips files.")
+        return []
+    if pipeline:
+        print("Streaming trips JSON → SQL …")
+        loads = run_pipeline(
+            file_chunks(files, lambda names: iter_frames(data_dir, files=names)),
+            recording(lambda frames: insert_tables(eng, *frames, schema, mode, loader, workers),
+                      mark_loaded),
+        )
+        return combine_loads(ld for chunk in loads for ld in chunk or ())
+
+    trips_df, stops_df = build_dfs(data_dir, files)
     print(f"Found {len(trips_df):,} trips & {len(stops_df):,} stops. Uploading …")
-    eng = get_engine()
-    bulk_insert(eng, TRIP_TABLE, trips_df, DTYPE_TRIPS)
-    bulk_insert(eng, STOP_TABLE, stops_df, DTYPE_STOPS)
+    loads = insert_tables(eng, trips_df, stops_df, schema, mode, loader, workers)
+    mark_loaded()
+    return loads
 
 
 if __name__ == "__main__":
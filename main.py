@@ -16,32 +16,56 @@ python main.py insert all --scac QWIK
 # End‑to‑end export ➔ insert for loads & trips
 python main.py export-insert loads trips --scac QWIK
 
+# Same for several tenants (or every active client) in one process
+python main.py export-insert all --scac QWIK,ABCD --tenant-workers 4
+python main.py export-insert all --scac all
+
 Design highlights
 -----------------
 * **Argparse sub‑commands** provide a clean UX without extra packages.
 * **Dynamic credential lookup** via `config.get_credentials(scac)` – the
-  function queries the shared `dbo.CLIENTS` table and returns the
-  tenant‑specific OAuth and API details.
+  function reads the shared `dbo.CLIENTS` table (all rows in one query,
+  cached with a TTL) and returns the tenant‑specific OAuth and API details.
 * **Week range helper** (`utils.dates.get_last_week_range`) returns an
   ISO‑8601 (Sunday 00:00 → Saturday 23:59:59.999) tuple for *n* weeks ago.
 * **Lazy imports** – export/insert modules are imported only when needed,
   keeping startup fast.
 * **Dry‑run mode** (`--dry-run`) lets you validate without writing files or
   touching the DB.
+* **Multi‑tenant fan‑out** – `--scac` takes a comma‑separated list or `all`;
+  tenants run in a thread pool and a per‑tenant summary is printed at the
+  end.  Every tenant – one or many – gets its own `alvys_weekly_data/<SCAC>`
+  folder and target schema; `--layout shared` (one SCAC only) keeps the
+  classic `alvys_weekly_data` folder and the modules' default schema.  If
+  that folder still holds files and no layout is chosen, the run stops
+  rather than silently switching an existing setup to new places.
+* **Stage metrics** (`utils.metrics`) – page latency, parse, flatten and
+  insert timings, rows, bytes and peak RSS are printed after every run and
+  written to `--metrics-json` (run report) / `--metrics-prom` (Prometheus
+  textfile) when given.
 """
 from __future__ import annotations
 
 import argparse
 import importlib
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from functools import partial
 from pathlib import Path
-from typing import Iterable, List
+from typing import Dict, Iterable, List, Tuple
 
 # ────────────────────────────────────────────
 # INTERNAL MODULES (small, fast to import)
 # ────────────────────────────────────────────
 from utils.dates import get_last_week_range
-from config import get_credentials
+from config import credential_store, get_credentials, list_active_scacs
+from utils.formats import FORMATS
+from utils.bulkcopy import LOADERS
+from utils.metrics import METRICS_JSON, METRICS_PROM, run_metrics
+from utils.upsert import LOAD_MODES
 
 # Default output folder shared by export & insert steps
 DATA_DIR = Path("alvys_weekly_data")
@@ -58,10 +82,41 @@ ENTITIES = [
     "carriers",
 ]
 
+# Snapshot entities share one insert module (inserts/active_entities_insert.py)
+SNAPSHOT_ENTITIES = ["drivers", "trucks", "trailers", "customers", "carriers"]
+
+# Tenants processed concurrently when --scac names more than one client
+TENANT_WORKERS = 4
+
+# Where a tenant's files and rows go: "tenant" = alvys_weekly_data/<SCAC> and
+# schema <SCAC>; "shared" = alvys_weekly_data and the modules' default schema.
+# Unset: "tenant", unless alvys_weekly_data holds shared-layout files (see resolve_layout)
+LAYOUTS = ("tenant", "shared")
+DATA_LAYOUT = os.getenv("ALVYS_DATA_LAYOUT") or None
+
+SCAC_HELP = "Client SCAC, comma-separated list of SCACs, or 'all' active clients"
+
 # ────────────────────────────────────────────
 # ARGPARSE
 # ────────────────────────────────────────────
 
+def add_metrics_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--metrics-json", default=METRICS_JSON, metavar="PATH",
+                        help="Write a JSON run report with per-stage metrics "
+                             "(default: ALVYS_METRICS_JSON)")
+    parser.add_argument("--metrics-prom", default=METRICS_PROM, metavar="PATH",
+                        help="Write the run metrics as a Prometheus textfile "
+                             "(default: ALVYS_METRICS_PROM)")
+
+
+def add_layout_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--layout", choices=LAYOUTS, default=DATA_LAYOUT,
+                        help="tenant: alvys_weekly_data/<SCAC> and schema <SCAC>; shared: "
+                             "alvys_weekly_data and the default schema, one SCAC only "
+                             "(default: ALVYS_DATA_LAYOUT, else tenant; required while "
+                             "alvys_weekly_data holds shared-layout files)")
+
+
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser("Alvys multi‑tenant ingestion CLI")
     sub = p.add_subparsers(dest="cmd", required=True)
@@ -70,25 +125,87 @@ def build_parser() -> argparse.ArgumentParser:
     exp = sub.add_parser("export", help="Export JSON from Alvys API")
     exp.add_argument("entities", nargs="*", default=["all"], choices=ENTITIES + ["all"],
                      help="Which entities to export (default: all)")
-    exp.add_argument("--scac", required=True, help="Client SCAC (schema & creds resolver)")
+    exp.add_argument("--scac", required=True, help=SCAC_HELP)
     exp.add_argument("--weeks-ago", type=int, default=1,
                      help="How many weeks back to pull (1 = last week)")
     exp.add_argument("--dry-run", action="store_true", help="Skip network + file writes")
+    exp.add_argument("--tenant-workers", type=int, default=TENANT_WORKERS,
+                     help="Tenants processed concurrently when several SCACs are given")
+    exp.add_argument("--workers", type=int, default=None,
+                     help="Concurrent page fetches per search (default: ALVYS_PAGE_WORKERS or 1)")
+    exp.add_argument("--parallel", type=int, default=None,
+                     help="Entities exported concurrently (default: ALVYS_ENTITY_WORKERS or 1)")
+    exp.add_argument("--max-in-flight", type=int, default=None,
+                     help="Global cap on concurrent API requests (default: ALVYS_MAX_IN_FLIGHT or 8)")
+    exp.add_argument("--per-endpoint", type=int, default=None,
+                     help="Cap on concurrent requests per search endpoint (default: ALVYS_PER_ENDPOINT or 4)")
+    exp.add_argument("--format", dest="fmt", choices=list(FORMATS), default=None,
+                     help="On-disk format of exported files (default: ALVYS_EXPORT_FORMAT or json)")
+    exp.add_argument("--incremental", action="store_true",
+                     help="Only pull records changed since the last successful run (watermarks)")
+    exp.add_argument("--full-resync", action="store_true",
+                     help="With --incremental: ignore stored watermarks and pull everything again")
+    exp.add_argument("--prune", action="store_true", default=None,
+                     help="Write only the fields the insert modules read (default: ALVYS_EXPORT_PRUNE)")
+    exp.add_argument("--no-checkpoint", dest="checkpoint", action="store_false", default=None,
+                     help="Don't spool pages for resuming a failed export (ALVYS_EXPORT_CHECKPOINT)")
+    add_layout_args(exp)
+    add_metrics_args(exp)
 
     # insert ---------------------------------------------------------------
     ins = sub.add_parser("insert", help="Insert JSON into SQL Server")
     ins.add_argument("entities", nargs="*", default=["all"], choices=ENTITIES + ["all"],
                      help="Which entities to insert (default: all)")
-    ins.add_argument("--scac", required=True, help="Client SCAC (schema in target DB)")
+    ins.add_argument("--scac", required=True, help=SCAC_HELP)
     ins.add_argument("--dry-run", action="store_true", help="Skip DB writes")
+    ins.add_argument("--mode", choices=LOAD_MODES, default=None,
+                     help="append rows, or MERGE them on ID (default: ALVYS_LOAD_MODE or append)")
+    ins.add_argument("--loader", choices=LOADERS, default=None,
+                     help="Append backend; bcp falls back to executemany if not installed "
+                          "(default: ALVYS_LOADER or executemany)")
+    ins.add_argument("--insert-workers", type=int, default=None,
+                     help="Tables / chunks loaded concurrently, each on its own pooled "
+                          "connection (default: ALVYS_INSERT_WORKERS or 1)")
+    ins.add_argument("--pipeline", action="store_true",
+                     help="Write each file chunk while the next is parsed and flattened "
+                          "(default: ALVYS_INSERT_PIPELINE)")
+    ins.add_argument("--reload", action="store_true",
+                     help="Load every weekly file again, even those the ledger "
+                          "records as already loaded, and every snapshot row, "
+                          "changed or not")
+    ins.add_argument("--tenant-workers", type=int, default=TENANT_WORKERS,
+                     help="Tenants processed concurrently when several SCACs are given")
+    add_layout_args(ins)
+    add_metrics_args(ins)
+    # export‑only knobs, so run_tenant can treat every sub‑command alike
+    ins.set_defaults(weeks_ago=1, workers=None, parallel=None,
+                     max_in_flight=None, per_endpoint=None, fmt=None,
+                     incremental=False, full_resync=False, prune=None, checkpoint=None)
 
     # export‑insert --------------------------------------------------------
     ei = sub.add_parser("export-insert", help="Run export and insert in one step")
     ei.add_argument("entities", nargs="*", default=["all"], choices=ENTITIES + ["all"],
                     help="Which entities (default: all)")
-    ei.add_argument("--scac", required=True)
+    ei.add_argument("--scac", required=True, help=SCAC_HELP)
     ei.add_argument("--weeks-ago", type=int, default=1)
     ei.add_argument("--dry-run", action="store_true")
+    ei.add_argument("--tenant-workers", type=int, default=TENANT_WORKERS)
+    ei.add_argument("--workers", type=int, default=None)
+    ei.add_argument("--parallel", type=int, default=None)
+    ei.add_argument("--max-in-flight", type=int, default=None)
+    ei.add_argument("--per-endpoint", type=int, default=None)
+    ei.add_argument("--format", dest="fmt", choices=list(FORMATS), default=None)
+    ei.add_argument("--incremental", action="store_true")
+    ei.add_argument("--mode", choices=LOAD_MODES, default=None)
+    ei.add_argument("--loader", choices=LOADERS, default=None)
+    ei.add_argument("--insert-workers", type=int, default=None)
+    ei.add_argument("--pipeline", action="store_true")
+    ei.add_argument("--reload", action="store_true")
+    ei.add_argument("--full-resync", action="store_true")
+    ei.add_argument("--prune", action="store_true", default=None)
+    ei.add_argument("--no-checkpoint", dest="checkpoint", action="store_false", default=None)
+    add_layout_args(ei)
+    add_metrics_args(ei)
 
     return p
 
@@ -103,12 +220,26 @@ def normalise(entity_args: Iterable[str]) -> List[str]:
         return ENTITIES
     return [e for e in ENTITIES if e in ent_set]
 
+
+def resolve_scacs(value: str) -> List[str]:
+    """Expand the --scac argument: "all", one SCAC or a comma-separated list."""
+    if value.strip().lower() == "all":
+        return list_active_scacs()
+    scacs = [s.strip().upper() for s in value.split(",") if s.strip()]
+    return list(dict.fromkeys(scacs))  # de-dupe, keep order
+
 # ────────────────────────────────────────────
 # EXPORT LOGIC
 # ────────────────────────────────────────────
 
-def run_export(scac: str, entities: List[str], weeks_ago: int, dry_run: bool):
-    start, end = get_last_week_range(weeks_ago)
+def run_export(scac: str, entities: List[str], weeks_ago: int, dry_run: bool,
+               workers: int | None = None, parallel: int | None = None,
+               max_in_flight: int | None = None, per_endpoint: int | None = None,
+               output_dir: Path = DATA_DIR, fmt: str | None = None,
+               incremental: bool = False, full_resync: bool = False,
+               prune: bool | None = None, checkpoint: bool | None = None):
+    reference = datetime.now(timezone.utc) - timedelta(weeks=weeks_ago - 1)
+    start, end = get_last_week_range(reference)
     creds = get_credentials(scac)
 
     if dry_run:
@@ -122,49 +253,237 @@ def run_export(scac: str, entities: List[str], weeks_ago: int, dry_run: bool):
         entities=entities,
         credentials=creds,
         date_range=(start, end),
-        output_dir=DATA_DIR,
+        output_dir=output_dir,
+        page_workers=workers,
+        entity_workers=parallel,
+        max_in_flight=max_in_flight,
+        per_endpoint=per_endpoint,
+        fmt=fmt,
+        incremental=incremental,
+        full_resync=full_resync,
+        prune=prune,
+        checkpoint=checkpoint,
     )
 
 # ────────────────────────────────────────────
 # INSERT LOGIC
 # ────────────────────────────────────────────
 
-def run_insert(scac: str, entities: List[str], dry_run: bool):
+def run_insert(scac: str, entities: List[str], dry_run: bool,
+               data_dir: Path = DATA_DIR, schema: str | None = None,
+               mode: str | None = None, loader: str | None = None, db=None,
+               workers: int | None = None, pipeline: bool = False, reload: bool = False):
+    """Run each entity's insert module against ``data_dir``.
+
+    ``schema`` overrides the modules' default target schema (used for
+    multi‑tenant runs, where each SCAC loads into its own schema); ``mode``
+    overrides their load mode (``append`` / ``upsert``) and ``loader`` their
+    append backend (``executemany`` / ``bcp``).  All modules share one pooled
+    ``utils.db.DbProvider`` – ``db`` if given, else one made for this call.
+
+    With ``workers`` > 1 the entities load side by side and each module
+    splits its share of the workers over its tables / chunks, so about
+    ``workers`` connections are busy at once.  ``pipeline`` makes each
+    module write one file chunk while it flattens the next
+    (``utils.pipeline``).  Weekly files already loaded into the schema are
+    skipped (``utils.ledger``), and with ``ALVYS_ROW_HASH=1`` snapshot rows
+    unchanged since the last load are not written again (``utils.rowhash``),
+    unless ``reload`` is set.  Per‑table throughput is printed at the end.
+    """
     if dry_run:
-        print("[DRY‑RUN] Would insert:", entities, "into schema", scac)
+        print("[DRY‑RUN] Would insert:", entities, "into schema", schema or scac)
         return
 
+    from utils.db import DB_POOL_SIZE, DbProvider
+    from utils.parallel import INSERT_WORKERS, flatten_loads, format_throughput, run_parallel
+
+    workers = max(workers or INSERT_WORKERS, 1)
+    own_db = db is None
+    db = db or DbProvider(pool_size=max(DB_POOL_SIZE, workers))
+    kwargs = {"data_dir": str(data_dir), "db": db}
+    if schema:
+        kwargs["schema"] = schema
+    if mode:
+        kwargs["mode"] = mode
+    if loader:
+        kwargs["loader"] = loader
+    if pipeline:
+        kwargs["pipeline"] = True
+
+    # Resolve every module up front so a missing one fails before any load
+    tasks = []
     for ent in entities:
+        if ent in SNAPSHOT_ENTITIES:
+            continue
         mod_name = f"inserts.{ent}_insert"
         try:
             mod = importlib.import_module(mod_name)
         except ModuleNotFoundError as exc:
             sys.exit(f"❌ Insert module not found: {mod_name} → {exc}")
-
-        if hasattr(mod, "main"):
-            print(f"→ inserting {ent.upper()} …")
-            mod.main()  # module handles its own CLI / config
-        else:
+        if not hasattr(mod, "main"):
             sys.exit(f"❌ {mod_name} lacks a main() entry‑point")
+        entry = partial(mod.main, reload=True) if reload else mod.main
+        tasks.append((ent, entry, ()))
+    snapshots = [e for e in entities if e in SNAPSHOT_ENTITIES]
+    if snapshots:
+        from inserts import active_entities_insert
+
+        entry = partial(active_entities_insert.main, reload=True) if reload else active_entities_insert.main
+        tasks.append((", ".join(snapshots), entry, (snapshots,)))
+
+    share = max(workers // max(len(tasks), 1), 1)
+
+    def insert(label, entry, args):
+        print(f"→ inserting {label.upper()} …")
+        return entry(*args, workers=share, **kwargs)  # module handles its own config
+
+    start = time.perf_counter()
+    try:
+        results = run_parallel(
+            [(label, lambda t=(label, entry, args): insert(*t)) for label, entry, args in tasks],
+            workers,
+        )
+        loads = flatten_loads(results.values())
+        for ld in loads:
+            run_metrics().add("insert", ld.seconds, ld.rows, table=ld.table)
+        if loads:
+            print(format_throughput(loads))
+        print(f"Inserted in {time.perf_counter() - start:.1f}s with {workers} worker(s)")
+    finally:
+        if own_db:
+            print(f"DB: {db.summary()}")
+            db.close()
+
+# ────────────────────────────────────────────
+# MULTI‑TENANT FAN‑OUT
+# ────────────────────────────────────────────
+
+def resolve_layout(layout: str | None, data_dir: Path = DATA_DIR) -> str:
+    """``layout`` if chosen, else ``tenant`` – unless ``data_dir`` itself holds files.
+
+    Files (exports, ledger, watermarks …) directly in ``data_dir`` mean an
+    existing shared‑layout setup; switching it to per‑tenant folders and
+    schemas would miss them and load elsewhere, so ask instead.
+    """
+    if layout:
+        return layout
+    if data_dir.is_dir() and any(p.is_file() for p in data_dir.iterdir()):
+        sys.exit(f"❌ {data_dir} holds files from the shared layout (one folder, default schema). "
+                 f"Pass --layout shared (or ALVYS_DATA_LAYOUT=shared) to keep it, or move them to "
+                 f"{data_dir}/<SCAC> and pass --layout tenant to load into schema <SCAC>")
+    return "tenant"
+
+
+def tenant_paths(layout: str, scac: str) -> Tuple[Path, str | None]:
+    """Data folder and target schema of ``scac`` (``None`` = module default)."""
+    if layout == "shared":
+        return DATA_DIR, None
+    return DATA_DIR / scac, scac
+
+
+def run_tenant(args: argparse.Namespace, scac: str, ents: List[str], db=None):
+    """Run the requested sub‑command for one SCAC, in its ``--layout`` place."""
+    data_dir, schema = tenant_paths(args.layout, scac)
+    if args.cmd in ("export", "export-insert"):
+        run_export(scac, ents, args.weeks_ago, args.dry_run, args.workers,
+                   args.parallel, args.max_in_flight, args.per_endpoint,
+                   output_dir=data_dir, fmt=args.fmt,
+                   incremental=args.incremental, full_resync=args.full_resync,
+                   prune=args.prune, checkpoint=args.checkpoint)
+    if args.cmd in ("insert", "export-insert"):
+        run_insert(scac, ents, args.dry_run, data_dir=data_dir, schema=schema,
+                   mode=args.mode, loader=args.loader, db=db,
+                   workers=args.insert_workers, pipeline=args.pipeline, reload=args.reload)
+
+
+def _run_tenant_safe(args, scac, ents, db=None) -> Tuple[bool, float, str]:
+    """Isolated tenant run → (ok, seconds, error message)."""
+    start = time.perf_counter()
+    try:
+        run_tenant(args, scac, ents, db=db)
+        return True, time.perf_counter() - start, ""
+    except (Exception, SystemExit) as exc:  # sys.exit() inside run_insert
+        return False, time.perf_counter() - start, f"{type(exc).__name__}: {exc}"
+
+
+def run_tenants(args: argparse.Namespace, ents: List[str]) -> Dict[str, Tuple[bool, float, str]]:
+    """Fan the sub‑command out over every SCAC and print a per‑tenant report.
+
+    Folders and schemas follow ``--layout`` (:func:`tenant_paths`) however
+    many SCACs run; only ``shared`` is limited to one.  A single SCAC runs
+    in the calling thread, without the summary.
+    """
+    scacs = resolve_scacs(args.scac)
+    if not scacs:
+        sys.exit("❌ No SCACs to process")
+    args.layout = resolve_layout(args.layout)
+    if args.layout == "shared" and len(scacs) > 1:
+        sys.exit(f"❌ --layout shared takes one SCAC; {len(scacs)} would share "
+                 f"{DATA_DIR} and one schema")
+    if len(scacs) == 1:
+        run_tenant(args, scacs[0], ents)
+        return {}
+
+    results: Dict[str, Tuple[bool, float, str]] = {}
+    print(f"Running {args.cmd} for {len(scacs)} tenants ({args.tenant_workers} at a time) …")
+    db = None
+    if args.cmd in ("insert", "export-insert") and not args.dry_run:
+        from utils.db import DB_POOL_SIZE, DbProvider
+        from utils.parallel import INSERT_WORKERS
+
+        # One pool for every tenant's inserts, wide enough for all workers
+        per_tenant = max(args.insert_workers or INSERT_WORKERS, 1)
+        db = DbProvider(pool_size=max(DB_POOL_SIZE, args.tenant_workers * per_tenant))
+    try:
+        with ThreadPoolExecutor(max_workers=max(args.tenant_workers, 1)) as pool:
+            futures = {pool.submit(_run_tenant_safe, args, scac, ents, db): scac for scac in scacs}
+            for fut in as_completed(futures):
+                results[futures[fut]] = fut.result()
+    finally:
+        if db is not None:
+            print(f"DB: {db.summary()}")
+            db.close()
+
+    print("\nTenant summary")
+    for scac in scacs:
+        ok, secs, err = results[scac]
+        print(f"  {'✅' if ok else '❌'} {scac:<8} {secs:7.1f}s  {err}".rstrip())
+    failed = [s for s in scacs if not results[s][0]]
+    print(f"{len(scacs) - len(failed)}/{len(scacs)} tenants succeeded")
+    print(f"Credentials: {credential_store().summary()}")
+    if failed:
+        sys.exit(f"❌ Failed tenants: {', '.join(failed)}")
+    return results
 
 # ────────────────────────────────────────────
 # MAIN DISPATCH
 # ────────────────────────────────────────────
 
+def write_metrics(args: argparse.Namespace, ents: List[str], ok: bool) -> None:
+    """Print the stage metrics and write the requested report files."""
+    metrics = run_metrics()
+    context = {"cmd": args.cmd, "scac": args.scac, "entities": ",".join(ents)}
+    print(metrics.summary())
+    try:
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json, success=ok, **context)
+            print(f"Run report → {args.metrics_json}")
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom, success=ok, cmd=args.cmd, scac=args.scac)
+            print(f"Prometheus metrics → {args.metrics_prom}")
+    except OSError as exc:  # a report must not fail the run
+        print(f"⚠️  Could not write metrics: {exc}")
+
+
 def main(argv: List[str] | None = None):
     args = build_parser().parse_args(argv)
     ents = normalise(args.entities)
-
-    if args.cmd == "export":
-        run_export(args.scac, ents, args.weeks_ago, args.dry_run)
-
-    elif args.cmd == "insert":
-        run_insert(args.scac, ents, args.dry_run)
-
-    elif args.cmd == "export-insert":
-        run_export(args.scac, ents, args.weeks_ago, args.dry_run)
-        # Skip insert if export was dry‑run but insert wasn’t explicitly dry‑run
-        run_insert(args.scac, ents, args.dry_run)
+    ok = False
+    try:
+        run_tenants(args, ents)
+        ok = True
+    finally:
+        write_metrics(args, ents, ok)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""SQL Server bulk‑copy (``bcp``) loader backend for the raw Alvys tables.
+
+``to_sql`` / ``cursor.executemany`` – even with ``fast_executemany`` – ship
+parameterised batches of 500–1 000 rows.  The ``bcp`` loader instead writes
+the flattened rows to a character‑mode data file and hands it to the
+``bcp`` utility (mssql‑tools), which streams it over the TDS bulk‑load path
+in a single minimally‑logged batch.
+
+* Select it per run with ``--loader bcp`` / ``ALVYS_LOADER=bcp``.
+* When no SQL Server ``bcp`` is on ``PATH`` (``ALVYS_BCP`` overrides the
+  executable) callers fall back to the executemany path.
+* Only *append* loads use it – upsert staging lives in a session temp table
+  that a separate ``bcp`` process cannot see.
+* A target without a username (or ``ALVYS_BCP_TRUSTED=1``) logs in with
+  ``-T`` (Windows / Kerberos).  SQL logins need ``-P <password>`` – bcp
+  reads it nowhere else – so the password is visible in the process list
+  of the host for the length of the load; use a trusted connection where
+  that matters.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import shlex
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from decimal import Decimal
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+__all__ = [
+    "LOADERS",
+    "LOADER",
+    "BulkCopyUnavailable",
+    "BcpTarget",
+    "target_from_engine",
+    "bcp_available",
+    "table_columns",
+    "write_bcp_file",
+    "bcp_load",
+    "bcp_dataframe",
+]
+
+LOADERS = ("executemany", "bcp")
+# Default backend for append loads
+LOADER = os.getenv("ALVYS_LOADER", "executemany")
+
+BCP_EXE = os.getenv("ALVYS_BCP", "bcp")
+# Extra bcp flags, e.g. "-u" (trust server cert) for mssql-tools18
+BCP_ARGS = shlex.split(os.getenv("ALVYS_BCP_ARGS", ""))
+# Log in with a trusted connection (-T) even when a SQL login is configured
+BCP_TRUSTED = os.getenv("ALVYS_BCP_TRUSTED", "0").lower() not in ("0", "false", "no")
+
+# ASCII unit / record separators never occur in Alvys text fields
+FIELD_SEP = "\x1f"
+ROW_SEP = "\x1e\n"
+_DT_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+class BulkCopyUnavailable(RuntimeError):
+    """No usable SQL Server ``bcp`` – callers fall back to executemany."""
+
+
+@dataclass(frozen=True)
+class BcpTarget:
+    server: str
+    database: str
+    username: str
+    password: str
+
+
+def target_from_engine(engine) -> BcpTarget:
+    """Connection details of a SQLAlchemy ``mssql+pyodbc`` engine."""
+    url = engine.url
+    return BcpTarget(url.host, url.database, url.username, url.password)
+
+
+@lru_cache(maxsize=None)
+def bcp_available(exe: str = BCP_EXE) -> bool:
+    """``True`` if ``exe`` is Microsoft's bcp (not e.g. Boost's namesake)."""
+    try:
+        out = subprocess.run([exe, "-v"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return "SQL Server" in out.stdout + out.stderr
+
+
+def table_columns(conn, schema: str, table: str) -> List[str]:
+    """Column names of ``schema.table`` in ordinal order (DB‑API ``conn``)."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ? ORDER BY ORDINAL_POSITION",
+            (schema, table),
+        )
+        return [row[0] for row in cur.fetchall()]
+    finally:
+        cur.close()
+
+
+def _field(val) -> str:
+    if val is None:
+        return ""
+    if hasattr(val, "strftime"):  # datetime / Timestamp in an object column
+        return val.strftime(_DT_FORMAT)[:-3]
+    if isinstance(val, bool):
+        return str(int(val))
+    if isinstance(val, float):  # fixed-point: bcp -c rejects 1e-05 for NUMERIC
+        return format(Decimal(repr(float(val))), "f")
+    if isinstance(val, Decimal):
+        return format(val, "f")
+    return str(val).replace(FIELD_SEP, " ").replace("\x1e", " ")
+
+
+def _as_text(col: pd.Series) -> pd.Series:
+    """Render one column the way ``bcp -c`` parses it; NULL → empty field."""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.dt.strftime(_DT_FORMAT).str[:-3].fillna("")
+    if pd.api.types.is_bool_dtype(col):
+        return col.astype(int).astype(str)
+    return col.astype(object).where(col.notna(), None).map(_field)
+
+
+def write_bcp_file(df: pd.DataFrame, path: str, columns: Optional[Sequence[str]] = None) -> int:
+    """Write ``df`` as a ``bcp -c`` data file laid out like ``columns``.
+
+    Table columns missing from ``df`` are written empty (NULL with ``-k``).
+    Returns the file size in bytes.
+    """
+    columns = list(columns or df.columns)
+    out = pd.DataFrame(
+        {c: _as_text(df[c]) if c in df.columns else "" for c in columns},
+        index=df.index,
+    )
+    out.to_csv(
+        path, sep=FIELD_SEP, lineterminator=ROW_SEP, header=False, index=False,
+        quoting=csv.QUOTE_NONE, encoding="utf-8",
+    )
+    return os.path.getsize(path)
+
+
+def _login(target: BcpTarget) -> List[str]:
+    """bcp login flags: ``-T`` when trusted, else the SQL login (see module doc)."""
+    if BCP_TRUSTED or not target.username:
+        return ["-T"]
+    return ["-U", target.username, "-P", target.password or ""]
+
+
+def bcp_load(df: pd.DataFrame, schema: str, table: str, target: BcpTarget,
+             conn, batch_size: int = 0) -> int:
+    """Bulk‑copy ``df`` into ``schema.table`` and return the row count.
+
+    ``conn`` (DB‑API) is only used to read the table's column order.  With
+    the default ``batch_size=0`` the file loads as one batch, so a failure
+    leaves the table untouched.
+    """
+    if not bcp_available(BCP_EXE):
+        raise BulkCopyUnavailable(f"{BCP_EXE!r} is not SQL Server's bcp")
+    columns = table_columns(conn, schema, table)
+    if not columns:  # the fallback path creates it
+        raise BulkCopyUnavailable(f"Table {schema}.{table} not found")
+    unknown = set(df.columns) - set(columns)
+    if unknown:
+        raise BulkCopyUnavailable(f"{schema}.{table} has no column(s) {sorted(unknown)}")
+
+    fd, path = tempfile.mkstemp(prefix=f"{table}_", suffix=".bcp")
+    os.close(fd)
+    try:
+        write_bcp_file(df, path, columns)
+        cmd = [
+            BCP_EXE, f"{schema}.{table}", "in", path,
+            "-S", target.server, "-d", target.database,
+            *_login(target),
+            "-c", "-t", FIELD_SEP, "-r", ROW_SEP,
+            "-k",            # empty field → NULL, not the column default
+            "-m", "1",       # cancel the load on the first bad row
+            "-h", "TABLOCK",
+            *BCP_ARGS,
+        ]
+        if os.name == "nt":
+            cmd += ["-C", "65001"]  # data file is UTF‑8
+        if batch_size:
+            cmd += ["-b", str(batch_size)]
+        res = subprocess.run(cmd, capture_output=True, text=True)
+        if res.returncode != 0 or "Error" in res.stdout:
+            tail = (res.stdout + res.stderr).strip().splitlines()[-5:]
+            raise RuntimeError(f"bcp into {schema}.{table} failed: " + " | ".join(tail))
+    finally:
+        os.remove(path)
+    return len(df)
+
+
+def bcp_dataframe(engine, df: pd.DataFrame, schema: str, table: str) -> int:
+    """:func:`bcp_load` for a SQLAlchemy ``engine``'s database."""
+    if not bcp_available(BCP_EXE):
+        raise BulkCopyUnavailable(f"{BCP_EXE!r} is not SQL Server's bcp")
+    raw = engine.raw_connection()
+    try:
+        return bcp_load(df, schema, table, target_from_engine(engine), raw)
+    finally:
+        raw.close()
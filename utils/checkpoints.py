@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+"""Per‑page export checkpoints so an interrupted pull resumes where it died.
+
+Each export job (entity + search) gets a folder under
+``<output_dir>/.checkpoints/``.  Every page is spooled there as a small
+NDJSON file as soon as it has been fetched.  A ``state.json`` next to the
+pages records:
+
+* the job as first run (payload and file name),
+* the run's ``FILE_ID``,
+* the item offset reached in the search and the spooled pages,
+* the newest watermark timestamp seen so far and the Ids stamped with it.
+
+A re‑run of the same job adopts that state: it re‑uses the original date
+range and file name and asks the API only for the pages after the offset.
+When the search is exhausted the spooled pages are stitched into the final
+file and the folder is removed.
+
+Why:
+
+* ``stream_json`` only renames its ``.part`` file at the end, so a failure
+  on page 37 used to throw away 36 pages of API calls.
+* Page files and the state are written atomically (temp file + rename),
+  so a crash at any point leaves a consistent checkpoint.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, Iterator, List, Optional
+
+from utils.formats import iter_records, write_records
+from utils.watermarks import format_ts, parse_ts
+
+__all__ = [
+    "CHECKPOINT_DIR",
+    "CHECKPOINT_MAX_AGE",
+    "ExportCheckpoint",
+    "prune_checkpoints",
+]
+
+# Folder inside the output folder holding one sub‑folder per job
+CHECKPOINT_DIR = ".checkpoints"
+# Checkpoints older than this many hours are discarded instead of resumed
+CHECKPOINT_MAX_AGE = float(os.getenv("ALVYS_CHECKPOINT_MAX_AGE", "24"))
+
+_STATE = "state.json"
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def prune_checkpoints(root: str, max_age_hours: float = CHECKPOINT_MAX_AGE) -> int:
+    """Remove job checkpoints under ``root`` older than ``max_age_hours``."""
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(root):
+        folder = os.path.join(root, name)
+        state = os.path.join(folder, _STATE)
+        mtime = os.path.getmtime(state) if os.path.exists(state) else os.path.getmtime(folder)
+        if mtime < cutoff:
+            shutil.rmtree(folder, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+class ExportCheckpoint:
+    """Spooled pages and progress of one export job.
+
+    ``key`` identifies the search (URL, filters, range start …) and must
+    stay the same across the original run and its re‑runs; ``job`` is what
+    a fresh checkpoint records and a resumed one hands back.
+    """
+
+    def __init__(self, root: str, name: str, key: str, job: Dict, file_id: str):
+        digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+        self.folder = os.path.join(root, f"{name.upper()}-{digest}")
+        self._state_path = os.path.join(self.folder, _STATE)
+        state = None
+        if os.path.exists(self._state_path):
+            with open(self._state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("key") != key:
+                state = None
+        self.resumed = state is not None
+        self._state = state or {
+            "key": key,
+            "job": job,
+            "file_id": file_id,
+            "offset": 0,
+            "pages": [],
+            "watermark": None,
+            "watermark_ids": [],
+            "complete": False,
+        }
+        if not self.resumed:
+            shutil.rmtree(self.folder, ignore_errors=True)
+            os.makedirs(self.folder)
+            self._save()
+
+    # ── state ────────────────────────────────────────────────────────────
+    @property
+    def job(self) -> Dict:
+        return self._state["job"]
+
+    @property
+    def file_id(self) -> str:
+        return self._state["file_id"]
+
+    @property
+    def offset(self) -> int:
+        """Items of the search fetched so far (where a re‑run resumes)."""
+        return self._state["offset"]
+
+    @property
+    def pages(self) -> List[Dict]:
+        return self._state["pages"]
+
+    @property
+    def records(self) -> int:
+        return sum(page["count"] for page in self.pages)
+
+    @property
+    def watermark(self):
+        return parse_ts(self._state["watermark"])
+
+    @property
+    def watermark_ids(self) -> set:
+        return set(self._state.get("watermark_ids") or ())
+
+    @property
+    def complete(self) -> bool:
+        return self._state["complete"]
+
+    def _save(self) -> None:
+        _write_atomic(self._state_path, lambda f: json.dump(self._state, f))
+
+    # ── progress ─────────────────────────────────────────────────────────
+    def add(self, batch: list, fetched: int, watermark=None, watermark_ids=()) -> None:
+        """Spool ``batch`` (``fetched`` raw items before filtering) and persist."""
+        name = f"{len(self.pages):06d}.ndjson"
+        if batch:
+            _write_atomic(os.path.join(self.folder, name),
+                          lambda f: write_records(batch, f, "ndjson"))
+        self.pages.append({"file": name, "count": len(batch)})
+        self._state["offset"] += fetched
+        if watermark is not None:
+            self._state["watermark"] = format_ts(watermark)
+            self._state["watermark_ids"] = sorted(watermark_ids)
+        self._save()
+
+    def finish(self) -> None:
+        """Mark the search exhausted – only the stitching is left."""
+        self._state["complete"] = True
+        self._save()
+
+    def iter_pages(self) -> Iterator[list]:
+        """Read the spooled pages back in order."""
+        for page in self.pages:
+            if page["count"]:
+                yield list(iter_records(os.path.join(self.folder, page["file"]), stage=None))
+
+    def clear(self) -> None:
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def describe(self) -> str:
+        return f"{len(self.pages):,} pages / {self.records:,} records spooled"
+
+    @staticmethod
+    def key_for(job: Dict, ignore: Optional[List[str]] = None) -> str:
+        """Stable key of ``job``'s search, minus the payload ranges' ``ignore`` keys.
+
+        Incremental runs pass ``ignore=["end"]``: their range ends at *now*,
+        so a re‑run must still find (and then re‑use) the interrupted range.
+        """
+        payload = {
+            k: ({kk: vv for kk, vv in v.items() if kk not in (ignore or [])}
+                if isinstance(v, dict) else v)
+            for k, v in job["payload"].items()
+        }
+        since = job.get("since")
+        return json.dumps(
+            {
+                "url": job["url"],
+                "payload": payload,
+                "since": format_ts(since) if since else None,
+                "pruned": bool(job.get("fields")),
+            },
+            sort_keys=True,
+        )
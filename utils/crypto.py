@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Fernet encryption for the optional on‑disk caches (tokens, credentials).
+
+``cryptography`` is only imported when such a cache is configured, like
+``zstandard`` for ``.zst`` files, so the pipeline runs without it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from typing import Any, Optional
+
+__all__ = ["fernet", "read_encrypted", "write_encrypted"]
+
+
+def fernet(key: Optional[str], setting: str):
+    """Fernet cipher for ``key``; ``setting`` names the cache in errors."""
+    if not key:
+        raise RuntimeError(f"{setting} needs {setting}_KEY (a Fernet key) to encrypt the cache")
+    try:
+        from cryptography.fernet import Fernet  # type: ignore
+    except ImportError as exc:  # pragma: no cover – optional dependency
+        raise RuntimeError(f"{setting} requires `pip install cryptography`") from exc
+    return Fernet(key.encode() if isinstance(key, str) else key)
+
+
+def read_encrypted(path: str, cipher) -> Optional[Any]:
+    """JSON document stored at ``path``, or ``None`` if missing / unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return json.loads(cipher.decrypt(f.read()))
+    except Exception as exc:  # corrupt or written with another key – start over
+        print(f"⚠️ Ignoring cache {path}: {type(exc).__name__}")
+        return None
+
+
+def write_encrypted(path: str, cipher, document: Any) -> None:
+    """Atomically write ``document`` to ``path``, readable by the owner only.
+
+    Each write goes through its own temp file next to ``path`` (``mkstemp``
+    creates it ``0600``), so concurrent writers never share one; the last
+    ``os.replace`` wins.
+    """
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp",
+                               dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(cipher.encrypt(json.dumps(document).encode()))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
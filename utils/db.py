@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""Shared SQL Server connection settings and pooled engine provider.
+
+Every insert module used to build its own engine (``get_engine()``) or raw
+pyodbc connection (``get_conn()``), so ``main.py insert all`` performed a
+fresh Azure SQL login per module.  :class:`DbProvider` owns **one** pooled
+SQLAlchemy engine that ``main.run_insert`` creates once and passes to each
+module's ``main(db=…)``:
+
+* pool sized by ``ALVYS_DB_POOL_SIZE`` / ``ALVYS_DB_MAX_OVERFLOW``,
+* ``pool_pre_ping`` so a connection Azure dropped while idle is replaced
+  instead of failing the next insert,
+* login metrics – number of physical logins and time spent in them – next
+  to pool checkouts, printed at the end of the run.
+
+The modules still fall back to their own engine when run standalone.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import quote_plus
+
+from sqlalchemy import create_engine, event
+
+__all__ = [
+    "SQL_SERVER",
+    "SQL_DATABASE",
+    "SQL_USERNAME",
+    "SQL_PASSWORD",
+    "ODBC_DRIVER",
+    "DB_POOL_SIZE",
+    "DB_MAX_OVERFLOW",
+    "mssql_url",
+    "odbc_url",
+    "DbStats",
+    "DbProvider",
+]
+
+# Target database (env overrides, see dev.example.env)
+SQL_SERVER = os.getenv("SQL_SERVER", "ksm-ksmta-sqlsrv-001.database.windows.net")
+SQL_DATABASE = os.getenv("SQL_DATABASE", "KSMTA")
+SQL_USERNAME = os.getenv("SQL_USERNAME", "importuser")
+SQL_PASSWORD = os.getenv("SQL_PASSWORD", "B2_SBD-Omicron-B00ts2!")
+ODBC_DRIVER = "ODBC Driver 17 for SQL Server"
+
+DB_POOL_SIZE = int(os.getenv("ALVYS_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("ALVYS_DB_MAX_OVERFLOW", "5"))
+# Azure SQL closes idle sessions after ~30 min – recycle before that
+DB_POOL_RECYCLE = 1_500
+
+
+def mssql_url(server: str = SQL_SERVER, database: str = SQL_DATABASE,
+              username: str = SQL_USERNAME, password: str = SQL_PASSWORD,
+              driver: str = ODBC_DRIVER) -> str:
+    """SQLAlchemy ``mssql+pyodbc`` URL for the given settings."""
+    return (
+        f"mssql+pyodbc://{quote_plus(username)}:{quote_plus(password)}@{server}/{database}"
+        f"?driver={quote_plus(driver)}"
+    )
+
+
+def odbc_url(conn_str: str) -> str:
+    """SQLAlchemy URL wrapping a raw ODBC connection string."""
+    return f"mssql+pyodbc:///?odbc_connect={quote_plus(conn_str)}"
+
+
+@dataclass
+class DbStats:
+    """Physical logins vs pool checkouts for one provider."""
+
+    logins: int = 0
+    login_seconds: float = 0.0
+    checkouts: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add_login(self, seconds: float) -> None:
+        with self._lock:
+            self.logins += 1
+            self.login_seconds += seconds
+
+    def add_checkout(self) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "logins": self.logins,
+            "login_seconds": round(self.login_seconds, 3),
+            "checkouts": self.checkouts,
+        }
+
+    def summary(self) -> str:
+        avg = self.login_seconds / self.logins if self.logins else 0.0
+        return (
+            f"{self.logins} login(s) in {self.login_seconds:.2f}s (avg {avg:.2f}s), "
+            f"{self.checkouts} checkout(s)"
+        )
+
+
+class DbProvider:
+    """One pooled engine (and raw DB‑API connections) for a whole run.
+
+    Usable as a context manager; :meth:`close` disposes the pool.
+    """
+
+    def __init__(self, url: str | None = None, pool_size: int = DB_POOL_SIZE,
+                 max_overflow: int = DB_MAX_OVERFLOW, pre_ping: bool = True,
+                 recycle: int = DB_POOL_RECYCLE):
+        self.pool_size = max(pool_size, 1)
+        self.max_overflow = max(max_overflow, 0)
+        self.stats = DbStats()
+        self.engine = create_engine(
+            url or mssql_url(),
+            fast_executemany=True,
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_pre_ping=pre_ping,
+            pool_recycle=recycle,
+        )
+        event.listen(self.engine, "do_connect", self._timed_login)
+        event.listen(self.engine, "checkout", self._on_checkout)
+
+    def _timed_login(self, dialect, conn_rec, cargs, cparams):
+        start = time.perf_counter()
+        try:
+            return dialect.connect(*cargs, **cparams)
+        finally:
+            self.stats.add_login(time.perf_counter() - start)
+
+    def _on_checkout(self, dbapi_conn, conn_rec, conn_proxy):
+        self.stats.add_checkout()
+
+    def raw_connection(self):
+        """Pooled DB‑API (pyodbc) connection; ``close()`` returns it to the pool."""
+        return self.engine.raw_connection()
+
+    def summary(self) -> str:
+        return f"{self.stats.summary()}, pool {self.pool_size}+{self.max_overflow}"
+
+    def close(self) -> None:
+        self.engine.dispose()
+
+    def __enter__(self) -> "DbProvider":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""Declarative, column‑oriented flattening of Alvys JSON records.
+
+Each raw table is described once as a list of :class:`Col` specs – output
+column, JSON path, type and max length::
+
+    LOAD_SPEC = [
+        Col("ID", "Id", max_len=100),
+        Col("FLEET_NAME", ("Fleet", "Name"), max_len=100),
+        Col("LINEHAUL_AMOUNT", ("Linehaul", "Amount"), "float"),
+        Col("CREATED_DTTM", "CreatedAt", "dt"),
+    ]
+
+:func:`flatten` then pulls every column out of the record list (shared
+prefixes such as ``Carrier`` are walked once) and applies each column's
+type rules in one place – strip/truncate via ``.str``, floats via
+``pd.to_numeric`` and timestamps via ``pd.to_datetime`` – instead of
+hand-written ``_s`` / ``_f`` / ``g`` calls per field in every module.
+The point is maintainability: a column is added or retyped by editing
+one spec line.  It is not faster – ``benchmarks/bench_flatten.py`` puts
+it on par with the old per-record flatteners (0.9–1.3×).
+
+Column kinds
+------------
+``str``    trimmed, truncated to ``max_len``; blank → ``None``
+``float``  numeric, unparsable → NaN (or ``default``)
+``dt``     naive UTC ``datetime64``
+``flag``   truthiness as ``0`` / ``1``
+``raw``    value as found
+
+:func:`projection` turns a spec (plus child specs such as ``LineItems``)
+into the field tree ``utils.formats.iter_records`` keeps while streaming,
+so fields no column reads are dropped before they pile up in memory.  A
+callable ``path`` lists the paths it reads in ``reads``.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from utils.metrics import run_metrics
+
+__all__ = [
+    "Col",
+    "extract",
+    "convert",
+    "flatten",
+    "explode",
+    "projection",
+]
+
+Path = Union[str, Tuple[str, ...], Callable[[dict], Any]]
+
+
+@dataclass(frozen=True)
+class Col:
+    name: str
+    path: Path
+    kind: str = "str"
+    max_len: Optional[int] = None
+    default: Any = None
+    reads: Tuple[Union[str, Tuple[str, ...]], ...] = ()  # paths a callable ``path`` uses
+
+
+def _walk(records: Sequence[Any], keys: Tuple[str, ...], memo: Dict[tuple, list]) -> list:
+    """Values at ``keys`` for every record, reusing walked prefixes."""
+    if keys in memo:
+        return memo[keys]
+    parent = _walk(records, keys[:-1], memo) if len(keys) > 1 else records
+    key = keys[-1]
+    try:
+        vals = [d.get(key) for d in parent]
+    except AttributeError:  # a None / scalar somewhere along the path
+        vals = [d.get(key) if isinstance(d, dict) else None for d in parent]
+    memo[keys] = vals
+    return vals
+
+
+def extract(records: Sequence[dict], path: Path, memo: Optional[Dict[tuple, list]] = None) -> list:
+    """Raw values at ``path`` (key, key tuple or callable) for ``records``."""
+    if callable(path):
+        return [path(r) for r in records]
+    keys = (path,) if isinstance(path, str) else tuple(path)
+    return _walk(records, keys, {} if memo is None else memo)
+
+
+def _str(vals: list, max_len: Optional[int]) -> pd.Series:
+    n = max_len or None
+    # One C-level loop over the column; str() only for the rare non-strings
+    return pd.Series(
+        [
+            (v.strip()[:n] or None) if v.__class__ is str
+            else None if v is None
+            else (str(v).strip()[:n] or None)
+            for v in vals
+        ],
+        dtype=object,
+    )
+
+
+def convert(vals: list, col: Col) -> pd.Series:
+    """Apply ``col``'s type rules to a whole column of raw values."""
+    if col.kind == "str":
+        return _str(vals, col.max_len)
+    if col.kind == "float":
+        s = pd.to_numeric(pd.Series(vals, dtype=object), errors="coerce").astype(float)
+        return s if col.default is None else s.fillna(col.default)
+    if col.kind == "dt":
+        return pd.to_datetime(pd.Series(vals, dtype=object), utc=True, errors="coerce").dt.tz_localize(None)
+    if col.kind == "flag":
+        return pd.Series(vals, dtype=object).astype(bool).astype(int)
+    if col.kind == "raw":
+        return pd.Series(vals, dtype=object)
+    raise ValueError(f"Unknown column kind {col.kind!r} for {col.name}")
+
+
+def flatten(records: Sequence[dict], spec: Sequence[Col], columns: Optional[Sequence[str]] = None,
+            constants: Optional[Mapping[str, Any]] = None, label: Optional[str] = None) -> pd.DataFrame:
+    """Build a DataFrame from ``records`` following ``spec``.
+
+    ``constants`` adds same‑value columns (``FILE_ID``, ``INSERTED_DTTM``);
+    ``columns`` fixes the output column order (default: spec order).
+    The time taken is added to the ``flatten`` metric (``utils.metrics``),
+    ``dt`` conversions also to ``flatten.datetime``, under ``label``.
+    """
+    start = time.perf_counter()
+    dt_seconds = 0.0
+    memo: Dict[tuple, list] = {}
+    data: Dict[str, Any] = {}
+    for c in spec:
+        vals = extract(records, c.path, memo)
+        if c.kind == "dt":
+            tick = time.perf_counter()
+            data[c.name] = convert(vals, c)
+            dt_seconds += time.perf_counter() - tick
+        else:
+            data[c.name] = convert(vals, c)
+    df = pd.DataFrame(data, index=range(len(records)))
+    for name, value in (constants or {}).items():
+        df[name] = value
+    df = df[list(columns)] if columns is not None else df
+    metrics = run_metrics()
+    metrics.add("flatten", time.perf_counter() - start, len(df), table=label)
+    if dt_seconds:
+        metrics.add("flatten.datetime", dt_seconds, len(df), table=label)
+    return df
+
+
+def explode(records: Sequence[dict], key: str) -> Tuple[List[dict], List[int]]:
+    """Child dicts under ``key`` of every record and their parent positions."""
+    children: List[dict] = []
+    parents: List[int] = []
+    for i, rec in enumerate(records):
+        kids = rec.get(key) or []
+        children.extend(kids)
+        parents.extend([i] * len(kids))
+    return children, parents
+
+
+def _keep(tree: Dict[str, Any], keys: Tuple[str, ...]) -> None:
+    node = tree
+    for key in keys[:-1]:
+        sub = node.get(key)
+        if sub is True:
+            return  # an ancestor is already kept whole
+        node = node.setdefault(key, {})
+    node[keys[-1]] = True
+
+
+def projection(spec: Sequence[Col], children: Optional[Mapping[str, Sequence[Col]]] = None,
+               extra: Sequence[Union[str, Tuple[str, ...]]] = ()) -> Dict[str, Any]:
+    """Field tree of every path ``spec`` reads (see ``utils.formats.project``).
+
+    ``children`` maps a list key (``"LineItems"``) to its child spec;
+    ``extra`` adds paths read outside the spec (``"FILE_ID"``).
+    """
+    paths: List[Union[str, Tuple[str, ...]]] = list(extra)
+    for col in spec:
+        if not callable(col.path):
+            paths.append(col.path)
+        elif col.reads:
+            paths.extend(col.reads)
+        else:
+            raise ValueError(f"{col.name}: a callable path needs `reads` to be projected")
+    tree: Dict[str, Any] = {}
+    for path in paths:
+        _keep(tree, (path,) if isinstance(path, str) else tuple(path))
+    for key, child in (children or {}).items():
+        tree[key] = projection(child)
+    return tree
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+"""On‑disk formats for the weekly Alvys extracts.
+
+The historical format is a pretty‑printed JSON array (``.json``).  For large
+weeks we also support **minified NDJSON** – one record per line – optionally
+compressed:
+
+========================  ==========================================
+Extension                 Format
+========================  ==========================================
+``.json``                 JSON array, ``indent=2`` (default)
+``.ndjson``               NDJSON, minified
+``.ndjson.gz``            NDJSON + gzip
+``.ndjson.zst``           NDJSON + zstd (needs the ``zstandard`` pkg)
+========================  ==========================================
+
+Writers pick the format from a flag; readers auto‑detect it from the file
+extension, so the insert modules work with any mix of files on disk.
+
+:func:`read_records` loads a whole file.  :func:`iter_records` streams it
+instead – the ``.json`` array is decoded one element at a time from a
+bounded read buffer – and can keep only a projection of each record
+(``fields``, see ``utils.flatten.projection``).  Peak memory is then one
+buffer plus the pruned records, however large the week.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import re
+import time
+from typing import IO, Any, Dict, Iterable, Iterator, List, Mapping, Optional, Union
+
+from utils.metrics import run_metrics
+
+__all__ = [
+    "FORMATS",
+    "format_of",
+    "with_format",
+    "open_data_file",
+    "write_records",
+    "read_records",
+    "iter_records",
+    "project",
+    "is_data_file",
+    "find_data_file",
+]
+
+# Format name → file extension (format names double as CLI choices)
+FORMATS: Dict[str, str] = {
+    "json": ".json",
+    "ndjson": ".ndjson",
+    "ndjson.gz": ".ndjson.gz",
+    "ndjson.zst": ".ndjson.zst",
+}
+
+# Characters read per refill when streaming a ``.json`` array
+STREAM_READ_SIZE = 1 << 20
+
+# Field projection: key → True (keep the whole value) or a nested projection
+Fields = Mapping[str, Union[bool, "Fields"]]
+
+# Longest extensions first so ".ndjson.gz" wins over ".json"-style suffixes
+_BY_EXT = sorted(((ext, fmt) for fmt, ext in FORMATS.items()), key=lambda e: -len(e[0]))
+
+
+def format_of(path: str | os.PathLike) -> Optional[str]:
+    """Return the format name for ``path`` or ``None`` if unsupported."""
+    name = os.fspath(path)
+    for ext, fmt in _BY_EXT:
+        if name.endswith(ext):
+            return fmt
+    return None
+
+
+def with_format(filename: str, fmt: str) -> str:
+    """Swap the extension of ``filename`` for the one of ``fmt``."""
+    current = format_of(filename)
+    stem = filename[: -len(FORMATS[current])] if current else filename
+    return stem + FORMATS[fmt]
+
+
+def open_data_file(path: str | os.PathLike, mode: str = "rt", fmt: str | None = None) -> IO[str]:
+    """Open ``path`` as text, transparently (de)compressing by format."""
+    fmt = fmt or format_of(path) or "json"
+    if fmt.endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8")
+    if fmt.endswith(".zst"):
+        try:
+            import zstandard  # type: ignore
+        except ImportError as exc:  # pragma: no cover – optional dependency
+            raise RuntimeError("Reading/writing .zst files requires `pip install zstandard`") from exc
+        return zstandard.open(path, mode, encoding="utf-8")
+    return open(path, mode.replace("t", ""), encoding="utf-8")
+
+
+def write_records(records: Iterable[dict], f: IO[str], fmt: str) -> int:
+    """Write ``records`` to an open handle in ``fmt``; return the count."""
+    count = 0
+    if fmt == "json":
+        for rec in records:
+            f.write(",\n" if count else "[\n")
+            f.write("  " + json.dumps(rec, indent=2).replace("\n", "\n  "))
+            count += 1
+        f.write("\n]" if count else "[]")
+        return count
+
+    for rec in records:
+        f.write(json.dumps(rec, separators=(",", ":")))
+        f.write("\n")
+        count += 1
+    return count
+
+
+def read_records(path: str | os.PathLike) -> List[dict]:
+    """Load every record of a data file, whatever its format.
+
+    A ``{"Items": [...]}`` wrapper (as some carrier dumps have) is returned
+    as‑is for ``.json`` files so callers keep their existing handling.
+    """
+    fmt = format_of(path) or "json"
+    with open_data_file(path, "rt", fmt) as f:
+        if fmt == "json":
+            return json.load(f)
+        # Raw newlines only ever separate records (they are escaped inside
+        # strings), so one C-level parse of "[rec,rec,…]" beats per-line loads.
+        lines = [line for line in f.read().split("\n") if line.strip()]
+        return json.loads("[" + ",".join(lines) + "]")
+
+
+def project(value: Any, fields: Fields) -> Any:
+    """Keep only ``fields`` of ``value`` (lists are projected element‑wise).
+
+    Missing keys stay missing, so ``dict.get`` on the result behaves exactly
+    as on the full record for every projected path.
+    """
+    if isinstance(value, list):
+        return [project(v, fields) for v in value]
+    if not isinstance(value, dict):
+        return value
+    out = {}
+    for key, sub in fields.items():
+        if key in value:
+            out[key] = value[key] if sub is True else project(value[key], sub)
+    return out
+
+
+_SKIP = re.compile(r"[\s,]*")
+
+
+def _iter_json_array(f: IO[str], read_size: int = STREAM_READ_SIZE) -> Iterator[Any]:
+    """Decode a top‑level JSON array element by element.
+
+    Only the undecoded tail of the file and one element are held at a time;
+    an element cut off by the end of the buffer is retried after a refill.
+    A ``{"Items": [...]}`` wrapper is loaded whole and its items yielded.
+    """
+    decode = json.JSONDecoder().raw_decode
+    buf, pos, eof = "", 0, False
+    while pos == len(buf):
+        chunk = f.read(read_size)
+        if not chunk:
+            return  # empty file
+        buf = buf[pos:] + chunk
+        pos = _SKIP.match(buf).end()
+    if buf[pos] == "{":
+        obj = json.loads(buf[pos:] + f.read())
+        yield from obj.get("Items") or []
+        return
+    if buf[pos] != "[":
+        raise ValueError(f"Expected a JSON array, got {buf[pos:pos + 20]!r}")
+    pos += 1
+
+    while True:
+        pos = _SKIP.match(buf, pos).end()
+        if pos == len(buf):
+            if eof:
+                raise ValueError("Unterminated JSON array")
+            chunk = f.read(read_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            value, end = decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = len(buf)  # incomplete element – refill and retry
+        if end == len(buf) and not eof:
+            chunk = f.read(read_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        yield value
+        pos = end
+
+
+def _source(path: str | os.PathLike) -> str:
+    """Metrics label of a data file: ``LOADS_API_2025….json`` → ``LOADS_API``."""
+    match = re.match(r"[A-Za-z]+(?:_[A-Za-z]+)*", os.path.basename(path))
+    return match.group(0) if match else "other"
+
+
+def iter_records(path: str | os.PathLike, fields: Optional[Fields] = None,
+                 read_size: int = STREAM_READ_SIZE, stage: Optional[str] = "parse") -> Iterator[dict]:
+    """Stream the records of a data file, optionally :func:`project`‑ed.
+
+    Unlike :func:`read_records` a ``{"Items": [...]}`` wrapper is unwrapped.
+    The time spent decoding (not the caller's time between records) is
+    added to the ``stage`` metric (``utils.metrics``); ``None`` skips it.
+    """
+    fmt = format_of(path) or "json"
+    busy, count, done = 0.0, 0, False
+    try:
+        with open_data_file(path, "rt", fmt) as f:
+            tick = time.perf_counter()
+            if fmt == "json":
+                records: Iterable[dict] = _iter_json_array(f, read_size)
+            else:
+                records = (json.loads(line) for line in f if line.strip())
+            for rec in records:
+                rec = rec if fields is None else project(rec, fields)
+                count += 1
+                busy += time.perf_counter() - tick
+                yield rec
+                tick = time.perf_counter()
+            busy += time.perf_counter() - tick
+            done = True
+    finally:
+        if stage:
+            # Bytes only count for files read to the end
+            nbytes = os.path.getsize(path) if done else 0
+            run_metrics().add(stage, busy, count, nbytes, source=_source(path))
+
+
+def is_data_file(fname: str, prefix: str) -> bool:
+    """``True`` for ``<prefix>*`` files in any supported format."""
+    return fname.startswith(prefix) and format_of(fname) is not None
+
+
+def find_data_file(data_dir: str | os.PathLike, stem: str) -> str:
+    """Return the newest ``<stem>.<ext>`` in ``data_dir``, any format.
+
+    Falls back to the ``.json`` path so a missing file raises the usual
+    ``FileNotFoundError`` naming the historical file.
+    """
+    found = [
+        os.path.join(data_dir, stem + ext)
+        for ext in FORMATS.values()
+        if os.path.exists(os.path.join(data_dir, stem + ext))
+    ]
+    if not found:
+        return os.path.join(data_dir, stem + FORMATS["json"])
+    return max(found, key=os.path.getmtime)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""Ledger of weekly files already loaded, so inserts only take new ones.
+
+``alvys_weekly_data`` keeps every exported week, and the insert modules
+used to ``os.listdir`` it and append *all* of them on every run – last
+week's file was parsed and inserted again each week.  The ledger is a
+small JSON index next to the files (``.loaded_files.json``) recording,
+per target, the content hash of every file that was loaded::
+
+    {"<host>/<db>/<schema>": {"<sha256>": {"file": "LOADS_API_….json",
+                                           "file_id": "…", "bytes": 123,
+                                           "loaded_at": "…"}}}
+
+* Keyed by **content**: a re‑exported week with new data has a new hash
+  and loads again; a renamed copy of a loaded file is still skipped.
+* …and by **stem** (entity + week, the name without its format
+  extension): the same week in another format (``.json`` vs
+  ``.ndjson.gz``) hashes differently but holds the same rows, so it is
+  skipped once one format of that stem was loaded, and only the newest
+  format of a stem loads in one run.
+* The ``FILE_ID`` stamped into the file is stored with it for tracing.
+* A file is recorded once all of its rows were written – with
+  ``--pipeline`` straight after its last chunk (:func:`file_chunks`), so
+  a run failing part way keeps the files it already wrote.  Rows are
+  written in several transactions (per table, per chunk), so a failure
+  *while* a file is written leaves part of it behind and the retry
+  appends that part again; ``--mode upsert`` makes the retry idempotent.
+* The index is written atomically.
+* ``reload=True`` (``--reload``) ignores the ledger for one run.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.formats import FORMATS, format_of, is_data_file, iter_records
+
+__all__ = [
+    "LEDGER",
+    "LEDGER_FILE",
+    "data_files",
+    "file_digest",
+    "file_stem",
+    "target_of",
+    "FileLedger",
+    "pending_files",
+    "ledger_files",
+    "FileDone",
+    "file_chunks",
+    "recording",
+]
+
+# File name used inside the data folder
+LEDGER_FILE = ".loaded_files.json"
+# Skip files the ledger has seen (0 = load every file in the folder, as before)
+LEDGER = os.getenv("ALVYS_INSERT_LEDGER", "1").lower() not in ("0", "false", "no")
+_READ_SIZE = 1 << 20
+
+
+def data_files(data_dir: str, prefix: str) -> List[str]:
+    """Names of the ``prefix`` data files in ``data_dir``, sorted."""
+    return sorted(f for f in os.listdir(data_dir) if is_data_file(f, prefix))
+
+
+def file_digest(path: str) -> str:
+    """SHA‑256 of the file's bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_READ_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_stem(name: str) -> str:
+    """``name`` without its format extension – entity and week range."""
+    fmt = format_of(name)
+    return name[: -len(FORMATS[fmt])] if fmt else name
+
+
+def target_of(engine, schema: str) -> str:
+    """Ledger key of ``schema`` in the database behind ``engine``."""
+    url = engine.url
+    return f"{url.host or ''}/{url.database or ''}/{schema}"
+
+
+def _first_file_id(path: str) -> Optional[str]:
+    for rec in iter_records(path, {"FILE_ID": True}, stage=None):
+        return rec.get("FILE_ID")
+    return None
+
+
+class FileLedger:
+    """Thread‑safe view of one ledger file; use :meth:`for_dir` to share it."""
+
+    _shared: Dict[str, "FileLedger"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = os.fspath(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, dict]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    @classmethod
+    def for_dir(cls, data_dir: str) -> "FileLedger":
+        """The process‑wide ledger of ``data_dir`` (modules share the index)."""
+        path = os.path.abspath(os.path.join(data_dir, LEDGER_FILE))
+        with cls._shared_lock:
+            if path not in cls._shared:
+                cls._shared[path] = cls(path)
+            return cls._shared[path]
+
+    def loaded(self, target: str, digest: str) -> Optional[dict]:
+        with self._lock:
+            return self._entries.get(target, {}).get(digest)
+
+    def loaded_formats(self, target: str) -> Dict[str, set]:
+        """``stem → formats`` of the files loaded into ``target``."""
+        stems: Dict[str, set] = {}
+        with self._lock:
+            for entry in self._entries.get(target, {}).values():
+                stems.setdefault(file_stem(entry["file"]), set()).add(format_of(entry["file"]))
+        return stems
+
+    def record(self, target: str, files: Iterable[Tuple[str, str]]) -> None:
+        """Mark ``(path, digest)`` pairs as loaded into ``target`` and persist."""
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        entries = {
+            digest: {
+                "file": os.path.basename(path),
+                "file_id": _first_file_id(path),
+                "bytes": os.path.getsize(path),
+                "loaded_at": now,
+            }
+            for path, digest in files
+        }
+        with self._lock:
+            self._entries.setdefault(target, {}).update(entries)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(tmp, self.path)
+
+
+def pending_files(ledger: FileLedger, target: str, data_dir: str, prefix: str,
+                  reload: bool = False) -> List[Tuple[str, str]]:
+    """``(name, digest)`` of the ``prefix`` files not yet loaded into ``target``.
+
+    A file is skipped when its content – or its stem in another format –
+    was loaded; of several formats of one stem only the newest is taken.
+    Prints how many files / bytes are skipped vs. still to load.
+    """
+    names = data_files(data_dir, prefix)
+    loaded = {} if reload else ledger.loaded_formats(target)
+    chosen: Dict[str, str] = {}  # stem → the one file of it to consider
+    for name in sorted(names, key=lambda n: os.path.getmtime(os.path.join(data_dir, n))):
+        stem = file_stem(name)
+        if stem not in loaded or format_of(name) in loaded[stem]:
+            chosen[stem] = name
+    todo, skipped, skipped_bytes, todo_bytes = [], 0, 0, 0
+    for name in names:
+        path = os.path.join(data_dir, name)
+        size = os.path.getsize(path)
+        stem = file_stem(name)
+        if chosen.get(stem) != name:
+            print(f"  ⚠️ Skipping {name}: " + (f"week already loaded as {'/'.join(sorted(loaded[stem]))}"
+                                              if stem in loaded else f"loading the newer {chosen[stem]}"))
+            skipped += 1
+            skipped_bytes += size
+            continue
+        digest = file_digest(path)
+        if not reload and ledger.loaded(target, digest):
+            skipped += 1
+            skipped_bytes += size
+        else:
+            todo.append((name, digest))
+            todo_bytes += size
+    mb = 1024 * 1024
+    print(f"  {prefix.rstrip('_')}: {len(todo)} file(s) to load ({todo_bytes / mb:.1f} MiB), "
+          f"{skipped} already loaded skipped ({skipped_bytes / mb:.1f} MiB)"
+          + (" – --reload" if reload else ""))
+    return todo
+
+
+def ledger_files(engine, schema: str, data_dir: str, prefix: str, reload: bool = False,
+                 enabled: bool = LEDGER) -> Tuple[List[str], Callable[..., None]]:
+    """Files an insert module should load, and a callback recording them.
+
+    Call ``mark_loaded(names)`` once those files' rows are written, or
+    ``mark_loaded()`` for all of them.  With the ledger disabled every file
+    is returned and the callback does nothing.
+    """
+    if not enabled:
+        return data_files(data_dir, prefix), lambda names=None: None
+    ledger = FileLedger.for_dir(data_dir)
+    target = target_of(engine, schema)
+    todo = dict(pending_files(ledger, target, data_dir, prefix, reload))
+
+    def mark_loaded(names: Optional[Iterable[str]] = None) -> None:
+        names = list(todo) if names is None else names
+        ledger.record(target, [(os.path.join(data_dir, n), todo[n]) for n in names])
+
+    return list(todo), mark_loaded
+
+
+@dataclass(frozen=True)
+class FileDone:
+    """Pipeline item following the last chunk of file ``name``."""
+    name: str
+
+
+def file_chunks(files: Iterable[str], chunks_of: Callable[[List[str]], Iterable[Any]]) -> Iterator[Any]:
+    """``chunks_of([name])`` for each file in turn, each followed by ``FileDone(name)``."""
+    for name in files:
+        yield from chunks_of([name])
+        yield FileDone(name)
+
+
+def recording(consume: Callable[[Any], Any], mark_loaded: Callable[..., None]) -> Callable[[Any], Any]:
+    """Wrap a pipeline ``consume`` so each ``FileDone`` records its file.
+
+    The pipeline consumes items in order, so by the time the marker arrives
+    every chunk of that file has been written.  Markers yield ``None``.
+    """
+    def step(item):
+        if isinstance(item, FileDone):
+            mark_loaded([item.name])
+            return None
+        return consume(item)
+
+    return step
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+"""Stage‑level run metrics: timings, rows, bytes, memory and page latency.
+
+Timing used to be a few ``print`` calls in the insert modules; nothing
+measured HTTP pages, JSON parsing or flattening, so a slow night's run
+could not be broken down.  Every stage now adds to one process‑wide
+:class:`RunMetrics` (:func:`run_metrics`):
+
+=====================  ============================================  =========
+stage                  recorded by                                   labels
+=====================  ============================================  =========
+``export.page``        ``alvys_export._fetch_page`` – one search     endpoint
+                       page: latency, items, response bytes
+``export.job``         ``alvys_export._run_job`` – one entity file   entity
+``parse``              ``utils.formats.iter_records`` – one data     source
+                       file decoded (time spent inside the reader)
+``flatten``            ``utils.flatten.flatten`` – one DataFrame     table
+``flatten.datetime``   its ``dt`` column conversions                 table
+``insert``             ``main.run_insert`` – one table's load        table
+=====================  ============================================  =========
+
+Each stage keeps calls, seconds, rows and bytes; latency stages also keep
+their samples for p50 / p95 / p99.  The process' peak RSS is sampled
+whenever a stage finishes (``resource``, or ``psutil`` where there is no
+``resource`` module, e.g. on Windows).
+
+At the end of a run ``main`` prints :meth:`RunMetrics.summary` and writes
+:meth:`RunMetrics.write_json` (``--metrics-json`` / ``ALVYS_METRICS_JSON``)
+and :meth:`RunMetrics.write_prometheus` (``--metrics-prom`` /
+``ALVYS_METRICS_PROM``) – a node_exporter textfile‑collector file, written
+atomically so the collector never reads half of it.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+__all__ = [
+    "METRICS_JSON",
+    "METRICS_PROM",
+    "StageStats",
+    "RunMetrics",
+    "peak_rss",
+    "run_metrics",
+]
+
+# Default report paths (unset = not written)
+METRICS_JSON = os.getenv("ALVYS_METRICS_JSON")
+METRICS_PROM = os.getenv("ALVYS_METRICS_PROM")
+# Latency samples kept per stage; older ones are dropped past this
+MAX_SAMPLES = 100_000
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size of this process in bytes, if it can be read."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", None) or info.rss
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # Linux reports KiB
+
+
+def _quantile(ordered: List[float], q: float) -> float:
+    """Nearest‑rank quantile of sorted samples."""
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+def _latency(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50": round(_quantile(ordered, 0.50), 4),
+        "p95": round(_quantile(ordered, 0.95), 4),
+        "p99": round(_quantile(ordered, 0.99), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+    rss_bytes: Optional[int] = None  # process peak RSS when the stage last finished
+    latencies: List[float] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "calls": self.calls,
+            "seconds": round(self.seconds, 4),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "rows_per_sec": round(self.rows / self.seconds, 1) if self.seconds else None,
+            "bytes_per_sec": round(self.bytes / self.seconds, 1) if self.seconds else None,
+            "rss_bytes": self.rss_bytes,
+        }
+        if self.latencies:
+            out["latency"] = _latency(self.latencies)
+        return out
+
+
+class RunMetrics:
+    """Thread‑safe stage counters of one run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[_Key, StageStats] = {}
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self.started = time.time()
+
+    # ── recording ────────────────────────────────────────────────────────
+    def add(self, stage: str, seconds: float = 0.0, rows: int = 0, nbytes: int = 0,
+            latency: bool = False, **labels: Any) -> None:
+        """Add one finished ``stage`` call; ``latency`` keeps ``seconds`` as a sample."""
+        key = (stage, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None)))
+        rss = peak_rss()
+        with self._lock:
+            st = self._stages.setdefault(key, StageStats())
+            st.calls += 1
+            st.seconds += seconds
+            st.rows += rows
+            st.bytes += nbytes
+            if rss is not None:
+                st.rss_bytes = max(st.rss_bytes or 0, rss)
+            if latency:
+                if len(st.latencies) >= MAX_SAMPLES:
+                    del st.latencies[: MAX_SAMPLES // 10]
+                st.latencies.append(seconds)
+
+    def count(self, group: str, values: Dict[str, float]) -> None:
+        """Sum numeric ``values`` (e.g. ``ClientStats.as_dict()``) into ``group``."""
+        with self._lock:
+            totals = self._counters.setdefault(group, {})
+            for name, value in values.items():
+                if isinstance(value, (int, float)):
+                    totals[name] = totals.get(name, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    # ── reporting ────────────────────────────────────────────────────────
+    def latency(self, stage: str) -> Optional[Dict[str, float]]:
+        """p50 / p95 / p99 / max of ``stage`` over all its labels, if sampled."""
+        with self._lock:
+            samples = [s for (name, _), st in self._stages.items() if name == stage for s in st.latencies]
+        return _latency(samples) if samples else None
+
+    def report(self, **context: Any) -> Dict[str, Any]:
+        """The run as a JSON‑ready dict; ``context`` is stored as given."""
+        now = time.time()
+        with self._lock:
+            stages = [
+                {"stage": name, "labels": dict(labels), **st.as_dict()}
+                for (name, labels), st in sorted(self._stages.items())
+            ]
+            counters = {g: dict(v) for g, v in self._counters.items()}
+        return {
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="seconds"),
+            "finished": datetime.fromtimestamp(now, timezone.utc).isoformat(timespec="seconds"),
+            "wall_seconds": round(now - self.started, 3),
+            "peak_rss_bytes": peak_rss(),
+            "context": context,
+            "stages": stages,
+            "counters": counters,
+        }
+
+    def summary(self) -> str:
+        """Per‑stage seconds / rows / MiB, latency percentiles and peak RSS."""
+        report = self.report()
+        lines = ["Stage metrics"]
+        for st in report["stages"]:
+            label = ",".join(f"{v}" for v in st["labels"].values())
+            name = f"{st['stage']}[{label}]" if label else st["stage"]
+            line = (f"  {name:<40}{st['calls']:>6,}× {st['seconds']:8.2f}s "
+                    f"{st['rows']:>10,} rows {st['bytes'] / 2**20:8.1f} MiB")
+            if "latency" in st:
+                lat = st["latency"]
+                line += f"  p50 {lat['p50']:.3f}s p95 {lat['p95']:.3f}s p99 {lat['p99']:.3f}s"
+            lines.append(line)
+        if report["peak_rss_bytes"]:
+            lines.append(f"  peak RSS {report['peak_rss_bytes'] / 2**20:,.0f} MiB")
+        return "\n".join(lines)
+
+    def write_json(self, path: str, **context: Any) -> None:
+        _write_atomic(path, json.dumps(self.report(**context), indent=2))
+
+    def write_prometheus(self, path: str, success: bool = True, **context: Any) -> None:
+        """Write the run as Prometheus text exposition format (textfile collector)."""
+        report = self.report()
+        base = {k: str(v) for k, v in context.items() if v is not None}
+        out: List[str] = []
+
+        def metric(name: str, kind: str, help_: str, samples: List[Tuple[Dict[str, str], float]]):
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                out.append(f"{name}{_labels({**base, **labels})} {_value(value)}")
+
+        def per_stage(pick) -> List[Tuple[Dict[str, str], float]]:
+            return [({"stage": st["stage"], **st["labels"]}, pick(st)) for st in report["stages"]
+                    if pick(st) is not None]
+
+        metric("alvys_stage_calls_total", "counter", "Stage calls in the last run.",
+               per_stage(lambda st: st["calls"]))
+        metric("alvys_stage_seconds_total", "counter", "Seconds spent in the stage.",
+               per_stage(lambda st: st["seconds"]))
+        metric("alvys_stage_rows_total", "counter", "Rows / records through the stage.",
+               per_stage(lambda st: st["rows"]))
+        metric("alvys_stage_bytes_total", "counter", "Bytes through the stage.",
+               per_stage(lambda st: st["bytes"]))
+        latency = [({"stage": st["stage"], **st["labels"], "quantile": q}, st["latency"][p])
+                   for st in report["stages"] if "latency" in st
+                   for q, p in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99"))]
+        if latency:
+            metric("alvys_stage_latency_seconds", "summary", "Per-call latency quantiles.", latency)
+            for st in report["stages"]:
+                if "latency" in st:
+                    labels = _labels({**base, "stage": st["stage"], **st["labels"]})
+                    out.append(f"alvys_stage_latency_seconds_sum{labels} {_value(st['seconds'])}")
+                    out.append(f"alvys_stage_latency_seconds_count{labels} {st['calls']}")
+        for group, values in sorted(report["counters"].items()):
+            metric(f"alvys_{group}_total", "counter", f"{group} counters of the last run.",
+                   [({"counter": name}, value) for name, value in sorted(values.items())])
+        if report["peak_rss_bytes"] is not None:
+            metric("alvys_peak_rss_bytes", "gauge", "Peak resident set size of the run.",
+                   [({}, report["peak_rss_bytes"])])
+        metric("alvys_run_seconds", "gauge", "Wall time of the last run.", [({}, report["wall_seconds"])])
+        metric("alvys_run_success", "gauge", "1 if the last run succeeded.", [({}, int(success))])
+        metric("alvys_run_timestamp_seconds", "gauge", "When the last run finished.",
+               [({}, round(time.time()))])
+        _write_atomic(path, "\n".join(out) + "\n")
+
+
+def _value(value: float) -> str:
+    if isinstance(value, bool) or isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(round(float(value), 6))
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    esc = {k: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in labels.items()}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in esc.items()) + "}"
+
+
+def _write_atomic(path: str, text: str) -> None:
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+# Process-wide collector shared by every stage, tenant and thread
+_metrics = RunMetrics()
+
+
+def run_metrics() -> RunMetrics:
+    return _metrics
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""Parallel table loading helpers for the insert modules.
+
+The raw tables have no FK coupling at insert time, so entities, parent /
+child tables (trips + stops, invoices + line items) and chunks of a large
+append can load side by side – each task on its own pooled connection:
+
+* :func:`run_parallel` runs named tasks in a thread pool
+  (``--insert-workers`` / ``ALVYS_INSERT_WORKERS``; ``1`` keeps the old
+  sequential order) and re‑raises the first failure once every task ended;
+* :func:`chunks` splits a large DataFrame for parallel appends;
+* :class:`TableLoad` is what every ``bulk_insert`` returns, so
+  ``main.run_insert`` can print rows/sec per table at the end of the run.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+__all__ = [
+    "INSERT_WORKERS",
+    "MIN_CHUNK_ROWS",
+    "TableLoad",
+    "run_parallel",
+    "chunks",
+    "flatten_loads",
+    "format_throughput",
+]
+
+# Tables / chunks loaded concurrently
+INSERT_WORKERS = int(os.getenv("ALVYS_INSERT_WORKERS", "1"))
+# Appends smaller than this are not worth splitting across connections
+MIN_CHUNK_ROWS = 20_000
+
+
+@dataclass
+class TableLoad:
+    table: str
+    rows: int
+    seconds: float
+    counts: Optional[Dict[str, int]] = None  # upsert inserted/updated/unchanged
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def run_parallel(tasks: Sequence[Tuple[str, Callable[[], Any]]], workers: int = INSERT_WORKERS) -> Dict[str, Any]:
+    """Run ``(name, fn)`` tasks, ``workers`` at a time → ``{name: result}``.
+
+    Every task runs to completion even if another fails; the first failure
+    (in task order) is raised afterwards.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        return {name: fn() for name, fn in tasks}
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        futures = [(name, pool.submit(fn)) for name, fn in tasks]
+    results, errors = {}, []
+    for name, fut in futures:
+        exc = fut.exception()
+        if exc is not None:
+            errors.append(exc)
+        else:
+            results[name] = fut.result()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def chunks(df: pd.DataFrame, workers: int, min_rows: int = MIN_CHUNK_ROWS) -> List[pd.DataFrame]:
+    """Split ``df`` into up to ``workers`` contiguous pieces of ≥ ``min_rows``."""
+    parts = min(workers, len(df) // min_rows) if min_rows else workers
+    if parts <= 1:
+        return [df]
+    size = -(-len(df) // parts)
+    return [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+
+def flatten_loads(results: Iterable[Any]) -> List[TableLoad]:
+    """Collect the :class:`TableLoad` objects out of nested module results."""
+    out: List[TableLoad] = []
+    for res in results:
+        if isinstance(res, TableLoad):
+            out.append(res)
+        elif isinstance(res, (list, tuple)):
+            out.extend(flatten_loads(res))
+        elif isinstance(res, dict):
+            out.extend(flatten_loads(res.values()))
+    return out
+
+
+def format_throughput(loads: Sequence[TableLoad]) -> str:
+    """Per‑table rows / seconds / rows‑per‑second report."""
+    lines = ["Table throughput"]
+    for ld in sorted(loads, key=lambda x: -x.rows):
+        lines.append(f"  {ld.table:<34}{ld.rows:>10,} rows {ld.seconds:7.1f}s {ld.rows_per_sec:>10,.0f} rows/s")
+    total_rows = sum(ld.rows for ld in loads)
+    lines.append(f"  {'total':<34}{total_rows:>10,} rows")
+    return "\n".join(lines)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Producer/consumer pipeline overlapping parsing/flattening with DB writes.
+
+Without it an insert module parses **every** weekly file and flattens it
+into one big DataFrame before the first row is written, so CPU and network
+take turns and peak memory holds all weeks at once.  With ``--pipeline``
+(``ALVYS_INSERT_PIPELINE=1``):
+
+* a producer thread reads and flattens one file – or one
+  ``PIPELINE_CHUNK_ROWS`` slice of it – at a time,
+* the calling thread writes the previous chunk to SQL,
+* a bounded queue (``ALVYS_PIPELINE_DEPTH`` chunks) between them caps
+  memory and lets a slow writer throttle the reader.
+
+An error on either side stops both and is re‑raised in the caller.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from dataclasses import replace
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+from utils.parallel import TableLoad
+
+__all__ = [
+    "PIPELINE",
+    "PIPELINE_DEPTH",
+    "PIPELINE_CHUNK_ROWS",
+    "batches",
+    "run_pipeline",
+    "combine_loads",
+]
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Stream chunks through the writer instead of building whole frames first
+PIPELINE = os.getenv("ALVYS_INSERT_PIPELINE", "0").lower() in ("1", "true", "yes")
+# Flattened chunks buffered between reader and writer
+PIPELINE_DEPTH = int(os.getenv("ALVYS_PIPELINE_DEPTH", "2"))
+# Records per chunk when a single file is large
+PIPELINE_CHUNK_ROWS = int(os.getenv("ALVYS_PIPELINE_CHUNK_ROWS", "10000"))
+
+_DONE = object()
+
+
+def batches(records: Iterable[T], size: int = PIPELINE_CHUNK_ROWS) -> Iterator[List[T]]:
+    """``records`` (a list or a stream) in lists of at most ``size``.
+
+    ``size`` ≤ 0 yields everything as one list; nothing is yielded for no
+    records.
+    """
+    it = iter(records)
+    while True:
+        batch = list(it) if size <= 0 else list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+        if size <= 0:
+            return
+
+
+def run_pipeline(produce: Iterable[T], consume: Callable[[T], R],
+                 depth: int = PIPELINE_DEPTH) -> List[R]:
+    """Drain ``produce`` in a background thread into ``consume``.
+
+    At most ``depth`` produced items wait in the queue.  Returns the
+    ``consume`` results in order.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=max(depth, 1))
+    stop = threading.Event()
+    failure: List[BaseException] = []
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for item in produce:
+                if not put(item):
+                    return
+        except BaseException as exc:  # noqa: BLE001 – re-raised in the caller
+            failure.append(exc)
+        finally:
+            put(_DONE)
+
+    thread = threading.Thread(target=producer, name="insert-producer", daemon=True)
+    thread.start()
+    results: List[R] = []
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            results.append(consume(item))
+    finally:
+        stop.set()
+        thread.join()
+    if failure:
+        raise failure[0]
+    return results
+
+
+def combine_loads(loads: Iterable[Optional[TableLoad]]) -> List[TableLoad]:
+    """Sum per‑chunk :class:`TableLoad` results into one per table."""
+    merged: Dict[str, TableLoad] = {}
+    for ld in loads:
+        if ld is None:
+            continue
+        cur = merged.get(ld.table)
+        if cur is None:
+            merged[ld.table] = replace(ld, counts=dict(ld.counts) if ld.counts else None)
+            continue
+        cur.rows += ld.rows
+        cur.seconds += ld.seconds
+        if ld.counts:
+            cur.counts = {k: (cur.counts or {}).get(k, 0) + v for k, v in ld.counts.items()}
+    return list(merged.values())
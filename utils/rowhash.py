@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""Row content hashes so snapshot loads only write new or changed rows.
+
+The snapshot pulls (drivers, trucks, trailers, customers, carriers) are
+full copies of each entity, and ``active_entities_insert`` used to append
+every row on every run although most of them had not changed.  Each
+flattened row now gets a stable hash of its columns, minus the per‑run
+audit columns (``FILE_ID``, ``INSERTED_DTTM``).  The last hash loaded per
+``ID`` is kept in a small JSON index next to the data files
+(``.row_hashes.json``)::
+
+    {"<host>/<db>/<schema>": {"DRIVERS_RAW": {"<ID>": "<hash>", …}}}
+
+* Only rows whose ``ID`` is new, or whose hash differs from the last one
+  loaded, are written; rows without an ``ID`` are always written.
+* Hashes are recorded only after the rows committed, and the index is
+  written atomically, so a failed run retries the same rows.
+* ``reload=True`` (``--reload``) writes every row for one run and
+  refreshes the stored hashes.
+* Opt‑in (``ALVYS_ROW_HASH=1``): the index only knows what *this* data
+  folder loaded.  As a guard, a table's hashes are dropped – and every
+  row written again – when the target table holds fewer rows than the
+  index has IDs (truncated, rebuilt or new), see :meth:`RowDiff.check_target`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, Optional, Sequence
+
+__all__ = [
+    "ROW_HASH",
+    "ROW_HASH_FILE",
+    "HASH_IGNORE",
+    "row_hash",
+    "table_rows",
+    "RowHashes",
+    "RowDiff",
+]
+
+# File name used inside the data folder
+ROW_HASH_FILE = ".row_hashes.json"
+# Write only new / changed snapshot rows (opt-in; default appends every row, as before)
+ROW_HASH = os.getenv("ALVYS_ROW_HASH", "0").lower() not in ("0", "false", "no")
+# Columns that differ on every run and say nothing about the row itself
+HASH_IGNORE = ("FILE_ID", "INSERTED_DTTM")
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def row_hash(rec: Dict, ignore: Sequence[str] = HASH_IGNORE) -> str:
+    """Stable 128‑bit hash of ``rec``'s values, without the ``ignore`` columns."""
+    body = json.dumps({k: v for k, v in rec.items() if k not in ignore},
+                      sort_keys=True, separators=(",", ":"), default=_plain)
+    return hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+
+
+def table_rows(conn, schema: str, table: str) -> int:
+    """Rows in ``schema.table`` from the partition metadata; 0 if it does not exist."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT SUM(p.rows) FROM sys.partitions p "
+                    "WHERE p.object_id = OBJECT_ID(?, 'U') AND p.index_id IN (0, 1)",
+                    f"{schema}.{table}")
+        return int(cur.fetchone()[0] or 0)
+    finally:
+        cur.close()
+
+
+class RowHashes:
+    """Thread‑safe view of one hash index; use :meth:`for_dir` to share it."""
+
+    _shared: Dict[str, "RowHashes"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = os.fspath(path)
+        self._lock = threading.Lock()
+        self._hashes: Dict[str, Dict[str, Dict[str, str]]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self._hashes = json.load(f)
+
+    @classmethod
+    def for_dir(cls, data_dir: str) -> "RowHashes":
+        """The process‑wide index of ``data_dir`` (parallel entities share it)."""
+        path = os.path.abspath(os.path.join(data_dir, ROW_HASH_FILE))
+        with cls._shared_lock:
+            if path not in cls._shared:
+                cls._shared[path] = cls(path)
+            return cls._shared[path]
+
+    def table(self, target: str, table: str) -> Dict[str, str]:
+        """Copy of the ``ID → hash`` map last loaded into ``target``'s ``table``."""
+        with self._lock:
+            return dict(self._hashes.get(target, {}).get(table, {}))
+
+    def forget(self, target: str, table: str) -> None:
+        """Drop the hashes of ``target``'s ``table`` and persist."""
+        with self._lock:
+            if self._hashes.get(target, {}).pop(table, None) is not None:
+                self._save()
+
+    def record(self, target: str, table: str, hashes: Dict[str, str]) -> None:
+        """Store ``hashes`` as loaded into ``target``'s ``table`` and persist."""
+        if not hashes:
+            return
+        with self._lock:
+            self._hashes.setdefault(target, {}).setdefault(table, {}).update(hashes)
+            self._save()
+
+    def _save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._hashes, f)
+        os.replace(tmp, self.path)
+
+
+class RowDiff:
+    """Filters one table's snapshot rows down to the new and changed ones.
+
+    Pass the rows through :meth:`filter`, write what it yields, then call
+    :meth:`commit` to record the hashes and print the change ratio.
+    """
+
+    def __init__(self, store: Optional[RowHashes], target: str, table: str,
+                 reload: bool = False, key: str = "ID"):
+        self.store = store
+        self.target = target
+        self.table = table
+        self.reload = reload
+        self.key = key
+        self._known = store.table(target, table) if store else {}
+        self._pending: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.new = self.changed = self.unchanged = self.written = 0
+
+    def check_target(self, rows: int) -> None:
+        """Drop the known hashes if the target table has fewer than ``rows`` rows.
+
+        An append‑only RAW table holds at least one row per ID loaded, so
+        fewer means it was truncated, rebuilt or loaded from elsewhere, and
+        skipping "unchanged" rows would lose them.
+        """
+        if self.store is None or rows >= len(self._known):
+            return
+        print(f"  ⚠️ {self.table}: {rows:,} rows in the table but {len(self._known):,} hashed IDs "
+              f"– dropping the hashes, writing every row")
+        self.store.forget(self.target, self.table)
+        self._known = {}
+
+    @property
+    def total(self) -> int:
+        return self.new + self.changed + self.unchanged
+
+    def filter(self, records: Iterable[Dict]) -> Iterator[Dict]:
+        for rec in records:
+            if self.store is None:
+                yield rec
+                continue
+            rid = rec.get(self.key)
+            if rid is None:
+                self.new += 1
+                self.written += 1
+                yield rec
+                continue
+            rid = str(rid)
+            digest = row_hash(rec)
+            with self._lock:
+                seen = rid in self._pending
+                last = self._pending[rid] if seen else self._known.get(rid)
+                if last is None:
+                    self.new += 1
+                elif last != digest:
+                    self.changed += 1
+                else:
+                    self.unchanged += 1
+                    # --reload writes each ID once, repeats in the file are still skipped
+                    if seen or not self.reload:
+                        continue
+                self._pending[rid] = digest
+                self.written += 1
+            yield rec
+
+    def commit(self) -> None:
+        """Record the hashes of the rows written and print the change ratio."""
+        if self.store is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        self.store.record(self.target, self.table, pending)
+        print(f"  {self.table}: {self.describe()}" + (" – --reload" if self.reload else ""))
+
+    def describe(self) -> str:
+        ratio = self.written / self.total if self.total else 0.0
+        return (f"{self.new:,} new, {self.changed:,} changed, {self.unchanged:,} unchanged "
+                f"→ {self.written:,} written ({ratio:.1%})")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Idempotent MERGE (upsert) loading for the raw Alvys tables.
+
+The insert modules historically *append* every run, so re‑loading a week
+duplicates rows.  In ``upsert`` mode rows are instead bulk‑loaded into a
+session temp table (``#stg``, created with the target's column types) and
+applied with one set‑based ``MERGE`` keyed on ``ID``:
+
+* new IDs are inserted,
+* existing IDs are updated **only if a data column changed** (the
+  ``FILE_ID`` / ``INSERTED_DTTM`` audit columns are refreshed but not
+  compared),
+* everything else is left alone and reported as *unchanged*.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Sequence
+
+import pandas as pd
+
+from utils.rows import db_rows
+
+__all__ = [
+    "LOAD_MODES",
+    "LOAD_MODE",
+    "AUDIT_COLS",
+    "merge_sql",
+    "upsert_rows",
+    "upsert_dataframe",
+    "unique_on_key",
+    "format_counts",
+]
+
+LOAD_MODES = ("append", "upsert")
+# Default loading strategy for every insert module
+LOAD_MODE = os.getenv("ALVYS_LOAD_MODE", "append")
+
+# Refreshed on update but never a reason to update
+AUDIT_COLS = ("FILE_ID", "INSERTED_DTTM")
+
+_STAGING = "#stg"
+_BATCH_SIZE = 1_000
+
+
+def merge_sql(schema: str, table: str, columns: Sequence[str], key: str = "ID") -> str:
+    """Return the ``MERGE`` batch applying ``#stg`` to ``schema.table``.
+
+    The batch ends with a ``SELECT inserted, updated`` row.
+    """
+    data_cols = [c for c in columns if c != key and c not in AUDIT_COLS]
+    set_cols = [c for c in columns if c != key]
+    src = ", ".join(f"s.{c}" for c in data_cols)
+    tgt = ", ".join(f"t.{c}" for c in data_cols)
+    changed = f"EXISTS (SELECT {src} EXCEPT SELECT {tgt})" if data_cols else "1 = 0"
+    return f"""
+SET NOCOUNT ON;
+DECLARE @actions TABLE (action NVARCHAR(10));
+MERGE {schema}.{table} WITH (HOLDLOCK) AS t
+USING {_STAGING} AS s ON t.{key} = s.{key}
+WHEN MATCHED AND {changed} THEN
+    UPDATE SET {", ".join(f"{c} = s.{c}" for c in set_cols)}
+WHEN NOT MATCHED BY TARGET THEN
+    INSERT ({", ".join(columns)}) VALUES ({", ".join(f"s.{c}" for c in columns)})
+OUTPUT $action INTO @actions;
+SELECT
+    COALESCE(SUM(CASE WHEN action = 'INSERT' THEN 1 ELSE 0 END), 0),
+    COALESCE(SUM(CASE WHEN action = 'UPDATE' THEN 1 ELSE 0 END), 0)
+FROM @actions;
+"""
+
+
+def upsert_rows(conn, schema: str, table: str, columns: Sequence[str], rows: List[Sequence],
+                key: str = "ID", batch_size: int = _BATCH_SIZE) -> Dict[str, int]:
+    """Stage ``rows`` over a DB‑API (pyodbc) connection and MERGE them.
+
+    ``rows`` must already be unique on ``key``.  Commits on success and
+    returns ``{"inserted", "updated", "unchanged"}`` counts.
+    """
+    cols = ", ".join(columns)
+    cur = conn.cursor()
+    cur.fast_executemany = True
+    try:
+        cur.execute(
+            f"IF OBJECT_ID('tempdb..{_STAGING}') IS NOT NULL DROP TABLE {_STAGING}; "
+            f"SELECT TOP 0 {cols} INTO {_STAGING} FROM {schema}.{table};"
+        )
+        insert_sql = f"INSERT INTO {_STAGING} ({cols}) VALUES ({', '.join('?' for _ in columns)})"
+        for i in range(0, len(rows), batch_size):
+            cur.executemany(insert_sql, rows[i:i + batch_size])
+
+        cur.execute(merge_sql(schema, table, columns, key))
+        inserted, updated = cur.fetchone()
+        cur.execute(f"DROP TABLE {_STAGING}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return {
+        "inserted": int(inserted),
+        "updated": int(updated),
+        "unchanged": len(rows) - int(inserted) - int(updated),
+    }
+
+
+def unique_on_key(df: pd.DataFrame, key: str = "ID") -> pd.DataFrame:
+    """Drop rows without a ``key`` and keep the last row per ``key``.
+
+    MERGE may touch a target row only once, and the same record can appear
+    in several weekly files.
+    """
+    return df[df[key].notna()].drop_duplicates(subset=[key], keep="last")
+
+
+def upsert_dataframe(engine, df: pd.DataFrame, schema: str, table: str,
+                     key: str = "ID", dtype: dict | None = None) -> Dict[str, int]:
+    """MERGE ``df`` into ``schema.table`` through a SQLAlchemy ``engine``.
+
+    A missing table is created first from ``dtype``, as the append path
+    does – ``#stg`` copies the target's column types.
+    """
+    df.head(0).to_sql(name=table, schema=schema, con=engine, if_exists="append",
+                      index=False, dtype=dtype)
+    df = unique_on_key(df, key)
+    rows = db_rows(df)
+    raw = engine.raw_connection()
+    try:
+        return upsert_rows(raw, schema, table, list(df.columns), rows, key)
+    finally:
+        raw.close()
+
+
+def format_counts(counts: Dict[str, int]) -> str:
+    return (
+        f"{counts['inserted']:,} inserted, {counts['updated']:,} updated, "
+        f"{counts['unchanged']:,} unchanged"
+    )
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""Persisted export high‑water marks for incremental Alvys pulls.
+
+One small JSON file per output folder records, for every *(tenant, entity)*,
+the newest change timestamp (``UpdatedAt``, ``InvoicedDate`` …) seen in the
+last successful export of that entity::
+
+    {"<tenant_id>": {"loads": {"at": "2025-06-09T13:59:41.120Z",
+                               "ids": ["<Id>", ...]}, ...}}
+
+The next incremental run asks the API only for records changed since then.
+Marks only ever move forward and are written atomically, so a crashed run
+simply re‑pulls from the previous mark.
+
+The search range starts *at* the mark (inclusive), so the records stamped
+with the mark itself come back every run.  ``ids`` lists the ones already
+exported; they are dropped at the boundary (:func:`at_or_before`) while a
+record that newly shares the mark's millisecond still gets through.  Marks
+from older files (a bare timestamp) have no ``ids``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Collection, Dict, Iterable, Optional, Set
+
+__all__ = [
+    "WATERMARK_FILE",
+    "parse_ts",
+    "format_ts",
+    "to_ms",
+    "at_or_before",
+    "WatermarkStore",
+]
+
+# File name used inside the output folder
+WATERMARK_FILE = ".watermarks.json"
+
+
+def parse_ts(value) -> Optional[datetime]:
+    """Parse an Alvys ISO‑8601 timestamp into an aware UTC datetime."""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def format_ts(dt: datetime) -> str:
+    """Format ``dt`` as the API expects (*YYYY‑MM‑DDTHH:MM:SS.mmmZ*)."""
+    return (
+        dt.astimezone(timezone.utc)
+        .isoformat(timespec="milliseconds")
+        .replace("+00:00", "Z")
+    )
+
+
+def to_ms(dt: datetime) -> datetime:
+    """``dt`` truncated to the millisecond precision marks are stored at."""
+    return dt.replace(microsecond=dt.microsecond // 1000 * 1000)
+
+
+def at_or_before(ts: Optional[datetime], rid, since: datetime, boundary: Collection[str]) -> bool:
+    """``True`` if a record (``ts``, Id ``rid``) was covered by the mark ``since``.
+
+    Older records are, and so are those at the mark's millisecond whose Id
+    is in ``boundary``.  Records without a timestamp never are.
+    """
+    if ts is None:
+        return False
+    ts = to_ms(ts)
+    return ts < since or (ts == since and rid is not None and str(rid) in boundary)
+
+
+def _entry(value) -> tuple:
+    """``(mark, ids)`` of a stored value – a dict, or a bare timestamp in older files."""
+    if isinstance(value, dict):
+        return parse_ts(value.get("at")), set(value.get("ids") or ())
+    return parse_ts(value), set()
+
+
+class WatermarkStore:
+    """Thread‑safe view of one watermark file."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = os.fspath(path)
+        self._lock = threading.Lock()
+        self._marks: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self._marks = json.load(f)
+
+    def get(self, tenant: str, entity: str) -> Optional[datetime]:
+        with self._lock:
+            return _entry(self._marks.get(tenant, {}).get(entity))[0]
+
+    def boundary(self, tenant: str, entity: str) -> Set[str]:
+        """Ids of the records already exported at the mark itself."""
+        with self._lock:
+            return _entry(self._marks.get(tenant, {}).get(entity))[1]
+
+    def advance(self, tenant: str, entity: str, value: datetime, ids: Iterable[str] = ()) -> bool:
+        """Move the mark forward to ``value`` and persist; ``False`` if older.
+
+        ``ids`` are the records exported at ``value``; at the same mark they
+        are added to the stored ones.
+        """
+        value, ids = to_ms(value), {str(i) for i in ids}
+        with self._lock:
+            current, known = _entry(self._marks.get(tenant, {}).get(entity))
+            if current is not None and value < current:
+                return False
+            if current is not None and value == current:
+                if ids <= known:
+                    return False
+                ids |= known
+            self._marks.setdefault(tenant, {})[entity] = {"at": format_ts(value), "ids": sorted(ids)}
+            self._save()
+            return True
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._marks, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)